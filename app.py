@@ -1,6 +1,9 @@
+import startup_timing
+
 import os
 import sys
 import json
+import math
 import hashlib
 import smtplib
 import tempfile
@@ -11,13 +14,7 @@ from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.graph_objs as go
-import google.generativeai as genai
 from dotenv import load_dotenv
-from supabase import create_client, Client
 from flask import (
     Flask,
     render_template,
@@ -26,40 +23,65 @@ from flask import (
     url_for,
     session,
     flash,
-    jsonify
+    jsonify,
+    Response,
+    stream_with_context
 )
 
-from reportlab.platypus import (
-    SimpleDocTemplate,
-    Paragraph,
-    Spacer,
-    Table,
-    TableStyle,
-    Image
-)
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
+startup_timing.mark("flask")
+
+import instrumentation
+from instrumentation import span
+from circuit_breaker import breaker_stats
+from backend_db import LazySupabase, db_stats, execute, get_user, update_user
+import backend_db
 
 from backend_movies import get_genres, discover_movies
-from backend_news import get_today_news
-from backend_stocks import get_stock_data, llm_stock_advice
-from backend_crypto import get_crypto_data, llm_crypto_advice
-from backend_email import send_email, generate_replies
-from backend_Calendar import add_task_to_calendar, get_calendar_service
-from backend_travel_planner import get_user_location_google, get_nearby_places, haversine
-from backend_weather import get_weather, get_user_location_city, llm_weather_advice
+from backend_news import get_today_news, get_news_digest, start_news_prefetcher
+from backend_stocks import get_stock_data, get_stock_prices, get_stocks_closes, llm_stock_advice
+from backend_crypto import get_crypto_data, get_crypto_prices, get_cryptos_closes, llm_crypto_advice
+from backend_markets import MAX_BATCH_SYMBOLS, parse_symbols, summarize_batch
+import backend_watchlist
+from backend_email import send_email, get_replies, gmail_user_columns, prewarm_replies, email_listing
+from email_index import search as search_emails
+from email_triage import learn as learn_importance
+from backend_llm import generate as llm_generate, llm_stats, stream as llm_stream
+from backend_stream import SSE_HEADERS, cached, sse, stream_result
+from backend_Calendar import (
+    add_task_to_calendar,
+    add_tasks_to_calendar,
+    find_free_slots,
+    calendar_user_columns,
+    get_calendar_service,
+    parse_ics
+)
+from backend_google import invalidate_user as invalidate_google_services
+from backend_travel_planner import get_user_location_google, get_nearby_places, haversine, plan_itinerary, ITINERARY_MAX_PLACES
+from place_photos import cached_photo, fetch_photo
+from backend_weather import (
+    get_weather,
+    get_user_location_city,
+    llm_weather_advice,
+    weather_advice_prompt,
+    weather_advice_text
+)
+
+startup_timing.mark("backend modules")
 
 # ---------------- Supabase Config ----------------
 load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+supabase = LazySupabase(SUPABASE_URL, SUPABASE_KEY)
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"  
+instrumentation.init_app(app)
+backend_db.init_app(app)
 
 # ---------------- Email Function ----------------
-def send_email(receiver_email, pdf_file):
+def send_report_email(receiver_email, pdf_file):
     sender_email = os.getenv("EMAIL_USER")
     sender_pass = os.getenv("EMAIL_PASS")
 
@@ -81,15 +103,16 @@ def send_email(receiver_email, pdf_file):
         part.add_header('Content-Disposition', f'attachment; filename=Expense_Report.pdf')
         msg.attach(part)
 
-    server = smtplib.SMTP("smtp.gmail.com", 587)
-    server.starttls()
-    server.login(sender_email, sender_pass)
-    server.send_message(msg)
-    server.quit()
+    with span("smtp", "send_report"):
+        server = smtplib.SMTP("smtp.gmail.com", 587)
+        server.starttls()
+        server.login(sender_email, sender_pass)
+        server.send_message(msg)
+        server.quit()
 
 # ---------------- Function 1: Min & Max Date ----------------
 def get_min_max_date(user_id: str):
-    response = supabase.table("Expense_of_Users").select("Date").eq("User_Id", user_id).execute()
+    response = execute(supabase.table("Expense_of_Users").select("Date").eq("User_Id", user_id), "expense dates")
     if not response.data:
         return None, None
     dates = [datetime.strptime(row["Date"], "%Y-%m-%d").date() for row in response.data]
@@ -103,81 +126,101 @@ def generate_expense_report(user_id: str, from_date: str, end_date: str):
     else:
         query = query.gte("Date", str(from_date)).lte("Date", str(end_date))
 
-    response = query.execute()
+    response = execute(query, "expense report rows")
 
     if not response.data:
         return
 
-    df = pd.DataFrame(response.data)
-    df["Date"] = pd.to_datetime(df["Date"]).dt.date
-
-    category_totals = df.groupby("Category")["Expenses"].sum().to_dict()
-    total = sum(category_totals.values())
-    percentages = {k: (v / total) * 100 for k, v in category_totals.items()}
-
-    fig, ax = plt.subplots(figsize=(7, 6))
-    wedges, _ = ax.pie(
-        category_totals.values(),
-        startangle=140,
-        shadow=True,
-        wedgeprops={"edgecolor": "black"}
+    import numpy as np
+    import pandas as pd
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from reportlab.platypus import (
+        SimpleDocTemplate,
+        Paragraph,
+        Spacer,
+        Table,
+        TableStyle,
+        Image
     )
-
-    for i, wedge in enumerate(wedges):
-        angle = (wedge.theta2 + wedge.theta1) / 2
-        x = np.cos(np.deg2rad(angle))
-        y = np.sin(np.deg2rad(angle))
-        ax.annotate(
-            f"{list(percentages.values())[i]:.1f}%",
-            xy=(x, y), xytext=(1.2 * x, 1.2 * y),
-            ha="center", va="center",
-            arrowprops=dict(arrowstyle="-", color="black")
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+
+    with span("pandas", "expense_totals"):
+        df = pd.DataFrame(response.data)
+        df["Date"] = pd.to_datetime(df["Date"]).dt.date
+
+        category_totals = df.groupby("Category")["Expenses"].sum().to_dict()
+        total = sum(category_totals.values())
+        percentages = {k: (v / total) * 100 for k, v in category_totals.items()}
+
+    with span("matplotlib", "expense_chart"):
+        fig, ax = plt.subplots(figsize=(7, 6))
+        wedges, _ = ax.pie(
+            category_totals.values(),
+            startangle=140,
+            shadow=True,
+            wedgeprops={"edgecolor": "black"}
         )
 
-    ax.legend(
-        wedges,
-        [f"{cat}: {perc:.1f}%" for cat, perc in percentages.items()],
-        title="Categories",
-        loc="center left",
-        bbox_to_anchor=(1, 0.5)
-    )
-    plt.suptitle("Category-wise Expense Distribution", fontsize=14, fontweight="bold", x=0.5)
+        for i, wedge in enumerate(wedges):
+            angle = (wedge.theta2 + wedge.theta1) / 2
+            x = np.cos(np.deg2rad(angle))
+            y = np.sin(np.deg2rad(angle))
+            ax.annotate(
+                f"{list(percentages.values())[i]:.1f}%",
+                xy=(x, y), xytext=(1.2 * x, 1.2 * y),
+                ha="center", va="center",
+                arrowprops=dict(arrowstyle="-", color="black")
+            )
+
+        ax.legend(
+            wedges,
+            [f"{cat}: {perc:.1f}%" for cat, perc in percentages.items()],
+            title="Categories",
+            loc="center left",
+            bbox_to_anchor=(1, 0.5)
+        )
+        plt.suptitle("Category-wise Expense Distribution", fontsize=14, fontweight="bold", x=0.5)
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as chart_file:
-        chart_path = chart_file.name
-    plt.savefig(chart_path, bbox_inches="tight")
-    plt.close()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as chart_file:
+            chart_path = chart_file.name
+        plt.savefig(chart_path, bbox_inches="tight")
+        plt.close()
 
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as pdf_temp:
         pdf_path = pdf_temp.name
 
-    doc = SimpleDocTemplate(pdf_path)
-    styles = getSampleStyleSheet()
-    elements = []
+    with span("reportlab", "expense_pdf"):
+        doc = SimpleDocTemplate(pdf_path)
+        styles = getSampleStyleSheet()
+        elements = []
+
+        elements.append(Paragraph("Expense Report", styles["Title"]))
+        elements.append(Spacer(1, 20))
 
-    elements.append(Paragraph("Expense Report", styles["Title"]))
-    elements.append(Spacer(1, 20))
+        table_data = [["Date", "Category", "Expenses"]] + df.values.tolist()
+        table = Table(table_data, hAlign="CENTER")
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("GRID", (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        elements.append(table)
+        elements.append(Spacer(1, 20))
 
-    table_data = [["Date", "Category", "Expenses"]] + df.values.tolist()
-    table = Table(table_data, hAlign="CENTER")
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("GRID", (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    elements.append(table)
-    elements.append(Spacer(1, 20))
+        elements.append(Paragraph("Category-wise Expenses", styles["Heading2"]))
+        for cat, val in category_totals.items():
+            elements.append(Paragraph(f"• {cat} : {val:.2f}", styles["Normal"]))
+        elements.append(Spacer(1, 20))
 
-    elements.append(Paragraph("Category-wise Expenses", styles["Heading2"]))
-    for cat, val in category_totals.items():
-        elements.append(Paragraph(f"• {cat} : {val:.2f}", styles["Normal"]))
-    elements.append(Spacer(1, 20))
+        elements.append(Image(chart_path, width=350, height=250, hAlign="CENTER"))
 
-    elements.append(Image(chart_path, width=350, height=250, hAlign="CENTER"))
+        doc.build(elements)
 
-    doc.build(elements)
-    send_email(user_id, pdf_path)
+    send_report_email(user_id, pdf_path)
 
     os.remove(pdf_path)
     os.remove(chart_path)
@@ -187,28 +230,22 @@ def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 def check_login(email, password):
-    resp = supabase.table("users").select("*").eq("email", email).execute()
-    if resp.data:
-        user = resp.data[0]
-        if user["password"] == hash_password(password):
-            return True
-    return False
+    user = get_user(supabase, email, "password")
+    return bool(user) and user["password"] == hash_password(password)
 
 def signup_user(email, password):
-    resp = supabase.table("users").select("*").eq("email", email).execute()
-    if resp.data:
+    if get_user(supabase, email, "email") is not None:
         return False
-    supabase.table("users").insert({
+    execute(supabase.table("users").insert({
         "email": email,
         "password": hash_password(password),
-    }).execute()
+    }), "signup")
     return True
 
 def reset_password(email, new_password):
-    resp = supabase.table("users").select("*").eq("email", email).execute()
-    if not resp.data:
+    if get_user(supabase, email, "email") is None:
         return False
-    supabase.table("users").update({"password": hash_password(new_password)}).eq("email", email).execute()
+    update_user(supabase, email, {"password": hash_password(new_password)})
     return True
 
 # ---------------- Routes ----------------
@@ -279,11 +316,11 @@ def get_user_field(field):
     if field not in allowed_fields:
         return jsonify({"error": "Invalid field"}), 400
     
-    user = supabase.table("users").select(field).eq("email", email).execute().data
+    user = get_user(supabase, email, field)
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    return jsonify({field: user[0].get(field)})
+    return jsonify({field: user.get(field)})
 
 @app.route("/update_user_field/<field>", methods=["POST"])
 def update_user_field(field):
@@ -312,12 +349,14 @@ def update_user_field(field):
         updates["google_calendar_token"] = None
         updates["google_gmail_token"] = None
 
-    supabase.table("users").update(updates).eq("email", email).execute()
+    update_user(supabase, email, updates)
+    if field == "client_secret_json":
+        invalidate_google_services(email)
     
     return jsonify({"success": True, "field": field, "value": new_value})
 
 def check_expense_user(email):
-    resp = supabase.table("Expense_of_Users").select("*").eq("User_Id", email).execute()
+    resp = execute(supabase.table("Expense_of_Users").select("User_Id").eq("User_Id", email).limit(1), "expense exists")
     return len(resp.data) > 0
 
 @app.route("/check_expense_user")
@@ -344,12 +383,12 @@ def add_expense():
     today = datetime.now().strftime("%Y-%m-%d")  # Example: 2025-08-22
 
     try:
-        supabase.table("Expense_of_Users").insert({
+        execute(supabase.table("Expense_of_Users").insert({
             "User_Id": email,
             "Category": category,
             "Expenses": amount,
             "Date": today
-        }).execute()
+        }), "add expense")
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -394,14 +433,10 @@ def weather():
         return jsonify({"error": "Not logged in"}), 403
 
     try:
-        user_resp = supabase.table("users").select(
-            "weather_api, google_gemini_api_key"
-        ).eq("email", session["email"]).execute()
-
-        if not user_resp.data:
+        user = get_user(supabase, session["email"], "weather_api", "google_gemini_api_key")
+        if not user:
             return jsonify({"error": "User not found"}), 404
 
-        user = user_resp.data[0]
         weather_api = user.get("weather_api")
         gemini_api = user.get("google_gemini_api_key")
 
@@ -415,9 +450,7 @@ def weather():
                 update_data["google_gemini_api_key"] = new_gemini.strip()
 
             if update_data:
-                supabase.table("users").update(update_data).eq(
-                    "email", session["email"]
-                ).execute()
+                update_user(supabase, session["email"], update_data)
                 return jsonify({"success": True, "message": "API keys saved!"})
 
         missing = []
@@ -431,30 +464,76 @@ def weather():
 
         city = get_user_location_city() or "London"
         weather_data = get_weather(city, weather_api)
-        advice = llm_weather_advice(city, weather_data, gemini_api)
+        advice = cached(
+            weather_advice_key(city, weather_data),
+            lambda: llm_weather_advice(city, weather_data, gemini_api),
+            is_llm_text
+        )
         return jsonify({"weather": weather_data, "advice": advice})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# ---------------------------
+# Streaming (SSE) variants of the LLM endpoints. Each sends its non-LLM data
+# first, a `chunk` event per piece of model output and a closing `done` event
+# with the finished answer. The answer is cached, so a JSON request that
+# follows (or a page reload) is served without another Gemini call.
+# ---------------------------
+def sse_response(events):
+    return Response(stream_with_context(events), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+def is_llm_text(text):
+    return bool(text) and not text.startswith(("LLM error", "LLM suggestions unavailable", "⚠️ Error"))
+
+def weather_advice_key(city, weather_data):
+    return ("weather", city, json.dumps(weather_data, sort_keys=True, default=str))
+
+@app.route("/weather/stream", methods=["GET"])
+def weather_stream():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 403
+
+    user = get_user(supabase, session["email"], "weather_api", "google_gemini_api_key")
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    weather_api = user.get("weather_api")
+    gemini_api = user.get("google_gemini_api_key")
+    if not weather_api or not gemini_api:
+        return jsonify({"error": "Missing API keys"}), 400
+
+    city = get_user_location_city() or "London"
+    weather_data = get_weather(city, weather_api)
+    chunks = llm_stream(weather_advice_prompt(city, weather_data), gemini_api,
+                        request_options={"timeout": 15}, caller="weather")
+
+    def events():
+        yield sse("weather", weather_data)
+        yield from stream_result(
+            weather_advice_key(city, weather_data), chunks,
+            lambda text: {"weather": weather_data, "advice": text or weather_advice_text(None)}
+        )
+
+    return sse_response(events())
+
 @app.route("/stocks", methods=["GET", "POST"])
 def stocks():
     if "email" not in session:
         return redirect(url_for("login"))
     
-    resp = supabase.table("users").select("google_gemini_api_key").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "google_gemini_api_key")
+    if not user:
         flash("User not found.", "danger")
         return redirect(url_for("login"))
 
-    user = resp.data[0]
     gemini_key = user.get("google_gemini_api_key")
 
     if not gemini_key:
         if request.method == "POST":
             new_key = request.form.get("google_gemini_api_key").strip()
             if new_key:
-                supabase.table("users").update({"google_gemini_api_key": new_key}).eq("email", session["email"]).execute()
+                update_user(supabase, session["email"], {"google_gemini_api_key": new_key})
                 flash("Gemini API key saved!", "success")
                 return redirect(url_for("stocks"))
         return render_template("key_setup.html", service="Stocks", field_name="google_gemini_api_key")
@@ -466,10 +545,9 @@ def api_stocks():
     if "email" not in session:
         return jsonify({"error": "Not logged in"}), 403
 
-    resp = supabase.table("users").select("google_gemini_api_key").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "google_gemini_api_key")
+    if not user:
         return jsonify({"error": "User not found"}), 404
-    user = resp.data[0]
     gemini_key = user.get("google_gemini_api_key")
     if not gemini_key:
         return jsonify({"error": "Missing Gemini API key"}), 400
@@ -483,28 +561,70 @@ def api_stocks():
     if "error" in stock:
         return jsonify(stock), 400
 
-    hist = stock["history"]
-    last_price = hist["Close"].iloc[-1]
-    pct_change = ((last_price - hist["Close"].iloc[0]) / hist["Close"].iloc[0]) * 100
-    highest = hist["Close"].max()
-    lowest = hist["Close"].min()
+    ai_text = cached(
+        stock_advice_key(symbol, stock["history"]),
+        lambda: llm_stock_advice(symbol, stock["history"], gemini_key),
+        is_llm_text
+    )
+    return jsonify(build_stock_response(stock, ai_text))
+
+def stock_advice_key(symbol, hist):
+    return ("stock", symbol, str(hist["Date"].iloc[-1]))
+
+@app.route("/api/stocks/stream", methods=["GET"])
+def api_stocks_stream():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 403
+
+    user = get_user(supabase, session["email"], "google_gemini_api_key")
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    gemini_key = user.get("google_gemini_api_key")
+    if not gemini_key:
+        return jsonify({"error": "Missing Gemini API key"}), 400
+
+    symbol = request.args.get("symbol")
+    if not symbol:
+        return jsonify({"error": "Missing stock symbol"}), 400
+
+    stock = get_stock_data(symbol)
+    if "error" in stock:
+        return jsonify(stock), 400
+
+    from backend_stocks import stock_advice_prompt
+    chunks = llm_stream(stock_advice_prompt(symbol, stock["history"]), gemini_key, caller="stocks")
+
+    def events():
+        yield sse("data", build_stock_response(stock, ""))
+        yield from stream_result(stock_advice_key(symbol, stock["history"]), chunks, advice_payload)
 
-    ai_text = llm_stock_advice(symbol, hist, gemini_key)
+    return sse_response(events())
 
+def advice_payload(text):
+    text = text or "AI could not generate advice."
+    return {"advice": text, "decision": advice_decision(text)}
+
+def advice_decision(ai_text):
     if "Strong Buy" in ai_text:
-        decision = "Strong Buy"
+        return "Strong Buy"
     elif "Buy" in ai_text:
-        decision = "Buy"
+        return "Buy"
     elif "Hold" in ai_text:
-        decision = "Hold"
+        return "Hold"
     elif "Sell" in ai_text:
-        decision = "Sell"
+        return "Sell"
     elif "Strong Sell" in ai_text:
-        decision = "Strong Sell"
-    else:
-        decision = "No Decision"
+        return "Strong Sell"
+    return "No Decision"
 
-    return jsonify({
+def build_stock_response(stock, ai_text):
+    hist = stock["history"]
+    last_price = hist["Close"].iloc[-1]
+    pct_change = ((last_price - hist["Close"].iloc[0]) / hist["Close"].iloc[0]) * 100
+    highest = hist["Close"].max()
+    lowest = hist["Close"].min()
+
+    return {
         "symbol": stock["symbol"],
         "last_price": round(last_price, 2),
         "pct_change": round(pct_change, 2),
@@ -512,8 +632,8 @@ def api_stocks():
         "lowest": round(lowest, 2),
         "history": hist.to_dict(orient="records"),
         "advice": ai_text,      
-        "decision": decision   
-    })
+        "decision": advice_decision(ai_text)
+    }
 
 # ---------------------------
 # 🌐 Crypto Page
@@ -523,19 +643,18 @@ def crypto():
     if "email" not in session:
         return redirect(url_for("login"))
 
-    resp = supabase.table("users").select("google_gemini_api_key").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "google_gemini_api_key")
+    if not user:
         flash("User not found.", "danger")
         return redirect(url_for("login"))
 
-    user = resp.data[0]
     gemini_key = user.get("google_gemini_api_key")
 
     if not gemini_key:
         if request.method == "POST":
             new_key = request.form.get("google_gemini_api_key").strip()
             if new_key:
-                supabase.table("users").update({"google_gemini_api_key": new_key}).eq("email", session["email"]).execute()
+                update_user(supabase, session["email"], {"google_gemini_api_key": new_key})
                 flash("Gemini API key saved!", "success")
                 return redirect(url_for("crypto"))
         return render_template("key_setup.html", service="Crypto", field_name="google_gemini_api_key")
@@ -562,10 +681,9 @@ def api_crypto():
     if "email" not in session:
         return jsonify({"error": "Not logged in"}), 403
 
-    resp = supabase.table("users").select("google_gemini_api_key").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "google_gemini_api_key")
+    if not user:
         return jsonify({"error": "User not found"}), 404
-    user = resp.data[0]
     gemini_key = user.get("google_gemini_api_key")
     if not gemini_key:
         return jsonify({"error": "Missing Gemini API key"}), 400
@@ -581,33 +699,58 @@ def api_crypto():
     if "error" in crypto:
         return jsonify(crypto), 400
 
-    df = crypto["history"]
+    ai_text = cached(
+        crypto_advice_key(coin_id, crypto["history"]),
+        lambda: llm_crypto_advice(coin_id, crypto["history"], gemini_key),
+        is_llm_text
+    )
+    return jsonify(build_crypto_response(coin_id, crypto["history"], ai_text))
+
+def crypto_advice_key(coin_id, df):
+    return ("crypto", coin_id, str(df["Date"].iloc[-1]))
+
+@app.route("/api/crypto/stream", methods=["GET"])
+def api_crypto_stream():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 403
+
+    user = get_user(supabase, session["email"], "google_gemini_api_key")
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    gemini_key = user.get("google_gemini_api_key")
+    if not gemini_key:
+        return jsonify({"error": "Missing Gemini API key"}), 400
+
+    symbol = request.args.get("symbol")
+    if not symbol:
+        return jsonify({"error": "Missing crypto symbol"}), 400
+
+    coin_id = CRYPTO_MAP.get(symbol, symbol.lower())
+    crypto = get_crypto_data(coin_id)
+    if "error" in crypto:
+        return jsonify(crypto), 400
+
+    from backend_crypto import crypto_advice_prompt
+    chunks = llm_stream(crypto_advice_prompt(coin_id, crypto["history"]), gemini_key, caller="crypto")
+
+    def events():
+        yield sse("data", build_crypto_response(coin_id, crypto["history"], ""))
+        yield from stream_result(crypto_advice_key(coin_id, crypto["history"]), chunks, advice_payload)
+
+    return sse_response(events())
+
+def build_crypto_response(coin_id, df, ai_text):
     last_price = df["price"].iloc[-1]
     pct_change = ((df["price"].iloc[-1] - df["price"].iloc[0]) / df["price"].iloc[0]) * 100
     highest = df["price"].max()
     lowest = df["price"].min()
 
-    ai_text = llm_crypto_advice(coin_id, df, gemini_key)
-
-    if "Strong Buy" in ai_text:
-        decision = "Strong Buy"
-    elif "Buy" in ai_text:
-        decision = "Buy"
-    elif "Hold" in ai_text:
-        decision = "Hold"
-    elif "Sell" in ai_text:
-        decision = "Sell"
-    elif "Strong Sell" in ai_text:
-        decision = "Strong Sell"
-    else:
-        decision = "No Decision"
-
     history = [
         {"Date": row.Date.strftime("%Y-%m-%d %H:%M"), "price": float(row.price)}
         for _, row in df.iterrows()
     ]
 
-    return jsonify({
+    return {
         "symbol": coin_id,
         "name": CRYPTO_NAMES.get(coin_id, coin_id.upper()),
         "last_price": round(last_price, 2),
@@ -616,16 +759,139 @@ def api_crypto():
         "lowest": round(lowest, 2),
         "history": history,       
         "advice": ai_text,
-        "decision": decision
+        "decision": advice_decision(ai_text)
+    }
+
+# ---------------------------
+# Watchlists: many symbols per request, one upstream fetch for all of them and
+# (unless "advice": false) one LLM call rating every symbol.
+# ---------------------------
+def batch_request():
+    data = request.get_json(silent=True) or {}
+    symbols = parse_symbols(data.get("symbols"))
+    if not symbols:
+        return None, None, (jsonify({"error": "Missing symbols"}), 400)
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return None, None, (jsonify({"error": f"At most {MAX_BATCH_SYMBOLS} symbols per request"}), 400)
+
+    gemini_key = None
+    if data.get("advice", True):
+        user = get_user(supabase, session["email"], "google_gemini_api_key")
+        gemini_key = user and user.get("google_gemini_api_key")
+        if not gemini_key:
+            return None, None, (jsonify({"error": "Missing Gemini API key"}), 400)
+    return symbols, {"gemini_api_key": gemini_key, "history": bool(data.get("history"))}, None
+
+@app.route("/api/stocks/batch", methods=["POST"])
+def api_stocks_batch():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 403
+    symbols, options, error = batch_request()
+    if error:
+        return error
+
+    closes, errors = get_stocks_closes(symbols)
+    results = summarize_batch("stock", closes, "30d", caller="stocks_batch", **options)
+    return jsonify({"results": results, "errors": errors, "window": "30d"})
+
+@app.route("/api/crypto/batch", methods=["POST"])
+def api_crypto_batch():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 403
+    symbols, options, error = batch_request()
+    if error:
+        return error
+
+    ids = [CRYPTO_MAP.get(s.upper(), s.lower()) for s in symbols]
+    closes, markets, errors = get_cryptos_closes(ids)
+    results = summarize_batch("crypto", closes, "7d", caller="crypto_batch", **options)
+    for coin_id, result in results.items():
+        market = markets[coin_id]
+        result["name"] = CRYPTO_NAMES.get(coin_id, coin_id.upper())
+        result["last_price"] = market.get("current_price", result["last_price"])
+        result["change_24h"] = market.get("price_change_percentage_24h_in_currency")
+        result["change_30d"] = market.get("price_change_percentage_30d_in_currency")
+    return jsonify({"results": results, "errors": errors, "window": "7d"})
+
+@app.route("/api/prices", methods=["GET"])
+def api_prices():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 403
+
+    stocks = [s.upper() for s in parse_symbols(request.args.get("stocks"))]
+    coins = [CRYPTO_MAP.get(s.upper(), s.lower()) for s in parse_symbols(request.args.get("crypto"))]
+    if not stocks and not coins:
+        return jsonify({"error": "Missing symbols"}), 400
+    if len(stocks) + len(coins) > MAX_BATCH_SYMBOLS:
+        return jsonify({"error": f"At most {MAX_BATCH_SYMBOLS} symbols per request"}), 400
+
+    stock_prices, stock_errors = get_stock_prices(stocks) if stocks else ({}, {})
+    crypto_prices, crypto_errors = get_crypto_prices(coins) if coins else ({}, {})
+    return jsonify({
+        "stocks": stock_prices,
+        "crypto": crypto_prices,
+        "errors": {**stock_errors, **crypto_errors}
     })
 
+# ---------------------------
+# Watchlists: saved per user, priced by one shared background poller and
+# pushed to the page over SSE (tick and advice events)
+# ---------------------------
+def watchlist_symbol(kind, symbol):
+    symbol = (symbol or "").strip()
+    if kind == "crypto":
+        return CRYPTO_MAP.get(symbol.upper(), symbol.lower())
+    return symbol.upper()
+
+@app.route("/api/watchlist", methods=["GET", "POST", "DELETE"])
+def api_watchlist():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 403
+
+    if request.method == "GET":
+        return jsonify(backend_watchlist.load_watchlist(supabase, session["email"]))
+
+    data = request.get_json(silent=True) or {}
+    kind = data.get("kind")
+    symbol = watchlist_symbol(kind, data.get("symbol"))
+    if kind not in backend_watchlist.WATCHLIST_KINDS or not symbol:
+        return jsonify({"error": "Expected kind (stock or crypto) and symbol"}), 400
+
+    if request.method == "DELETE":
+        return jsonify(backend_watchlist.remove_symbol(supabase, session["email"], kind, symbol))
+    try:
+        return jsonify(backend_watchlist.add_symbol(supabase, session["email"], kind, symbol))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/watchlist/stream", methods=["GET"])
+def api_watchlist_stream():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 403
+
+    email = session["email"]
+    user = get_user(supabase, email, "google_gemini_api_key")
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    watchlist = backend_watchlist.load_watchlist(supabase, email)
+    q = backend_watchlist.subscribe(email, watchlist, user.get("google_gemini_api_key"))
+
+    def events():
+        try:
+            yield from backend_watchlist.events(q)
+        finally:
+            backend_watchlist.unsubscribe(email, q)
+
+    return sse_response(events())
+
 @app.route("/horoscope", methods=["GET", "POST"])
 def horoscope():
     email = session.get("email")
     if not email:
         return jsonify({"error": "Not logged in"}), 403
 
-    user = supabase.table("users").select("google_gemini_api_key, zodiac_sign").eq("email", email).execute().data[0]
+    user = get_user(supabase, email, "google_gemini_api_key", "zodiac_sign")
 
     gemini_key = user.get("google_gemini_api_key")
     zodiac_sign = user.get("zodiac_sign")
@@ -638,7 +904,7 @@ def horoscope():
         if "zodiac_sign" in data:
             updates["zodiac_sign"] = data["zodiac_sign"]
         if updates:
-            supabase.table("users").update(updates).eq("email", email).execute()
+            update_user(supabase, email, updates)
             return jsonify({"message": "Saved!"})
     
     missing = []
@@ -649,35 +915,83 @@ def horoscope():
     if missing:
         return jsonify({"need_api": True, "missing": missing})
 
-    horoscope = get_ai_horoscope(zodiac_sign, gemini_key)
+    horoscope = cached(
+        horoscope_key(zodiac_sign),
+        lambda: get_ai_horoscope(zodiac_sign, gemini_key),
+        is_llm_text
+    )
     return jsonify({
         "zodiac": zodiac_sign.capitalize(),
         "horoscope": horoscope
     })
 
-def get_ai_horoscope(sign: str, gemini_key: str):
-    
-    genai.configure(api_key=gemini_key)
+def horoscope_key(sign):
+    return ("horoscope", sign, datetime.now().strftime("%Y-%m-%d"))
+
+def horoscope_prompt(sign: str):
+    return f"Give me today's horoscope for {sign} in simple, positive, practical language (3–4 sentences)."
+
+@app.route("/horoscope/stream", methods=["GET"])
+def horoscope_stream():
+    email = session.get("email")
+    if not email:
+        return jsonify({"error": "Not logged in"}), 403
+
+    user = get_user(supabase, email, "google_gemini_api_key", "zodiac_sign")
+    if not user:
+        return jsonify({"error": "User not found"}), 404
 
-    GEMINI_MODEL = genai.GenerativeModel("gemini-1.5-flash")
-    prompt = f"Give me today's horoscope for {sign} in simple, positive, practical language (3–4 sentences)."
+    gemini_key = user.get("google_gemini_api_key")
+    zodiac_sign = user.get("zodiac_sign")
+    if not gemini_key or not zodiac_sign:
+        return jsonify({"error": "Missing Gemini API key or zodiac sign"}), 400
+
+    chunks = llm_stream(horoscope_prompt(zodiac_sign), gemini_key, caller="horoscope")
+    return sse_response(stream_result(
+        horoscope_key(zodiac_sign), chunks,
+        lambda text: {"zodiac": zodiac_sign.capitalize(), "horoscope": text}
+    ))
+
+def get_ai_horoscope(sign: str, gemini_key: str):
     try:
-        response = GEMINI_MODEL.generate_content(prompt)
-        return response.text
+        return llm_generate(horoscope_prompt(sign), gemini_key, caller="horoscope")
     except Exception as e:
         return f"⚠️ Error: {e}"
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if not instrumentation.METRICS_ENABLED:
+        return "metrics disabled\n", 404
+    return Response(instrumentation.render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/llm/stats", methods=["GET"])
+def api_llm_stats():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    return jsonify(llm_stats())
+
+@app.route("/api/db/stats", methods=["GET"])
+def api_db_stats():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    return jsonify(db_stats())
+
+@app.route("/api/upstreams", methods=["GET"])
+def api_upstreams():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    return jsonify(breaker_stats())
+
 @app.route("/email", methods=["GET", "POST"])
 def email_ai():
     if "email" not in session:
         return redirect(url_for("login"))
 
-    resp = supabase.table("users").select("*").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "google_gemini_api_key", "client_secret_json")
+    if not user:
         flash("User not found.", "danger")
         return redirect(url_for("login"))
 
-    user = resp.data[0]
     gemini_key = user.get("google_gemini_api_key")
     client_secret = user.get("client_secret_json")
 
@@ -693,7 +1007,8 @@ def email_ai():
                 update_data["client_secret_json"] = new_client
 
             if update_data:
-                supabase.table("users").update(update_data).eq("email", session["email"]).execute()
+                update_user(supabase, session["email"], update_data)
+                invalidate_google_services(session["email"])
                 flash("Keys updated successfully! Please continue.", "success")
                 return redirect(url_for("email_ai"))
 
@@ -708,11 +1023,11 @@ def api_summarize_emails():
     if "email" not in session:
         return jsonify({"error": "Not logged in"}), 401
 
-    resp = supabase.table("users").select("*").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "google_gemini_api_key", "client_secret_json",
+                    *gmail_user_columns(session["email"]))
+    if not user:
         return jsonify({"error": "User not found"}), 404
 
-    user = resp.data[0]
     gemini_key = user.get("google_gemini_api_key")
     client_secret_json = user.get("client_secret_json")
 
@@ -722,19 +1037,111 @@ def api_summarize_emails():
     from backend_email import get_last_48h_emails, summarize_emails
     emails = get_last_48h_emails(session["email"], supabase, client_secret_json)
 
-    summary = summarize_emails(emails, gemini_key)
+    summary = cached(email_summary_key(session["email"], emails), lambda: summarize_emails(emails, gemini_key))
+    prewarm_replies(session["email"], emails, gemini_key)
     return jsonify({"summary": summary, "emails": emails})
 
+def email_summary_key(user_email, emails):
+    return ("emails", user_email, tuple(e["id"] for e in emails))
+
+@app.route("/api/summarize_emails/stream", methods=["GET"])
+def api_summarize_emails_stream():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    user = get_user(supabase, session["email"], "google_gemini_api_key", "client_secret_json",
+                    *gmail_user_columns(session["email"]))
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    gemini_key = user.get("google_gemini_api_key")
+    client_secret_json = user.get("client_secret_json")
+
+    if not gemini_key or not client_secret_json:
+        return jsonify({"error": "Missing API credentials"}), 400
+
+    from backend_email import get_last_48h_emails, summarize_emails_stream, summary_to_html
+    user_email = session["email"]
+    emails = get_last_48h_emails(user_email, supabase, client_secret_json)
+    prewarm_replies(user_email, emails, gemini_key)
+
+    def events():
+        yield sse("emails", [email_listing(e) for e in emails])
+        if not emails:
+            yield sse("done", {"summary": "No emails in the last 48 hours."})
+            return
+        yield from stream_result(
+            email_summary_key(user_email, emails), summarize_emails_stream(emails, gemini_key),
+            lambda summary: {"summary": summary}, render=summary_to_html
+        )
+
+    return sse_response(events())
+
+@app.route("/api/emails", methods=["GET"])
+def api_emails():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    user = get_user(supabase, session["email"], "client_secret_json", *gmail_user_columns(session["email"]))
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    client_secret_json = user.get("client_secret_json")
+    if not client_secret_json:
+        return jsonify({"error": "Missing Gmail credentials"}), 400
+
+    from backend_email import list_emails, EMAIL_PAGE_SIZE
+    page = list_emails(session["email"], supabase, client_secret_json,
+                       page_token=request.args.get("page_token") or None,
+                       page_size=request.args.get("page_size", EMAIL_PAGE_SIZE, type=int))
+    return jsonify(page)
+
+@app.route("/api/emails/<message_id>", methods=["GET"])
+def api_email_body(message_id):
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    user = get_user(supabase, session["email"], "client_secret_json", *gmail_user_columns(session["email"]))
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    client_secret_json = user.get("client_secret_json")
+    if not client_secret_json:
+        return jsonify({"error": "Missing Gmail credentials"}), 400
+
+    from backend_email import get_email_body
+    email = get_email_body(session["email"], supabase, client_secret_json, message_id)
+    if email is None:
+        return jsonify({"error": "Email not found"}), 404
+    learn_importance(session["email"], message_id, "open")
+
+    response = jsonify(email)
+    response.headers["Cache-Control"] = "private, max-age=300"
+    return response
+
+@app.route("/api/emails/search", methods=["GET"])
+def api_emails_search():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing search query"}), 400
+
+    results = search_emails(session["email"], query,
+                            limit=request.args.get("limit", 20, type=int),
+                            offset=request.args.get("offset", 0, type=int))
+    return jsonify({"query": query, "results": results})
+
 @app.route("/api/generate_replies", methods=["POST"])
 def api_generate_replies():
     if "email" not in session:
         return jsonify({"error": "Not logged in"}), 401
 
-    resp = supabase.table("users").select("*").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "google_gemini_api_key")
+    if not user:
         return jsonify({"error": "User not found"}), 404
 
-    user = resp.data[0]
     gemini_key = user.get("google_gemini_api_key")
 
     if not gemini_key:
@@ -745,7 +1152,7 @@ def api_generate_replies():
     if not email_body:
         return jsonify({"error": "No email body provided"}), 400
     
-    replies = generate_replies(email_body, gemini_key)
+    replies = get_replies(session["email"], data.get("id"), email_body, gemini_key)
     return jsonify({"replies": replies})
 
 @app.route("/api/send_email", methods=["POST"])
@@ -753,11 +1160,10 @@ def api_send_email():
     if "email" not in session:
         return jsonify({"error": "Not logged in"}), 401
 
-    resp = supabase.table("users").select("*").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "client_secret_json", *gmail_user_columns(session["email"]))
+    if not user:
         return jsonify({"error": "User not found"}), 404
 
-    user = resp.data[0]
     client_secret_json = user.get("client_secret_json")
 
     if not client_secret_json:
@@ -779,6 +1185,8 @@ def api_send_email():
         subject=subject,
         body_text=body_text
     )
+    if success and data.get("id"):
+        learn_importance(session["email"], data["id"], "reply")
 
     return jsonify({"success": success, "message": msg})
 
@@ -788,8 +1196,8 @@ def reminders():
         return redirect(url_for("login"))
 
     email = session["email"]
-    resp = supabase.table("users").select("client_secret_json").eq("email", email).execute()
-    has_secret = resp.data and resp.data[0]["client_secret_json"]
+    user = get_user(supabase, email, "client_secret_json", *calendar_user_columns(email))
+    has_secret = user and user["client_secret_json"]
 
     if not has_secret:
         if request.method == "POST":
@@ -802,7 +1210,7 @@ def reminders():
                 flash("⚠️ Invalid JSON format. Please paste the full Google Client Secret JSON.", "error")
                 return redirect(url_for("reminders"))
 
-            supabase.table("users").update({"client_secret_json": client_secret_json}).eq("email", email).execute()
+            update_user(supabase, email, {"client_secret_json": client_secret_json})
             flash("✅ Google Client Secret saved! Now connect your Google account.", "success")
             return redirect(url_for("reminders"))
 
@@ -815,32 +1223,132 @@ def reminders():
         start_time = request.form["start_time"]
         end_time = request.form["end_time"]
 
-        add_task_to_calendar(email, supabase, title, desc, date, start_time, end_time)
-        flash("✅ Task added successfully to Google Calendar!", "success")  
+        message = add_task_to_calendar(email, supabase, title, desc, date, start_time, end_time)
+        flash(message, "success" if message.startswith("✅") else "danger")
 
         return redirect(url_for("reminders"))   
     return render_template("reminders.html")
 
+@app.route("/api/calendar/free_slots", methods=["GET"])
+def api_calendar_free_slots():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    try:
+        duration = int(request.args.get("duration", 30))
+        count = min(int(request.args.get("count", 5)), 50)
+        work_hours = None
+        if request.args.get("work_start") is not None and request.args.get("work_end") is not None:
+            work_hours = (int(request.args["work_start"]), int(request.args["work_end"]))
+            if not 0 <= work_hours[0] < work_hours[1] <= 23:
+                raise ValueError("working hours must satisfy 0 <= start < end <= 23")
+        if duration <= 0 or count <= 0:
+            raise ValueError("duration and count must be positive")
+
+        slots = find_free_slots(
+            session["email"], supabase, duration, count,
+            after=request.args.get("after"),
+            timezone=request.args.get("tz"),
+            work_hours=work_hours
+        )
+    except (ValueError, KeyError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if slots is None:
+        return jsonify({"error": "Please connect your Google Calendar first."}), 400
+    return jsonify({"slots": slots})
+
+MAX_BULK_TASKS = 500
+
+@app.route("/api/reminders/bulk", methods=["POST"])
+def api_reminders_bulk():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    try:
+        if "ics" in request.files:
+            tasks = parse_ics(request.files["ics"].read().decode("utf-8", errors="replace"))
+        else:
+            data = request.get_json(silent=True) or {}
+            tasks = parse_ics(data["ics"]) if data.get("ics") else data.get("tasks")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid calendar file: {e}"}), 400
+
+    if not isinstance(tasks, list) or not tasks:
+        return jsonify({"error": "No tasks provided"}), 400
+    if len(tasks) > MAX_BULK_TASKS:
+        return jsonify({"error": f"At most {MAX_BULK_TASKS} tasks per import"}), 400
+
+    results = add_tasks_to_calendar(session["email"], supabase, tasks)
+    if results is None:
+        return jsonify({"error": "Please connect your Google Calendar first."}), 400
+
+    counts = {"created": 0, "duplicate": 0, "error": 0}
+    for r in results:
+        counts[r["status"]] += 1
+    return jsonify({"results": results, "created": counts["created"],
+                    "duplicate": counts["duplicate"], "failed": counts["error"]})
+
+NEWS_PAGE_SIZE = 10
+
 @app.route("/news", methods=["GET"])
 def news():
     if "email" not in session:
         return redirect(url_for("login"))
 
-    resp = supabase.table("users").select("news_api").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "news_api")
+    if not user:
         return redirect(url_for("login"))
 
-    user = resp.data[0]
 
     if not user or not user.get("news_api"):
         return render_template("news_api_setup.html")
 
+    start_news_prefetcher()
     try:
-        news_articles = get_today_news(user["news_api"], limit=10)
-        return render_template("news.html", news=news_articles)
+        news_articles = get_today_news(user["news_api"], limit=NEWS_PAGE_SIZE)
+        return render_template("news.html", news=news_articles, page_size=NEWS_PAGE_SIZE)
     except Exception as e:
         return render_template("news.html", news=None, error=str(e))
 
+@app.route("/api/news", methods=["GET"])
+def api_news():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    user = get_user(supabase, session["email"], "news_api")
+    if not user or not user.get("news_api"):
+        return jsonify({"error": "Missing news API key"}), 400
+
+    try:
+        offset = max(int(request.args.get("offset", 0)), 0)
+    except ValueError:
+        return jsonify({"error": "Invalid offset"}), 400
+
+    try:
+        articles = get_today_news(user["news_api"], limit=NEWS_PAGE_SIZE, offset=offset)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+    return jsonify({"news": articles, "next_offset": offset + len(articles)})
+
+@app.route("/api/news/digest", methods=["GET"])
+def api_news_digest():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    user = get_user(supabase, session["email"], "news_api", "google_gemini_api_key")
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    if not user.get("news_api") or not user.get("google_gemini_api_key"):
+        return jsonify({"need_api": True})
+
+    try:
+        digest = get_news_digest(user["news_api"], user["google_gemini_api_key"])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+    return jsonify(digest)
+
 @app.route("/setup_news_api", methods=["POST"])
 def setup_news_api():
     if "email" not in session:
@@ -848,7 +1356,7 @@ def setup_news_api():
 
     news_api = request.form.get("news_api")
     if news_api:
-        supabase.table("users").update({"news_api": news_api}).eq("email", session["email"]).execute()
+        update_user(supabase, session["email"], {"news_api": news_api})
     return redirect(url_for("news"))
 
 @app.route("/expenses")
@@ -860,18 +1368,17 @@ def movies():
     if "email" not in session:
         return redirect(url_for("login"))
 
-    resp = supabase.table("users").select("tmdb_api").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "tmdb_api")
+    if not user:
         flash("User not found!", "danger")
         return redirect(url_for("index"))
 
-    user = resp.data[0]
     tmdb_key = user.get("tmdb_api")
 
     if not tmdb_key:
         if request.method == "POST":
             new_key = request.form.get("tmdb_api").strip()
-            supabase.table("users").update({"tmdb_api": new_key}).eq("email", session["email"]).execute()
+            update_user(supabase, session["email"], {"tmdb_api": new_key})
             flash("TMDB API key saved!", "success")
             return redirect(url_for("movies"))
         return render_template("TMDB_API_setup.html")
@@ -882,20 +1389,20 @@ def movies():
 def api_movies_genres():
     if "email" not in session:
         return jsonify([])
-    resp = supabase.table("users").select("tmdb_api").eq("email", session["email"]).execute()
-    if not resp.data or not resp.data[0].get("tmdb_api"):
+    user = get_user(supabase, session["email"], "tmdb_api")
+    if not user or not user.get("tmdb_api"):
         return jsonify([])
-    api_key = resp.data[0]["tmdb_api"]
+    api_key = user["tmdb_api"]
     return jsonify(get_genres(api_key))
 
 @app.route("/api/movies", methods=["POST"])
 def api_movies():
     if "email" not in session:
         return jsonify([])
-    resp = supabase.table("users").select("tmdb_api").eq("email", session["email"]).execute()
-    if not resp.data or not resp.data[0].get("tmdb_api"):
+    user = get_user(supabase, session["email"], "tmdb_api")
+    if not user or not user.get("tmdb_api"):
         return jsonify([])
-    api_key = resp.data[0]["tmdb_api"]
+    api_key = user["tmdb_api"]
 
     data = request.get_json()
     genres = data.get("genre")
@@ -912,18 +1419,17 @@ def travel():
         flash("Please log in to access Travel Planner.", "danger")
         return redirect(url_for("login"))
 
-    resp = supabase.table("users").select("*").eq("email", session["email"]).execute()
-    if not resp.data:
+    user = get_user(supabase, session["email"], "google_map_api")
+    if not user:
         flash("User not found!", "danger")
         return redirect(url_for("index"))
 
-    user = resp.data[0]
     api_key = user.get("google_map_api")
 
     if not api_key:
         if request.method == "POST":
             new_key = request.form.get("google_map_api").strip()
-            supabase.table("users").update({"google_map_api": new_key}).eq("email", session["email"]).execute()
+            update_user(supabase, session["email"], {"google_map_api": new_key})
             flash("Google Maps API Key saved!", "success")
             return redirect(url_for("travel"))
         return render_template("travel_key_form.html")
@@ -956,6 +1462,59 @@ def travel():
         selected_types=selected_types
     )
 
+@app.route("/api/travel/itinerary", methods=["POST"])
+def api_travel_itinerary():
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    data = request.get_json(silent=True) or {}
+    start = data.get("start") or {}
+    places = data.get("places") or []
+    try:
+        start = {"lat": float(start["lat"]), "lon": float(start["lon"])}
+        for p in places:
+            p["lat"], p["lon"] = float(p["lat"]), float(p["lon"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "start and every place need numeric lat and lon"}), 400
+    # float() accepts "nan" and "inf", which would poison every distance
+    if not all(math.isfinite(v) for p in [start] + places for v in (p["lat"], p["lon"])):
+        return jsonify({"error": "lat and lon must be finite numbers"}), 400
+
+    if not places:
+        return jsonify({"error": "No places to visit"}), 400
+    if len(places) > ITINERARY_MAX_PLACES:
+        return jsonify({"error": f"At most {ITINERARY_MAX_PLACES} places per itinerary"}), 400
+
+    return jsonify(plan_itinerary(start, places))
+
+@app.route("/travel/photo/<ref>", methods=["GET"])
+def travel_photo(ref):
+    # place photos go through here so the Maps key never reaches the page
+    if "email" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    width = request.args.get("w", 400, type=int)
+    photo = cached_photo(ref, width)
+    if photo is None:
+        user = get_user(supabase, session["email"], "google_map_api")
+        api_key = user.get("google_map_api") if user else None
+        if not api_key:
+            return jsonify({"error": "Missing Google Maps API key"}), 400
+        photo = fetch_photo(api_key, ref, width)
+        if photo is None:
+            return jsonify({"error": "Photo not found"}), 404
+
+    digest, data, content_type = photo
+    response = Response(data, content_type=content_type)
+    response.set_etag(digest)
+    # a reference and width always map to the same bytes; private, since
+    # only logged-in users may fetch them
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response.make_conditional(request)
+
+startup_timing.mark("app")
+startup_timing.report()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
 
@@ -0,0 +1,224 @@
+import os
+from quart import Quart, request, session, jsonify
+from asgiref.wsgi import WsgiToAsgi
+from supabase import acreate_client
+
+import app as wsgi_module
+from backend_email import prewarm_replies
+from backend_stream import get_result, put_result
+from backend_async import (
+    close_http_client,
+    discover_movies_async,
+    get_crypto_data_async,
+    get_last_48h_emails_async,
+    get_stock_data_async,
+    get_user_location_city_async,
+    get_weather_async,
+    llm_crypto_advice_async,
+    llm_stock_advice_async,
+    llm_weather_advice_async,
+    summarize_emails_async
+)
+
+# Run with:  uvicorn asgi:create_app --factory --port 5000
+#
+# The I/O-heavy endpoints below are served by async views; every other path
+# falls through to the existing Flask app, which keeps running unchanged.
+ASYNC_PATHS = {
+    "/api/stocks",
+    "/api/crypto",
+    "/weather",
+    "/api/summarize_emails",
+    "/api/movies",
+}
+
+def create_app(flask_app=None):
+    flask_app = flask_app or wsgi_module.app
+
+    quart_app = Quart(__name__)
+    # same key and cookie settings, so the Flask login session is valid here
+    quart_app.secret_key = flask_app.secret_key
+    quart_app.config["SESSION_COOKIE_NAME"] = flask_app.config["SESSION_COOKIE_NAME"]
+
+    clients = {}
+
+    @quart_app.before_serving
+    async def startup():
+        clients["supabase"] = await acreate_client(
+            os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+        )
+
+    @quart_app.after_serving
+    async def shutdown():
+        await close_http_client()
+
+    async def fetch_user(email, columns):
+        resp = await clients["supabase"].table("users").select(columns).eq("email", email).execute()
+        return resp.data[0] if resp.data else None
+
+    # shares the answer cache with the Flask JSON and streaming endpoints
+    async def cached_llm(key, produce, is_valid=wsgi_module.is_llm_text):
+        text = get_result(key)
+        if text is None:
+            text = await produce()
+            if is_valid(text):
+                put_result(key, text)
+        return text
+
+    @quart_app.route("/api/stocks", methods=["POST"])
+    async def api_stocks():
+        if "email" not in session:
+            return jsonify({"error": "Not logged in"}), 403
+
+        user = await fetch_user(session["email"], "google_gemini_api_key")
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        gemini_key = user.get("google_gemini_api_key")
+        if not gemini_key:
+            return jsonify({"error": "Missing Gemini API key"}), 400
+
+        data = await request.get_json()
+        symbol = data.get("symbol")
+        if not symbol:
+            return jsonify({"error": "Missing stock symbol"}), 400
+
+        stock = await get_stock_data_async(symbol)
+        if "error" in stock:
+            return jsonify(stock), 400
+
+        ai_text = await cached_llm(
+            wsgi_module.stock_advice_key(symbol, stock["history"]),
+            lambda: llm_stock_advice_async(symbol, stock["history"], gemini_key)
+        )
+        return jsonify(wsgi_module.build_stock_response(stock, ai_text))
+
+    @quart_app.route("/api/crypto", methods=["POST"])
+    async def api_crypto():
+        if "email" not in session:
+            return jsonify({"error": "Not logged in"}), 403
+
+        user = await fetch_user(session["email"], "google_gemini_api_key")
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        gemini_key = user.get("google_gemini_api_key")
+        if not gemini_key:
+            return jsonify({"error": "Missing Gemini API key"}), 400
+
+        data = await request.get_json()
+        symbol = data.get("symbol")
+        if not symbol:
+            return jsonify({"error": "Missing crypto symbol"}), 400
+
+        coin_id = wsgi_module.CRYPTO_MAP.get(symbol, symbol.lower())
+
+        crypto = await get_crypto_data_async(coin_id)
+        if "error" in crypto:
+            return jsonify(crypto), 400
+
+        ai_text = await cached_llm(
+            wsgi_module.crypto_advice_key(coin_id, crypto["history"]),
+            lambda: llm_crypto_advice_async(coin_id, crypto["history"], gemini_key)
+        )
+        return jsonify(wsgi_module.build_crypto_response(coin_id, crypto["history"], ai_text))
+
+    @quart_app.route("/weather", methods=["GET", "POST"])
+    async def weather():
+        if "email" not in session:
+            return jsonify({"error": "Not logged in"}), 403
+
+        try:
+            user = await fetch_user(session["email"], "weather_api, google_gemini_api_key")
+            if not user:
+                return jsonify({"error": "User not found"}), 404
+
+            weather_api = user.get("weather_api")
+            gemini_api = user.get("google_gemini_api_key")
+
+            if request.method == "POST":
+                data = await request.get_json()
+                new_weather = data.get("weather_api")
+                new_gemini = data.get("google_gemini_api_key")
+                update_data = {}
+                if new_weather:
+                    update_data["weather_api"] = new_weather.strip()
+                if new_gemini:
+                    update_data["google_gemini_api_key"] = new_gemini.strip()
+
+                if update_data:
+                    await clients["supabase"].table("users").update(update_data).eq(
+                        "email", session["email"]
+                    ).execute()
+                    return jsonify({"success": True, "message": "API keys saved!"})
+
+            missing = []
+            if not weather_api:
+                missing.append("weather_api")
+            if not gemini_api:
+                missing.append("google_gemini_api_key")
+
+            if missing:
+                return jsonify({"need_api": True, "missing": missing})
+
+            city = await get_user_location_city_async() or "London"
+            weather_data = await get_weather_async(city, weather_api)
+            advice = await cached_llm(
+                wsgi_module.weather_advice_key(city, weather_data),
+                lambda: llm_weather_advice_async(city, weather_data, gemini_api)
+            )
+            return jsonify({"weather": weather_data, "advice": advice})
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @quart_app.route("/api/summarize_emails", methods=["GET"])
+    async def api_summarize_emails():
+        if "email" not in session:
+            return jsonify({"error": "Not logged in"}), 401
+
+        user = await fetch_user(session["email"], "google_gemini_api_key, client_secret_json")
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+
+        gemini_key = user.get("google_gemini_api_key")
+        client_secret_json = user.get("client_secret_json")
+
+        if not gemini_key or not client_secret_json:
+            return jsonify({"error": "Missing API credentials"}), 400
+
+        emails = await get_last_48h_emails_async(session["email"], wsgi_module.supabase, client_secret_json)
+
+        summary = await cached_llm(
+            wsgi_module.email_summary_key(session["email"], emails),
+            lambda: summarize_emails_async(emails, gemini_key)
+        )
+        prewarm_replies(session["email"], emails, gemini_key)
+        return jsonify({"summary": summary, "emails": emails})
+
+    @quart_app.route("/api/movies", methods=["POST"])
+    async def api_movies():
+        if "email" not in session:
+            return jsonify([])
+        user = await fetch_user(session["email"], "tmdb_api")
+        if not user or not user.get("tmdb_api"):
+            return jsonify([])
+
+        data = await request.get_json()
+        genres = data.get("genre")
+        year = data.get("year")
+        lang = data.get("language")
+        num_movies = int(data.get("num_movies", 5))
+
+        movies = await discover_movies_async(user["tmdb_api"], genres, year, lang, num_movies)
+        return jsonify(movies)
+
+    wsgi_app = WsgiToAsgi(flask_app)
+
+    async def application(scope, receive, send):
+        if scope["type"] == "lifespan" or (
+            scope["type"] == "http" and scope["path"] in ASYNC_PATHS
+        ):
+            await quart_app(scope, receive, send)
+        else:
+            await wsgi_app(scope, receive, send)
+
+    return application
@@ -1,20 +1,57 @@
 import os
+import time
+import bisect
 import datetime
 import json
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request  
+import threading
+from collections import OrderedDict
+from zoneinfo import ZoneInfo
+
+from instrumentation import span
+from backend_db import get_user, update_user
+from backend_google import (
+    credentials_from_json,
+    credentials_to_json,
+    get_credentials,
+    get_service,
+    has_credentials,
+    token_fingerprint
+)
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.events']
+DEFAULT_TIMEZONE = os.getenv('CALENDAR_TIMEZONE', 'Asia/Kolkata')
+BATCH_SIZE = 50     # Google recommends at most 50 calls per batch request
+
+INDEX_REFRESH_SECONDS = 60      # min gap between events.list syncs per user
+INDEX_LOOKBACK_DAYS = 1         # events that ended before this are dropped
+MAX_SLOT_SEARCH_DAYS = 60
+BUSY_INDEX_MAX = 1000           # users whose index is kept; least recently used dropped
 
 def get_calendar_service(user_email, supabase):
+    return get_service(
+        user_email, "calendar", "v3",
+        lambda: get_credentials(
+            user_email, SCOPES,
+            lambda: _load_calendar_credentials(user_email, supabase),
+            lambda creds: _save_calendar_credentials(user_email, supabase, creds)
+        )
+    )
+
+def calendar_user_columns(user_email):
+    # see backend_email.gmail_user_columns
+    return () if has_credentials(user_email, SCOPES) else ("google_calendar_token",)
+
+def _save_calendar_credentials(user_email, supabase, creds):
+    update_user(supabase, user_email, {"google_calendar_token": credentials_to_json(creds)})
 
-    resp = supabase.table("users").select("client_secret_json, google_calendar_token").eq("email", user_email).execute()
-    if not resp.data:
+def _load_calendar_credentials(user_email, supabase):
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    row = get_user(supabase, user_email, "client_secret_json", "google_calendar_token")
+    if not row:
         return None
 
-    row = resp.data[0]
     client_secret_json = row.get("client_secret_json")
     token_data = row.get("google_calendar_token")
 
@@ -27,7 +64,8 @@ def get_calendar_service(user_email, supabase):
     creds = None
 
     if token_data:
-        creds = Credentials.from_authorized_user_info(token_data, SCOPES)
+        creds = credentials_from_json(token_data, SCOPES)
+    stored = token_fingerprint(creds)
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
@@ -41,29 +79,393 @@ def get_calendar_service(user_email, supabase):
             creds = flow.run_local_server(port=0)
             os.remove(temp_file)
 
-        supabase.table("users").update({
-            "google_calendar_token": json.loads(creds.to_json())
-        }).eq("email", user_email).execute()
+    if token_fingerprint(creds) != stored:
+        _save_calendar_credentials(user_email, supabase, creds)
 
-    service = build('calendar', 'v3', credentials=creds)
-    return service
+    return creds
 
 
-def add_task_to_calendar(user_email, supabase, summary, description, date, start_time, end_time):
+def add_task_to_calendar(user_email, supabase, summary, description, date, start_time, end_time,
+                         timezone=None, allow_conflicts=False):
 
     service = get_calendar_service(user_email, supabase)
     if service is None:
         return "⚠️ Please connect your Google Calendar first."
 
-    start_datetime = f"{date}T{start_time}:00"
-    end_datetime = f"{date}T{end_time}:00"
+    task = {
+        "summary": summary,
+        "description": description,
+        "date": date,
+        "start_time": start_time,
+        "end_time": end_time,
+        "timezone": timezone or DEFAULT_TIMEZONE,
+    }
+    try:
+        event, start_dt, end_dt = task_to_event(task)
+    except ValueError as e:
+        return f"⚠️ {e}."
+
+    index = get_busy_index(user_email, service)
+    if not allow_conflicts and not index.is_free(start_dt.timestamp(), end_dt.timestamp()):
+        return f"⚠️ '{summary}' overlaps an existing event on {date} between {start_time} and {end_time}."
+
+    created_event = service.events().insert(calendarId='primary', body=event).execute()
+    index.apply([created_event])
+    return f"✅ Task '{summary}' added on {date} from {start_time} to {end_time}."
+
+
+# ---------------- Free/busy index ----------------
+def _event_bounds(item):
+    start = item.get("start", {})
+    end = item.get("end", {})
+    if "dateTime" in start and "dateTime" in end:
+        return (_to_datetime(start["dateTime"], start.get("timeZone") or DEFAULT_TIMEZONE).timestamp(),
+                _to_datetime(end["dateTime"], end.get("timeZone") or DEFAULT_TIMEZONE).timestamp())
+    if "date" in start and "date" in end:
+        # all-day events are busy for the whole day in the user's zone
+        return (_to_datetime(start["date"], start.get("timeZone") or DEFAULT_TIMEZONE).timestamp(),
+                _to_datetime(end["date"], end.get("timeZone") or DEFAULT_TIMEZONE).timestamp())
+    return None
+
+# Merged, sorted busy intervals of one user's primary calendar. Events are
+# kept by id so incremental syncs can move or cancel them; lookups only
+# bisect the merged starts/ends arrays and never call the API.
+class BusyIndex:
+    def __init__(self):
+        self.events = {}
+        self.starts = []
+        self.ends = []
+        self.sync_token = None
+        self.synced_at = 0
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+
+    def apply(self, items):
+        with self.lock:
+            for item in items:
+                event_id = item.get("id")
+                if item.get("status") == "cancelled" or item.get("transparency") == "transparent":
+                    self.events.pop(event_id, None)
+                    continue
+                bounds = _event_bounds(item)
+                if bounds and bounds[1] > bounds[0]:
+                    self.events[event_id or f"local-{len(self.events)}"] = bounds
+            self._rebuild()
+
+    def _rebuild(self):
+        cutoff = time.time() - INDEX_LOOKBACK_DAYS * 86400
+        starts, ends = [], []
+        for start, end in sorted(b for b in self.events.values() if b[1] > cutoff):
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.starts, self.ends = starts, ends
+
+    def is_free(self, start_ts, end_ts):
+        starts, ends = self.starts, self.ends
+        # the only merged interval that can overlap is the last one starting before end_ts
+        i = bisect.bisect_left(starts, end_ts) - 1
+        return i < 0 or ends[i] <= start_ts
+
+    def free_slots(self, after_ts, length, count, tz_name=DEFAULT_TIMEZONE, work_hours=None):
+        # O(log n) to find the start, then one step per busy interval passed
+        # until `count` slots are found or the search horizon is reached
+        tz = ZoneInfo(tz_name)
+        starts, ends = self.starts, self.ends
+        horizon = after_ts + MAX_SLOT_SEARCH_DAYS * 86400
+
+        # jump to the first busy interval that still matters, then walk gaps
+        i = bisect.bisect_right(ends, after_ts)
+        cursor = after_ts
+        slots = []
+        while len(slots) < count and cursor < horizon:
+            gap_end = min(starts[i], horizon) if i < len(starts) else horizon
+            for slot in _slots_in_gap(cursor, gap_end, length, count - len(slots), tz, work_hours):
+                slots.append(slot)
+            if i >= len(starts) or starts[i] >= horizon:
+                break
+            cursor = max(cursor, ends[i])
+            i += 1
+        return slots
+
+def _slots_in_gap(gap_start, gap_end, length, limit, tz, work_hours):
+    slots = []
+    cursor = gap_start
+    while len(slots) < limit and cursor + length <= gap_end:
+        if work_hours:
+            local = datetime.datetime.fromtimestamp(cursor, tz)
+            day_open = local.replace(hour=work_hours[0], minute=0, second=0, microsecond=0)
+            day_close = local.replace(hour=work_hours[1], minute=0, second=0, microsecond=0)
+            if local < day_open:
+                cursor = day_open.timestamp()
+                continue
+            if local + datetime.timedelta(seconds=length) > day_close:
+                cursor = (day_open + datetime.timedelta(days=1)).timestamp()
+                continue
+        slots.append((cursor, cursor + length))
+        cursor += length
+    return slots
+
+# user -> BusyIndex, least recently used first
+_busy_indexes = OrderedDict()
+_busy_lock = threading.Lock()
+
+def _sync_busy_index(index, service):
+    params = {"calendarId": 'primary', "singleEvents": True, "maxResults": 2500,
+              "fields": "items(id,status,transparency,start,end),nextPageToken,nextSyncToken"}
+    if index.sync_token:
+        params["syncToken"] = index.sync_token
+    else:
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=INDEX_LOOKBACK_DAYS)
+        params["timeMin"] = since.isoformat()
+
+    items = []
+    page_token = None
+    while True:
+        resp = service.events().list(pageToken=page_token, **params).execute()
+        items.extend(resp.get("items", []))
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            break
+
+    if not index.sync_token:
+        index.events = {}
+    index.apply(items)
+    index.sync_token = resp.get("nextSyncToken")
+    index.synced_at = time.time()
+
+def get_busy_index(user_email, service):
+    from googleapiclient.errors import HttpError
+
+    with _busy_lock:
+        index = _busy_indexes.get(user_email)
+        if index is None:
+            index = _busy_indexes[user_email] = BusyIndex()
+        _busy_indexes.move_to_end(user_email)
+        while len(_busy_indexes) > BUSY_INDEX_MAX:
+            _busy_indexes.popitem(last=False)
+
+    if time.time() - index.synced_at >= INDEX_REFRESH_SECONDS:
+        with index.sync_lock:
+            if time.time() - index.synced_at >= INDEX_REFRESH_SECONDS:
+                try:
+                    _sync_busy_index(index, service)
+                except HttpError as e:
+                    if e.resp.status != 410:
+                        raise
+                    # sync token expired: start over with a full sync
+                    index.sync_token = None
+                    _sync_busy_index(index, service)
+    return index
+
+def find_free_slots(user_email, supabase, duration_minutes, count=5, after=None,
+                    timezone=None, work_hours=None):
+    service = get_calendar_service(user_email, supabase)
+    if service is None:
+        return None
+
+    tz_name = timezone or DEFAULT_TIMEZONE
+    after_ts = _to_datetime(after, tz_name).timestamp() if after else time.time()
+    index = get_busy_index(user_email, service)
+    return [
+        {
+            "start": datetime.datetime.fromtimestamp(start, ZoneInfo(tz_name)).isoformat(),
+            "end": datetime.datetime.fromtimestamp(end, ZoneInfo(tz_name)).isoformat(),
+        }
+        for start, end in index.free_slots(after_ts, duration_minutes * 60, count, tz_name, work_hours)
+    ]
+
+
+# ---------------- Bulk creation ----------------
+def _to_datetime(value, tz_name):
+    dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=ZoneInfo(tz_name))
+    return dt
+
+def task_to_event(task):
+    tz_name = task.get("timezone") or DEFAULT_TIMEZONE
+    if task.get("start") and task.get("end"):
+        start, end = task["start"], task["end"]
+    else:
+        start = f"{task['date']}T{task['start_time']}:00"
+        end = f"{task['date']}T{task['end_time']}:00"
+
+    all_day = bool(task.get("all_day"))
+    if all_day:
+        start, end = start[:10], end[:10]
+    start_dt = _to_datetime(start, tz_name)
+    end_dt = _to_datetime(end, tz_name)
+    if end_dt <= start_dt:
+        raise ValueError("End time must be later than start time")
 
     event = {
-        'summary': summary,
-        'description': description,
-        'start': {'dateTime': start_datetime, 'timeZone': 'Asia/Kolkata'},
-        'end': {'dateTime': end_datetime, 'timeZone': 'Asia/Kolkata'},
+        'summary': task.get("summary") or task.get("title") or "Untitled task",
+        'description': task.get("description", ""),
+        # all-day entries take plain dates; Google treats the end date as exclusive
+        'start': {'date': start} if all_day else _event_time(start_dt),
+        'end': {'date': end} if all_day else _event_time(end_dt),
     }
+    return event, start_dt, end_dt
 
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
-    return f"✅ Task '{summary}' added on {date} from {start_time} to {end_time}."
\ No newline at end of file
+def _event_time(dt):
+    tz_key = getattr(dt.tzinfo, "key", None)
+    if tz_key:
+        return {'dateTime': dt.replace(tzinfo=None).isoformat(), 'timeZone': tz_key}
+    # fixed UTC offset (e.g. an ICS "Z" time): RFC 3339 with the offset
+    return {'dateTime': dt.isoformat()}
+
+def _unfold_ics(text):
+    lines = []
+    for line in text.replace("\r\n", "\n").split("\n"):
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+def _ics_value(raw):
+    return (raw.replace("\\n", "\n").replace("\\N", "\n")
+               .replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\"))
+
+def _ics_datetime(params, value):
+    # 20250101T090000Z, 20250101T090000 (+TZID) or VALUE=DATE 20250101
+    tz_name = params.get("TZID")
+    if "T" not in value:
+        day = datetime.datetime.strptime(value, "%Y%m%d").date()
+        return day.isoformat(), tz_name
+    if value.endswith("Z"):
+        dt = datetime.datetime.strptime(value[:-1], "%Y%m%dT%H%M%S")
+        return dt.isoformat() + "+00:00", tz_name
+    return datetime.datetime.strptime(value, "%Y%m%dT%H%M%S").isoformat(), tz_name
+
+def parse_ics(text):
+    tasks = []
+    current = None
+    for line in _unfold_ics(text):
+        if line == "BEGIN:VEVENT":
+            current = {}
+            continue
+        if line == "END:VEVENT":
+            if current is not None and current.get("start"):
+                if not current.get("end"):
+                    if current.get("all_day"):
+                        # DTEND is exclusive; a lone all-day DTSTART is one day
+                        day = datetime.date.fromisoformat(current["start"]) + datetime.timedelta(days=1)
+                        current["end"] = day.isoformat()
+                    else:
+                        current["end"] = current["start"]
+                tasks.append(current)
+            current = None
+            continue
+        if current is None or ":" not in line:
+            continue
+
+        head, value = line.split(":", 1)
+        name, *raw_params = head.split(";")
+        params = dict(p.split("=", 1) for p in raw_params if "=" in p)
+        name = name.upper()
+
+        if name == "SUMMARY":
+            current["summary"] = _ics_value(value)
+        elif name == "DESCRIPTION":
+            current["description"] = _ics_value(value)
+        elif name in ("DTSTART", "DTEND"):
+            when, tz_name = _ics_datetime(params, value)
+            current["start" if name == "DTSTART" else "end"] = when
+            if name == "DTSTART" and (params.get("VALUE", "").upper() == "DATE" or "T" not in value):
+                current["all_day"] = True
+            if tz_name:
+                current["timezone"] = tz_name
+    return tasks
+
+def _existing_event_keys(service, time_min, time_max):
+    keys = set()
+    page_token = None
+    while True:
+        resp = service.events().list(
+            calendarId='primary',
+            timeMin=time_min.isoformat(),
+            timeMax=time_max.isoformat(),
+            singleEvents=True,
+            maxResults=2500,
+            pageToken=page_token,
+            fields="items(summary,start,end),nextPageToken"
+        ).execute()
+        for item in resp.get("items", []):
+            try:
+                keys.add(_event_key(item.get("summary", ""), item.get("start", {}), item.get("end", {})))
+            except (KeyError, ValueError):
+                continue
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return keys
+
+def _event_key(summary, start, end):
+    # start/end as in an event body. All-day events are keyed by their dates,
+    # which mean the same day in every time zone; timed ones by the instant
+    if "date" in start:
+        return (summary.strip().lower(), start["date"], end["date"])
+    return (summary.strip().lower(),
+            _to_datetime(start["dateTime"], start.get("timeZone") or DEFAULT_TIMEZONE).timestamp(),
+            _to_datetime(end["dateTime"], end.get("timeZone") or DEFAULT_TIMEZONE).timestamp())
+
+def add_tasks_to_calendar(user_email, supabase, tasks):
+    service = get_calendar_service(user_email, supabase)
+    if service is None:
+        return None
+
+    results = [None] * len(tasks)
+    pending = []
+    for i, task in enumerate(tasks):
+        try:
+            event, start_dt, end_dt = task_to_event(task)
+        except (KeyError, ValueError, TypeError) as e:
+            results[i] = {"index": i, "status": "error", "error": f"Invalid task: {e}"}
+            continue
+        pending.append((i, event, start_dt, end_dt))
+
+    if pending:
+        # one events.list over the whole window instead of one lookup per task;
+        # a day either side catches all-day events whose midnight falls in
+        # another time zone than the task's
+        time_min = min(p[2] for p in pending) - datetime.timedelta(days=1)
+        time_max = max(p[3] for p in pending) + datetime.timedelta(days=1)
+        seen = _existing_event_keys(service, time_min, time_max)
+
+        to_insert = []
+        for i, event, start_dt, end_dt in pending:
+            key = _event_key(event["summary"], event["start"], event["end"])
+            if key in seen:
+                results[i] = {"index": i, "summary": event["summary"], "status": "duplicate"}
+                continue
+            seen.add(key)
+            to_insert.append((i, event))
+
+        summaries = {i: event["summary"] for i, event in to_insert}
+        created = []
+
+        def callback(request_id, response, exception):
+            i = int(request_id)
+            if exception is not None:
+                results[i] = {"index": i, "summary": summaries[i], "status": "error", "error": str(exception)}
+            else:
+                results[i] = {"index": i, "summary": summaries[i], "status": "created",
+                              "id": response.get("id"), "link": response.get("htmlLink")}
+                created.append(response)
+
+        for chunk_start in range(0, len(to_insert), BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=callback)
+            for i, event in to_insert[chunk_start:chunk_start + BATCH_SIZE]:
+                batch.add(service.events().insert(calendarId='primary', body=event), request_id=str(i))
+            with span("google_calendar", "batch"):
+                batch.execute()
+
+        with _busy_lock:
+            index = _busy_indexes.get(user_email)
+        if index is not None and created:
+            index.apply(created)
+
+    return results
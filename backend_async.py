@@ -0,0 +1,124 @@
+import asyncio
+import httpx
+
+import backend_crypto
+import backend_email
+import backend_movies
+import backend_stocks
+import backend_weather
+import circuit_breaker
+from backend_llm import generate
+from instrumentation import span
+
+HTTP_TIMEOUT = 15
+HTTP_LIMITS = httpx.Limits(max_connections=500, max_keepalive_connections=100)
+
+_client = None
+
+def get_http_client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _generate_async(prompt: str, gemini_api_key: str, **kwargs):
+    # the LLM gateway's rate limits, concurrency cap and coalescing are
+    # thread-based, so async views share them by calling it on a worker thread
+    return await asyncio.to_thread(generate, prompt, gemini_api_key, **kwargs)
+
+# ---------------- Crypto ----------------
+async def get_crypto_data_async(symbol: str, days: int = 30):
+    try:
+        plan = backend_crypto.price_series(symbol).plan(days)
+        if plan is None:
+            return backend_crypto.crypto_history(symbol, 200, {}, days)
+        with span("coingecko", "market_chart" if plan[0] == "full" else "market_chart_range") as s:
+            response = await circuit_breaker.get_async("coingecko", get_http_client(), backend_crypto.chart_url(symbol, days, plan),
+                                                       last_good=plan[0] == "full")
+            s.size = len(response.content)
+        data = response.json() if response.status_code == 200 else {}
+        return backend_crypto.crypto_history(symbol, response.status_code, data, days, plan)
+    except Exception as e:
+        return {"error": str(e)}
+
+async def llm_crypto_advice_async(symbol: str, df, gemini_api_key: str):
+    if not gemini_api_key:
+        return "LLM suggestions unavailable: Missing Gemini API Key."
+    try:
+        text = await _generate_async(backend_crypto.crypto_advice_prompt(symbol, df), gemini_api_key, caller="crypto")
+        return text or "AI could not generate advice."
+    except Exception as e:
+        return f"LLM error: {e}"
+
+# ---------------- Stocks ----------------
+async def get_stock_data_async(symbol: str, days: int = 30):
+    # yfinance has no async API, so keep its blocking call off the event loop
+    return await asyncio.to_thread(backend_stocks.get_stock_data, symbol, days)
+
+async def llm_stock_advice_async(symbol: str, hist, gemini_api_key: str):
+    if not gemini_api_key:
+        return "LLM suggestions unavailable: Missing Gemini API Key."
+    try:
+        text = await _generate_async(backend_stocks.stock_advice_prompt(symbol, hist), gemini_api_key, caller="stocks")
+        return text or "AI could not generate advice."
+    except Exception as e:
+        return f"LLM error: {e}"
+
+# ---------------- Weather ----------------
+async def get_weather_async(city: str, api_key: str):
+    try:
+        with span("openweathermap", "weather") as s:
+            response = await circuit_breaker.get_async("openweathermap", get_http_client(), backend_weather.weather_url(city, api_key), timeout=10)
+            s.size = len(response.content)
+        response.raise_for_status()
+        return backend_weather.parse_weather(city, response.json())
+    except Exception as e:
+        return {"error": f"Weather API failed: {str(e)}"}
+
+async def get_user_location_city_async():
+    try:
+        with span("ip_api", "location"):
+            res = await circuit_breaker.get_async("ip_api", get_http_client(), backend_weather.LOCATION_URL, timeout=10)
+        if res.status_code == 200:
+            return res.json().get("city")
+    except Exception:
+        return None
+    return None
+
+async def llm_weather_advice_async(city: str, weather: dict, gemini_api_key: str, user_context: str = ""):
+    if not gemini_api_key:
+        return "LLM suggestions unavailable: Missing GEMINI_API_KEY."
+    try:
+        prompt = backend_weather.weather_advice_prompt(city, weather, user_context)
+        text = await _generate_async(prompt, gemini_api_key, request_options={"timeout": 15}, caller="weather")
+        return backend_weather.weather_advice_text(text)
+    except Exception as e:
+        return f"LLM error: {e}"
+
+# ---------------- Movies ----------------
+async def discover_movies_async(api_key, genre_ids=None, year=None, language=None, num_results=10):
+    url = f"{backend_movies.BASE_URL}/discover/movie"
+    params = backend_movies.discover_params(api_key, genre_ids, year, language)
+
+    with span("tmdb", "discover") as s:
+        res = await circuit_breaker.get_async("tmdb", get_http_client(), url, params=params, timeout=10)
+        s.size = len(res.content)
+    res.raise_for_status()
+    return res.json().get("results", [])[:num_results]
+
+# ---------------- Email ----------------
+async def get_last_48h_emails_async(user_email, supabase, client_secret_json):
+    # the Gmail client is httplib2-based and blocking
+    return await asyncio.to_thread(backend_email.get_last_48h_emails, user_email, supabase, client_secret_json)
+
+async def summarize_emails_async(emails, gemini_key):
+    if not emails:
+        return "No emails in the last 48 hours."
+
+    return await asyncio.to_thread(backend_email.summarize_emails, emails, gemini_key)
@@ -1,22 +1,112 @@
-import requests
-import pandas as pd
-import google.generativeai as genai
+from __future__ import annotations
 
-def get_crypto_data(symbol: str, days: int = 30):
+import time
+from typing import TYPE_CHECKING
+
+import circuit_breaker
+from backend_llm import generate
+from backend_prices import get_series
+from instrumentation import span
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+BASE_URL = "https://api.coingecko.com/api/v3"
+
+def market_chart_url(symbol: str, days: int):
+    return f"{BASE_URL}/coins/{symbol}/market_chart?vs_currency=usd&days={days}"
+
+def market_chart_range_url(symbol: str, since: int, until: int):
+    return f"{BASE_URL}/coins/{symbol}/market_chart/range?vs_currency=usd&from={since}&to={until}"
+
+def price_series(symbol: str):
+    # stored hourly: finer points from short tail fetches are thinned out
+    return get_series("crypto", symbol, ("price",), min_step=3600)
+
+def chart_url(symbol: str, days: int, plan):
+    mode, since = plan
+    if mode == "full":
+        return market_chart_url(symbol, days)
+    return market_chart_range_url(symbol, since, int(time.time()))
+
+def crypto_history(symbol: str, status_code: int, data: dict, days: int = 30, plan=None):
+    # plan is what was fetched (None when the store was fresh enough);
+    # stored history is still served if the top-up fetch failed
+    series = price_series(symbol)
+    if plan is not None and status_code == 200 and data.get("prices"):
+        import numpy as np
+        points = np.asarray(data["prices"], dtype=float)
+        series.ingest((points[:, 0] // 1000).astype("int64"), {"price": points[:, 1]},
+                      full=plan[0] == "full", days=days)
+
+    frame = series.frame(days)
+    if frame.empty:
+        if status_code != 200:
+            return {"error": f"API error ({status_code})"}
+        return {"error": "Crypto data not available"}
+
+    import pandas as pd
+    df = pd.DataFrame({"timestamp": frame["ts"] * 1000, "price": frame["price"]})
+    df["Date"] = pd.to_datetime(df["timestamp"], unit="ms")
+
+    return {"symbol": symbol, "history": df}
+
+def markets_url(ids):
+    return (f"{BASE_URL}/coins/markets?vs_currency=usd&ids={','.join(ids)}"
+            f"&sparkline=true&price_change_percentage=24h,30d")
+
+def simple_price_url(ids):
+    return f"{BASE_URL}/simple/price?ids={','.join(ids)}&vs_currencies=usd&include_24hr_change=true"
+
+def get_cryptos_closes(ids):
+    # every coin in one /coins/markets call. Its 7-day hourly sparkline is the
+    # price matrix (a column per coin, aligned on the most recent point);
+    # returns (closes, markets, errors)
+    import pandas as pd
     try:
-        url = f"https://api.coingecko.com/api/v3/coins/{symbol}/market_chart?vs_currency=usd&days={days}"
-        response = requests.get(url, timeout=15)
+        with span("coingecko", "markets") as s:
+            response = circuit_breaker.get("coingecko", markets_url(ids), timeout=15)
+            s.size = len(response.content)
         if response.status_code != 200:
-            return {"error": f"API error ({response.status_code})"}
+            return None, {}, {i: f"API error ({response.status_code})" for i in ids}
+        markets = {coin["id"]: coin for coin in response.json()}
+    except Exception as e:
+        return None, {}, {i: str(e) for i in ids}
 
-        data = response.json()
-        if "prices" not in data:
-            return {"error": "Crypto data not available"}
+    columns = {}
+    for coin_id in ids:
+        prices = ((markets.get(coin_id) or {}).get("sparkline_in_7d") or {}).get("price") or []
+        if prices:
+            columns[coin_id] = pd.Series(prices, index=range(1 - len(prices), 1), dtype=float)
+    errors = {i: "Crypto data not available" for i in ids if i not in columns}
+    closes = pd.DataFrame(columns) if columns else None
+    return closes, markets, errors
 
-        df = pd.DataFrame(data["prices"], columns=["timestamp", "price"])
-        df["Date"] = pd.to_datetime(df["timestamp"], unit="ms")
+def get_crypto_prices(ids):
+    try:
+        with span("coingecko", "simple_price"):
+            response = circuit_breaker.get("coingecko", simple_price_url(ids), timeout=15)
+        data = response.json() if response.status_code == 200 else {}
+    except Exception as e:
+        return {}, {i: str(e) for i in ids}
+    prices = {
+        i: {"price": data[i].get("usd"), "change_24h": data[i].get("usd_24h_change")}
+        for i in ids if isinstance(data.get(i), dict)
+    }
+    return prices, {i: "Crypto data not available" for i in ids if i not in prices}
 
-        return {"symbol": symbol, "history": df}
+def get_crypto_data(symbol: str, days: int = 30):
+    try:
+        plan = price_series(symbol).plan(days)
+        if plan is None:
+            return crypto_history(symbol, 200, {}, days)
+        with span("coingecko", "market_chart" if plan[0] == "full" else "market_chart_range") as s:
+            # a tail URL ends at now, so it never repeats; not worth keeping as last good
+            response = circuit_breaker.get("coingecko", chart_url(symbol, days, plan),
+                                           last_good=plan[0] == "full", timeout=15)
+            s.size = len(response.content)
+        data = response.json() if response.status_code == 200 else {}
+        return crypto_history(symbol, response.status_code, data, days, plan)
 
     except Exception as e:
         return {"error": str(e)}
@@ -25,8 +115,13 @@ def llm_crypto_advice(symbol: str, df: pd.DataFrame, gemini_api_key: str):
     if not gemini_api_key:
         return "LLM suggestions unavailable: Missing Gemini API Key."
 
-    genai.configure(api_key=gemini_api_key)
+    try:
+        text = generate(crypto_advice_prompt(symbol, df), gemini_api_key, caller="crypto")
+        return text or "AI could not generate advice."
+    except Exception as e:
+        return f"LLM error: {e}"
 
+def crypto_advice_prompt(symbol: str, df: pd.DataFrame):
     last_price = df["price"].iloc[-1]
     pct_change = ((df["price"].iloc[-1] - df["price"].iloc[0]) / df["price"].iloc[0]) * 100
 
@@ -55,10 +150,4 @@ def llm_crypto_advice(symbol: str, df: pd.DataFrame, gemini_api_key: str):
         Reason 2: <short reason>
         Reason 3: <short reason>
         """
-
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        resp = model.generate_content(prompt)
-        return getattr(resp, "text", None) or "AI could not generate advice."
-    except Exception as e:
-        return f"LLM error: {e}"
\ No newline at end of file
+    return prompt
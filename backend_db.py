@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+from collections import deque
+from contextvars import ContextVar
+
+import instrumentation
+
+# Supabase access. The client is built on first use with one explicitly sized
+# httpx connection pool, which PostgREST calls from every Flask thread share
+# (httpx.Client is thread-safe). Rows of `users` are read through get_user(),
+# which selects only the columns asked for. Within a request it remembers what
+# it already fetched, so a route can name everything it (and the backends it
+# calls) will need in one call and later reads are served from that row.
+# Every query is timed by name; see db_stats().
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+STATS_WINDOW = 500
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+# per request: email -> the columns of that user's row fetched so far
+_request_users = ContextVar("request_users", default=None)
+
+class LazySupabase:
+    # the client (and its HTTP stack) is only built on the first query
+    def __init__(self, url, key):
+        self._url = url
+        self._key = key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    from supabase import ClientOptions, create_client
+                    http = httpx.Client(
+                        limits=httpx.Limits(max_connections=SUPABASE_POOL_SIZE,
+                                            max_keepalive_connections=SUPABASE_POOL_SIZE),
+                        timeout=SUPABASE_TIMEOUT,
+                    )
+                    instrumentation.instrument_httpx(http, "supabase")
+                    self._client = create_client(self._url, self._key, options=ClientOptions(httpx_client=http))
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.client(), name)
+
+# ---------------- Queries ----------------
+def execute(query, name):
+    start = time.perf_counter()
+    try:
+        resp = query.execute()
+    except Exception:
+        _record(name, time.perf_counter() - start, error=True)
+        raise
+    _record(name, time.perf_counter() - start, len(resp.data or []))
+    return resp
+
+def get_user(client, email, *columns):
+    # -> {column: value} for the asked columns (just email if none), or None if there is no such user
+    columns = columns or ("email",)
+    users = _request_users.get()
+    row = users.get(email) if users is not None else None
+    missing = [c for c in columns if row is None or c not in row]
+
+    if missing or row is None:
+        select = ", ".join(missing or ["email"])
+        resp = execute(client.table("users").select(select).eq("email", email), f"users({select})")
+        if not resp.data:
+            return None
+        row = {**(row or {}), **resp.data[0]}
+        if users is not None:
+            users[email] = row
+
+    return {c: row.get(c) for c in columns}
+
+def update_user(client, email, fields):
+    execute(client.table("users").update(fields).eq("email", email), f"update users({', '.join(fields)})")
+    users = _request_users.get()
+    if users is not None and email in users:
+        users[email].update(fields)
+
+# ---------------- Metrics ----------------
+def _record(name, latency, rows=0, error=False):
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = {"calls": 0, "errors": 0, "rows": 0, "latencies": deque(maxlen=STATS_WINDOW)}
+        stats["calls"] += 1
+        stats["errors"] += int(error)
+        stats["rows"] += rows
+        stats["latencies"].append(latency)
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def db_stats():
+    with _stats_lock:
+        snapshot = {name: dict(stats, latencies=list(stats["latencies"])) for name, stats in _stats.items()}
+
+    report = {}
+    for name, stats in snapshot.items():
+        latencies = stats.pop("latencies")
+        stats["p50_ms"] = round(_percentile(latencies, 50) * 1000, 1) if latencies else None
+        stats["p95_ms"] = round(_percentile(latencies, 95) * 1000, 1) if latencies else None
+        report[name] = stats
+    return report
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+# ---------------- Flask ----------------
+def init_app(app):
+    from flask import g
+
+    @app.before_request
+    def _start_user_cache():
+        g.db_users_token = _request_users.set({})
+
+    @app.teardown_request
+    def _drop_user_cache(exc):
+        token = g.pop("db_users_token", None)
+        if token is not None:
+            try:
+                _request_users.reset(token)
+            except ValueError:
+                # streamed responses tear down from the generator's context
+                _request_users.set(None)
@@ -2,45 +2,83 @@ import os
 import pickle
 import base64
 import json
-import markdown 
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from html import unescape
 from email.mime.text import MIMEText
 
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.errors import HttpError
-from google.auth.transport.requests import Request
-
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+from backend_google import (
+    credentials_from_json,
+    credentials_to_json,
+    get_credentials,
+    get_service,
+    has_credentials,
+    token_fingerprint
+)
+
+from backend_db import get_user, update_user
+from backend_llm import generate, stream
+from email_clusters import collapse_duplicates
+from email_index import index_emails
+from email_triage import describe_rest, split_important, triage
+from email_preprocess import EMAIL_TOKEN_BUDGET, preprocess, truncate_tokens
+
+# googleapiclient, oauthlib and markdown are imported inside the functions
+# that need them; together they add over a second to cold start.
 
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.readonly',
     'https://www.googleapis.com/auth/gmail.send'
 ]
 
-def init_llm(api_key: str):
-    if not api_key:
-        raise ValueError("Google API Key is required")
-    return ChatGoogleGenerativeAI(model="gemini-2.0-flash", api_key=api_key)
+EMAIL_MODEL = "gemini-2.0-flash"
+EMAIL_SYSTEM_PROMPT = "You are an email assistant."
 
 def get_gmail_service(user_email: str, supabase, client_secret_json: str):
+    return get_service(
+        user_email, "gmail", "v1",
+        lambda: get_credentials(
+            user_email, SCOPES,
+            lambda: _load_gmail_credentials(user_email, supabase, client_secret_json),
+            lambda creds: _save_gmail_credentials(user_email, supabase, creds)
+        )
+    )
+
+def gmail_user_columns(user_email: str):
+    # the stored token is only read when this process holds no credentials yet;
+    # routes add these to their own users read so the loader needs no query
+    return () if has_credentials(user_email, SCOPES) else ("google_gmail_token",)
+
+def _save_gmail_credentials(user_email: str, supabase, creds):
+    token_data = json.dumps(credentials_to_json(creds), separators=(",", ":"))
+    update_user(supabase, user_email, {"google_gmail_token": token_data})
+
+def _decode_gmail_token(token_data: str):
+    if token_data.lstrip().startswith("{"):
+        return credentials_from_json(token_data, SCOPES), False
+    # tokens saved before the switch to JSON are base64-encoded pickles;
+    # decode them once and let the caller rewrite them as JSON
+    return pickle.loads(base64.b64decode(token_data.encode())), True
+
+def _load_gmail_credentials(user_email: str, supabase, client_secret_json: str):
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
     creds = None
+    legacy = False
 
-    resp = supabase.table("users").select("google_gmail_token").eq("email", user_email).execute()
-    if resp.data and resp.data[0].get("google_gmail_token"):
+    user = get_user(supabase, user_email, "google_gmail_token")
+    if user and user.get("google_gmail_token"):
         try:
-            token_data = resp.data[0]["google_gmail_token"]
-            creds = pickle.loads(base64.b64decode(token_data.encode()))
+            creds, legacy = _decode_gmail_token(user["google_gmail_token"])
         except Exception as e:
             creds = None
+    stored = token_fingerprint(creds)
 
     if creds and creds.expired and creds.refresh_token:
         try:
             creds.refresh(Request())
-
-            token_data = base64.b64encode(pickle.dumps(creds)).decode()
-            supabase.table("users").update({"google_gmail_token": token_data}).eq("email", user_email).execute()
         except Exception as e:
             creds = None
 
@@ -49,17 +87,40 @@ def get_gmail_service(user_email: str, supabase, client_secret_json: str):
         flow = InstalledAppFlow.from_client_config(client_config, SCOPES)
         creds = flow.run_local_server(port=0)
 
-        token_data = base64.b64encode(pickle.dumps(creds)).decode()
-        supabase.table("users").update({"google_gmail_token": token_data}).eq("email", user_email).execute()
+    if legacy or token_fingerprint(creds) != stored:
+        _save_gmail_credentials(user_email, supabase, creds)
+
+    return creds
+
+def _last_48h_query():
+    two_days_ago = datetime.utcnow() - timedelta(days=2)
+    return f"after:{int(two_days_ago.timestamp())}"
+
+def _header(headers, name, default):
+    return next((h['value'] for h in headers if h['name'] == name), default)
 
-    return build('gmail', 'v1', credentials=creds)
+def _is_bulk(headers):
+    # mailing lists and marketing mail carry one of these
+    return bool(_header(headers, 'List-Unsubscribe', "")) or \
+        _header(headers, 'Precedence', "").lower() in ("bulk", "list", "junk")
+
+def _parse_message(message):
+    payload = message['payload']
+    headers = payload.get('headers', [])
+    return {
+        "id": message['id'],
+        "from": _header(headers, 'From', "Unknown"),
+        "subject": _header(headers, 'Subject', "No Subject"),
+        "date": int(message.get('internalDate', 0)) // 1000,
+        "labels": message.get('labelIds', []),
+        "bulk": _is_bulk(headers),
+        "body": preprocess(payload)
+    }
 
 def get_last_48h_emails(user_email, supabase, client_secret_json):
+    from googleapiclient.errors import HttpError
     service = get_gmail_service(user_email, supabase, client_secret_json)
-
-    now = datetime.utcnow()
-    two_days_ago = now - timedelta(days=2)
-    query = f"after:{int(two_days_ago.timestamp())}"
+    query = _last_48h_query()
 
     emails = []
     page_token = None
@@ -81,27 +142,9 @@ def get_last_48h_emails(user_email, supabase, client_secret_json):
                 message = service.users().messages().get(
                     userId='me', id=msg['id'], format='full'
                 ).execute()
-
-                payload = message['payload']
-                headers = payload.get('headers', [])
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject")
-                sender = next((h['value'] for h in headers if h['name'] == 'From'), "Unknown")
-
-                body = ""
-                if 'parts' in payload:
-                    for part in payload['parts']:
-                        if part['mimeType'] == 'text/plain' and 'data' in part['body']:
-                            body = base64.urlsafe_b64decode(part['body']['data']).decode()
-                            break
-                elif 'body' in payload and 'data' in payload['body']:
-                    body = base64.urlsafe_b64decode(payload['body']['data']).decode()
-
-                emails.append({
-                    "id": msg['id'],
-                    "from": sender,
-                    "subject": subject,
-                    "body": body
-                })
+                email = _parse_message(message)
+                _remember_body(user_email, email)
+                emails.append(email)
 
             page_token = results.get('nextPageToken')
             if not page_token:
@@ -110,66 +153,292 @@ def get_last_48h_emails(user_email, supabase, client_secret_json):
     except HttpError as e:
         return []
 
+    try:
+        index_emails(user_email, emails)
+    except Exception:
+        # search is a convenience; the summary must not depend on it
+        pass
+    _triage(user_email, emails)
     return emails
 
+def _triage(user_email, emails):
+    try:
+        triage(user_email, emails)
+    except Exception:
+        # without scores every email is summarized, as before triage
+        pass
+
+# ---------------- Listing and bodies ----------------
+# The email page lists one page of headers and Gmail's snippet (no bodies),
+# and fetches a body only when a mail is opened. Bodies are cached per
+# user and message, including the ones an inbox summary already fetched.
+EMAIL_PAGE_SIZE = 20
+EMAIL_PAGE_MAX = 100
+GMAIL_BATCH_SIZE = 50   # Gmail allows 100 calls per batch but throttles above 50
+BODY_CACHE_MAX = 500
+SNIPPET_TOKENS = 40
+
+# (user, message id) -> parsed email with its cleaned body
+_body_cache = OrderedDict()
+_body_lock = threading.Lock()
+
+def _remember_body(user_email, email):
+    with _body_lock:
+        _body_cache[(user_email, email["id"])] = email
+        _body_cache.move_to_end((user_email, email["id"]))
+        while len(_body_cache) > BODY_CACHE_MAX:
+            _body_cache.popitem(last=False)
+
+def list_emails(user_email, supabase, client_secret_json, page_token=None, page_size=EMAIL_PAGE_SIZE):
+    from googleapiclient.errors import HttpError
+    service = get_gmail_service(user_email, supabase, client_secret_json)
+    page_size = max(1, min(int(page_size), EMAIL_PAGE_MAX))
+
+    try:
+        results = service.users().messages().list(
+            userId='me',
+            q=_last_48h_query(),
+            maxResults=page_size,
+            pageToken=page_token
+        ).execute()
+
+        ids = [msg['id'] for msg in results.get('messages', [])]
+        messages = _get_metadata(service, ids)
+        emails = []
+        for message_id in ids:
+            message = messages.get(message_id)
+            if message is None:
+                continue    # deleted since the listing, or its own call failed
+            headers = message.get('payload', {}).get('headers', [])
+            emails.append({
+                "id": message_id,
+                "from": _header(headers, 'From', "Unknown"),
+                "subject": _header(headers, 'Subject', "No Subject"),
+                "date": int(message.get('internalDate', 0)) // 1000,
+                "snippet": unescape(message.get('snippet', "")),
+                "unread": 'UNREAD' in message.get('labelIds', []),
+                "labels": message.get('labelIds', []),
+                "bulk": _is_bulk(headers)
+            })
+    except HttpError:
+        return {"emails": [], "next_page_token": None}
+
+    _triage(user_email, emails)
+
+    return {"emails": emails, "next_page_token": results.get('nextPageToken')}
+
+def _get_metadata(service, ids):
+    # message id -> metadata, fetched in batches rather than one round trip each
+    messages = {}
+
+    def callback(request_id, response, exception):
+        if exception is None:
+            messages[request_id] = response
+
+    for start in range(0, len(ids), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for message_id in ids[start:start + GMAIL_BATCH_SIZE]:
+            batch.add(service.users().messages().get(
+                userId='me', id=message_id, format='metadata',
+                metadataHeaders=['From', 'Subject', 'List-Unsubscribe', 'Precedence']
+            ), request_id=message_id)
+        batch.execute()
+    return messages
+
+def email_listing(email):
+    # a fetched email as the list shows it: the body only as a snippet
+    listing = {k: v for k, v in email.items() if k != "body"}
+    listing["snippet"] = truncate_tokens(email.get("body", ""), SNIPPET_TOKENS)
+    return listing
+
+def get_email_body(user_email, supabase, client_secret_json, message_id):
+    with _body_lock:
+        email = _body_cache.get((user_email, message_id))
+    if email is not None:
+        return email
+
+    from googleapiclient.errors import HttpError
+    service = get_gmail_service(user_email, supabase, client_secret_json)
+    try:
+        message = service.users().messages().get(userId='me', id=message_id, format='full').execute()
+    except HttpError:
+        return None
+
+    email = _parse_message(message)
+    _remember_body(user_email, email)
+    try:
+        index_emails(user_email, [email])
+    except Exception:
+        pass
+    return email
+
 def summarize_emails(emails, gemini_key):
     if not emails:
         return "No emails in the last 48 hours."
 
-    combined_text = ""
-    for e in emails:
-        combined_text += f"From: {e['from']}\nSubject: {e['subject']}\n{e['body']}\n\n"
-
-    combined_text = combined_text.replace("{", "{{").replace("}", "}}")
+    summary = generate(
+        email_summary_prompt(emails), gemini_key, model=EMAIL_MODEL,
+        system_instruction=EMAIL_SYSTEM_PROMPT, caller="email_summary"
+    )
+    return summary_to_html(summary)
 
-    human_template = HumanMessagePromptTemplate.from_template(
-        "Summarize the following emails in concise bullet points:\n{email_text}"
+def summarize_emails_stream(emails, gemini_key):
+    return stream(
+        email_summary_prompt(emails), gemini_key, model=EMAIL_MODEL,
+        system_instruction=EMAIL_SYSTEM_PROMPT, caller="email_summary"
     )
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are an email assistant."),
-        human_template
-    ])
 
-    chat = init_llm(gemini_key)
-    summary = chat(prompt.format_prompt(email_text=combined_text).to_messages())
+def email_summary_prompt(emails, budget=EMAIL_TOKEN_BUDGET):
+    # only the most important emails (by triage score) go in with their
+    # text; the rest are passed on as counts per Gmail category
+    detailed, rest = split_important(collapse_duplicates(emails))
+    combined_text = ""
+    note = ""
+    for e in detailed:
+        similar = f" (+{e['similar']} similar emails)" if e["similar"] else ""
+        combined_text += f"From: {e['from']}\nSubject: {e['subject']}{similar}\n{truncate_tokens(e['body'], budget)}\n\n"
+    if rest:
+        combined_text += f"Not shown, lower priority: {describe_rest(rest)}.\n"
+        note = " End with one line on the lower-priority emails that are not shown."
+
+    return (
+        "Summarize the following emails in concise bullet points. "
+        f"An email marked (+N similar emails) stands for a group of near-identical ones; say how many.{note}\n"
+        f"{combined_text}"
+    )
 
+def summary_to_html(content):
     try:
-        summary_html = markdown.markdown(summary.content)
+        import markdown
+        summary_html = markdown.markdown(content)
         summary_html = summary_html.replace("</li>", "</li><br>")
     except Exception:
-        summary_html = summary.content
+        summary_html = content
 
     return summary_html
 
-def generate_replies(email_body, gemini_key):
-    chat = init_llm(gemini_key)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are an email assistant."),
-        ("user", f"""
-            Email:
-            {email_body}
-
-            Generate exactly 3 separate, concise, professional reply options.
-            Number them clearly as 1., 2., and 3. Do not include anything else.
-            """)
-    ])
-    reply = chat(prompt.format_prompt().to_messages())
-    text = reply.content
-
-    options = []
-    for i in range(1, 4):
-        start = text.find(f"{i}.")
-        end = text.find(f"{i+1}.") if i < 3 else len(text)
-        option = text[start:end].strip()
-        if option.startswith(f"{i}."):
-            option = option[len(f"{i}."):].strip()
-        options.append(option)
-    while len(options) < 3:
-        options.append("")
+REPLY_OPTIONS = 3
+REPLY_BATCH_SIZE = 5             # emails answered per LLM call
+REPLY_BODY_CHARS = 4000          # email text sent to the LLM, per email
+REPLY_CACHE_MAX = 2000
+# number of emails, highest triage score first, whose replies are generated
+# in the background after an inbox summary; 0 turns pre-warming off
+PREWARM_REPLIES = int(os.getenv("PREWARM_REPLIES", "5"))
+
+# (user, message id) -> list of reply options
+_reply_cache = OrderedDict()
+# (user, message id) -> Event set once a background generation finishes
+_reply_pending = {}
+_reply_lock = threading.Lock()
+
+def _reply_prompt(emails):
+    items = [
+        {"id": i, "from": e.get("from", ""), "subject": e.get("subject", ""),
+         "body": (e.get("body") or "")[:REPLY_BODY_CHARS]}
+        for i, e in enumerate(emails)
+    ]
+    return f"""
+        For each email below, write exactly {REPLY_OPTIONS} separate, concise, professional reply options.
+        Return ONLY a JSON array with one object per email, in the same order:
+        [{{"id": <id>, "replies": ["<reply 1>", "<reply 2>", "<reply 3>"]}}]
+
+        Emails:
+        {json.dumps(items, ensure_ascii=False)}
+        """
+
+def generate_replies_batch(emails, gemini_key):
+    replies = [[""] * REPLY_OPTIONS for _ in emails]
+    if not emails:
+        return replies
+
+    content = generate(
+        _reply_prompt(emails), gemini_key, model=EMAIL_MODEL,
+        system_instruction=EMAIL_SYSTEM_PROMPT,
+        generation_config={"response_mime_type": "application/json"},
+        caller="email_replies"
+    )
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        return replies
+
+    for item in parsed if isinstance(parsed, list) else []:
+        try:
+            i = int(item["id"])
+            options = [str(r).strip() for r in item["replies"]][:REPLY_OPTIONS]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= i < len(emails):
+            replies[i] = options + [""] * (REPLY_OPTIONS - len(options))
+    return replies
 
+def generate_replies(email_body, gemini_key):
+    return generate_replies_batch([{"body": email_body}], gemini_key)[0]
+
+def _store_replies(key, options):
+    with _reply_lock:
+        _reply_cache[key] = options
+        _reply_cache.move_to_end(key)
+        while len(_reply_cache) > REPLY_CACHE_MAX:
+            _reply_cache.popitem(last=False)
+
+def get_replies(user_email, message_id, email_body, gemini_key, wait=30):
+    key = (user_email, message_id)
+    with _reply_lock:
+        pending = _reply_pending.get(key) if message_id else None
+    # the email is already being answered in the background; wait for that
+    # rather than paying for a second LLM call
+    if pending is not None:
+        pending.wait(wait)
+
+    with _reply_lock:
+        cached = _reply_cache.get(key) if message_id else None
+    if cached is not None:
+        return cached
+
+    options = generate_replies(email_body, gemini_key)
+    if message_id and any(options):
+        _store_replies(key, options)
     return options
 
+def _prewarm(user_email, emails, gemini_key):
+    for start in range(0, len(emails), REPLY_BATCH_SIZE):
+        batch = emails[start:start + REPLY_BATCH_SIZE]
+        try:
+            results = generate_replies_batch(batch, gemini_key)
+        except Exception:
+            results = []
+        for email, options in zip(batch, results):
+            if any(options):
+                _store_replies((user_email, email["id"]), options)
+        with _reply_lock:
+            for email in batch:
+                _reply_pending.pop((user_email, email["id"])).set()
+
+def prewarm_replies(user_email, emails, gemini_key, limit=None):
+    limit = PREWARM_REPLIES if limit is None else limit
+    if limit <= 0 or not emails:
+        return
+
+    # the emails triage ranks highest first; sorted() keeps fetch order
+    # among equal scores, and for emails triage could not score
+    ranked = sorted(emails, key=lambda e: -e.get("importance", 0))
+    todo = []
+    with _reply_lock:
+        for email in ranked:
+            key = (user_email, email.get("id"))
+            if not email.get("id") or key in _reply_cache or key in _reply_pending:
+                continue
+            _reply_pending[key] = threading.Event()
+            todo.append(email)
+            if len(todo) >= limit:
+                break
+
+    if todo:
+        threading.Thread(target=_prewarm, args=(user_email, todo, gemini_key), daemon=True).start()
+
 def send_email(user_email, supabase, client_secret_json, to, subject, body_text):
+    from googleapiclient.errors import HttpError
     service = get_gmail_service(user_email, supabase, client_secret_json)
 
     message = MIMEText(body_text)
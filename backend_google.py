@@ -0,0 +1,216 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import instrumentation
+
+SERVICE_CACHE_SIZE = 256
+SERVICE_DEFAULT_TTL = 3000      # seconds, when the credentials carry no expiry
+EXPIRY_SKEW = 120               # drop a cached service this long before its token expires
+
+REFRESH_AHEAD = 300             # refresh tokens in the background this long before expiry
+REFRESH_CHECK_INTERVAL = 30     # seconds between background refresh passes
+CREDENTIAL_CACHE_SIZE = 256
+CREDENTIAL_IDLE = 3600          # users idle this long are no longer refreshed and are dropped
+
+# (api, version) -> parsed discovery document
+_discovery_docs = {}
+# (user, api, version) -> (credentials, service)
+_services = OrderedDict()
+_lock = threading.Lock()
+
+# (user, frozenset(scopes)) -> (decoded Credentials, callable(creds) that
+# persists a refreshed token), least recently used first; kept fresh by
+# _refresh_loop while the user is active
+_credentials = OrderedDict()
+# user -> last time one of their services or credentials was used
+_last_used = {}
+_refresh_thread = None
+
+def discovery_document(api: str, version: str):
+    key = (api, version)
+    doc = _discovery_docs.get(key)
+    if doc is None:
+        # google-api-python-client ships the discovery documents for every
+        # public API, so this never goes to the network
+        from googleapiclient.discovery_cache import get_static_doc
+        raw = get_static_doc(api, version)
+        if raw is None:
+            raise ValueError(f"No bundled discovery document for {api} {version}")
+        doc = json.loads(raw)
+        _discovery_docs[key] = doc
+    return doc
+
+def build_service(api: str, version: str, creds):
+    import httplib2
+    import google_auth_httplib2
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.http import HttpRequest
+
+    # httplib2.Http is not thread-safe, and a cached service can be used by
+    # several request threads at once, so every request gets its own Http
+    def build_request(http, *args, **kwargs):
+        new_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+        req = HttpRequest(new_http, *args, **kwargs)
+        if instrumentation.ENABLED:
+            execute = req.execute
+
+            def timed_execute(*a, **kw):
+                with instrumentation.span(f"google_{api}", req.methodId):
+                    return execute(*a, **kw)
+            req.execute = timed_execute
+        return req
+
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    return build_from_document(discovery_document(api, version), http=http, requestBuilder=build_request)
+
+def _expires_at(creds):
+    expiry = getattr(creds, "expiry", None)
+    if expiry is None:
+        return time.time() + SERVICE_DEFAULT_TTL
+    # google-auth keeps expiry as a naive UTC datetime
+    remaining = (expiry - datetime.utcnow()).total_seconds()
+    return time.time() + max(remaining - EXPIRY_SKEW, 0)
+
+def get_service(user_email: str, api: str, version: str, load_credentials):
+    key = (user_email, api, version)
+    with _lock:
+        _last_used[user_email] = time.time()
+        entry = _services.get(key)
+        # credentials are refreshed in place, so a cached service stays usable
+        # for as long as its credentials are kept fresh
+        if entry and _expires_at(entry[0]) > time.time():
+            _services.move_to_end(key)
+            return entry[1]
+
+    creds = load_credentials()
+    if creds is None:
+        return None
+
+    service = build_service(api, version, creds)
+    with _lock:
+        _services[key] = (creds, service)
+        _services.move_to_end(key)
+        while len(_services) > SERVICE_CACHE_SIZE:
+            _services.popitem(last=False)
+    return service
+
+def invalidate_user(user_email: str):
+    with _lock:
+        for key in [k for k in _services if k[0] == user_email]:
+            del _services[key]
+        for key in [k for k in _credentials if k[0] == user_email]:
+            del _credentials[key]
+
+# ---------------- Credential store ----------------
+def _usable(creds):
+    # expired credentials without a refresh token can never be refreshed
+    return not (getattr(creds, "expired", False) and not creds.refresh_token)
+
+def has_credentials(user_email: str, scopes):
+    with _lock:
+        entry = _credentials.get((user_email, frozenset(scopes)))
+        return entry is not None and _usable(entry[0])
+
+def get_credentials(user_email: str, scopes, load, save):
+    key = (user_email, frozenset(scopes))
+    with _lock:
+        _last_used[user_email] = time.time()
+        entry = _credentials.get(key)
+        if entry is not None:
+            if _usable(entry[0]):
+                _credentials.move_to_end(key)
+                return entry[0]
+            del _credentials[key]
+
+    # cold path: decode (and, if needed, refresh) once per process
+    creds = load()
+    if creds is None:
+        return None
+
+    with _lock:
+        _credentials[key] = (creds, save)
+        _credentials.move_to_end(key)
+        while len(_credentials) > CREDENTIAL_CACHE_SIZE:
+            _credentials.popitem(last=False)
+    _start_refresher()
+    return creds
+
+def _start_refresher():
+    global _refresh_thread
+    with _lock:
+        if _refresh_thread is not None:
+            return
+        _refresh_thread = threading.Thread(target=_refresh_loop, daemon=True)
+    _refresh_thread.start()
+
+def _needs_refresh(creds):
+    expiry = getattr(creds, "expiry", None)
+    if expiry is None or not creds.refresh_token:
+        return False
+    return (expiry - datetime.utcnow()).total_seconds() < REFRESH_AHEAD
+
+def refresh_due_credentials():
+    from google.auth.transport.requests import Request
+
+    now = time.time()
+    with _lock:
+        # idle users are dropped rather than refreshed; their next request
+        # loads (and if needed refreshes) the stored token again
+        for user in [u for u, used in _last_used.items() if now - used > CREDENTIAL_IDLE]:
+            del _last_used[user]
+            for key in [k for k in _credentials if k[0] == user]:
+                del _credentials[key]
+            for key in [k for k in _services if k[0] == user]:
+                del _services[key]
+        due = [(k, c, save) for k, (c, save) in _credentials.items() if _needs_refresh(c)]
+
+    for key, creds, save in due:
+        try:
+            creds.refresh(Request())
+            if save is not None:
+                save(creds)
+        except Exception:
+            # revoked or broken token: forget it, the next request reloads
+            _forget(creds, key)
+
+def _forget(creds, key):
+    with _lock:
+        entry = _credentials.get(key)
+        if entry is not None and entry[0] is creds:
+            del _credentials[key]
+        for service_key in [k for k, v in _services.items() if v[0] is creds]:
+            del _services[service_key]
+
+def _refresh_loop():
+    while True:
+        time.sleep(REFRESH_CHECK_INTERVAL)
+        refresh_due_credentials()
+
+# Compact JSON form of authorized-user credentials, replacing pickled
+# Credentials objects in Supabase.
+CREDENTIAL_FIELDS = ("token", "refresh_token", "token_uri", "client_id", "client_secret", "scopes")
+
+def credentials_to_json(creds):
+    data = {}
+    for field in CREDENTIAL_FIELDS:
+        value = getattr(creds, field, None)
+        if value:
+            data[field] = list(value) if field == "scopes" else value
+    if creds.expiry:
+        data["expiry"] = creds.expiry.isoformat() + "Z"
+    return data
+
+def credentials_from_json(data, scopes):
+    from google.oauth2.credentials import Credentials
+
+    if isinstance(data, str):
+        data = json.loads(data)
+    return Credentials.from_authorized_user_info(data, scopes)
+
+def token_fingerprint(creds):
+    if creds is None:
+        return None
+    return (creds.token, creds.refresh_token, getattr(creds, "expiry", None))
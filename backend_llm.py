@@ -0,0 +1,416 @@
+import os
+import time
+import json
+import random
+import hashlib
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from instrumentation import record_span, span
+
+# Single entry point for Gemini calls. Every caller goes through generate() /
+# stream(), which apply, in order:
+#   - a token bucket per API key (requests per minute, with a small burst),
+#   - a process-wide cap on concurrent calls,
+#   - coalescing of identical prompts that are already in flight,
+#   - retries with jittered exponential backoff on quota / transient errors,
+# and record latency and token counts per caller.
+#
+# LLM_FAKE=1 swaps Gemini for a local stand-in with configurable latency and
+# 429 rate, for load tests (see benchmarks/llm_gateway_load.py).
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "15"))  # per API key
+LLM_BURST = int(os.getenv("LLM_BURST", "5"))
+LLM_MAX_WAIT = float(os.getenv("LLM_MAX_WAIT", "30"))  # seconds a call may queue for a token
+LLM_SLOT_WAIT = float(os.getenv("LLM_SLOT_WAIT", "30"))  # seconds a call may queue for a concurrency slot
+LLM_MAX_RETRIES = 4
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 20.0
+
+LLM_FAKE = os.getenv("LLM_FAKE") == "1"
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "0.5"))
+LLM_FAKE_429_RATE = float(os.getenv("LLM_FAKE_429_RATE", "0"))
+# optional recorded answers: {"responses": [{"contains": "...", "text": "..."}]}
+LLM_FAKE_FIXTURE = os.getenv("LLM_FAKE_FIXTURE")
+
+STATS_WINDOW = 1000             # latency samples kept per caller
+MODEL_CACHE_SIZE = 64           # configured models kept, least recently used dropped first
+
+class LLMError(Exception):
+    pass
+
+class LLMRateLimited(LLMError):
+    pass
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self, max_wait):
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self.lock:
+                wait = self._take()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def penalize(self):
+        # the server says we are over quota: stop bursting until tokens refill
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+# coalescing key -> Future of the call currently running for it
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# (key id, model, system instruction) -> GenerativeModel bound to that key
+_models = OrderedDict()
+_models_lock = threading.Lock()
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+def _key_id(api_key):
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+def _bucket(api_key):
+    key = _key_id(api_key)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(LLM_RATE_PER_MINUTE, LLM_BURST)
+        return bucket
+
+def _model(api_key, model_name, system_instruction):
+    key = (_key_id(api_key), model_name, system_instruction)
+    with _models_lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+
+    import google.generativeai as genai
+    from google.generativeai import client
+
+    # genai.configure() is process-global; configure and bind the client
+    # under one lock so concurrent users never call with someone else's key
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            model._client = client.get_default_generative_client()
+            _models[key] = model
+            while len(_models) > MODEL_CACHE_SIZE:
+                _models.popitem(last=False)
+        return model
+
+def _is_retryable(error):
+    from google.api_core import exceptions
+    return isinstance(error, (
+        exceptions.ResourceExhausted,      # 429 quota
+        exceptions.ServiceUnavailable,
+        exceptions.InternalServerError,
+        exceptions.DeadlineExceeded,
+    ))
+
+def _is_quota_error(error):
+    from google.api_core import exceptions
+    return isinstance(error, exceptions.ResourceExhausted)
+
+def _backoff(attempt):
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+def response_text(resp):
+    text = None
+    try:
+        text = resp.text
+    except Exception:
+        try:
+            text = resp.candidates[0].content.parts[0].text
+        except Exception:
+            text = None
+    return text or ""
+
+def _usage(resp):
+    usage = getattr(resp, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+
+# ---------------- Fake LLM ----------------
+class FakeQuotaError(Exception):
+    pass
+
+class _FakeUsage:
+    def __init__(self, prompt, text):
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+
+class _FakeResponse:
+    def __init__(self, prompt, text):
+        self.text = text
+        self.usage_metadata = _FakeUsage(prompt, text)
+
+_fake_fixture = None
+
+def _fake_recorded(prompt):
+    global _fake_fixture
+    if _fake_fixture is None:
+        with open(LLM_FAKE_FIXTURE, encoding="utf-8") as f:
+            _fake_fixture = json.load(f).get("responses", [])
+    for entry in _fake_fixture:
+        if entry["contains"] in prompt:
+            return entry["text"]
+    return None
+
+def _fake_call(prompt, generation_config, stream):
+    time.sleep(LLM_FAKE_LATENCY)
+    if random.random() < LLM_FAKE_429_RATE:
+        raise FakeQuotaError("429 fake quota exceeded")
+    recorded = _fake_recorded(prompt) if LLM_FAKE_FIXTURE else None
+    if recorded is not None:
+        text = recorded
+    elif (generation_config or {}).get("response_mime_type") == "application/json":
+        text = "[]"
+    else:
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        text = f"Decision: Hold\nReason 1: fake response {digest}\nReason 2: -\nReason 3: -"
+    if stream:
+        words = text.split(" ")
+        chunks = [_FakeResponse(prompt, w + (" " if i < len(words) - 1 else "")) for i, w in enumerate(words)]
+        # like Gemini, only the last chunk carries the usage for the whole answer
+        for chunk in chunks[:-1]:
+            chunk.usage_metadata = None
+        chunks[-1].usage_metadata = _FakeUsage(prompt, text)
+        return chunks
+    return _FakeResponse(prompt, text)
+
+# ---------------- Metrics ----------------
+def _record(caller, latency, prompt_tokens=0, output_tokens=0, error=False, retries=0, coalesced=False):
+    with _stats_lock:
+        stats = _stats.get(caller)
+        if stats is None:
+            stats = _stats[caller] = {
+                "calls": 0, "errors": 0, "retries": 0, "coalesced": 0,
+                "prompt_tokens": 0, "output_tokens": 0,
+                "latencies": deque(maxlen=STATS_WINDOW),
+            }
+        stats["calls"] += 1
+        stats["errors"] += int(error)
+        stats["retries"] += retries
+        stats["coalesced"] += int(coalesced)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["output_tokens"] += output_tokens
+        stats["latencies"].append(latency)
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def llm_stats():
+    with _stats_lock:
+        snapshot = {caller: dict(stats, latencies=list(stats["latencies"])) for caller, stats in _stats.items()}
+
+    report = {}
+    for caller, stats in snapshot.items():
+        latencies = stats.pop("latencies")
+        stats["p50_ms"] = round(_percentile(latencies, 50) * 1000, 1) if latencies else None
+        stats["p95_ms"] = round(_percentile(latencies, 95) * 1000, 1) if latencies else None
+        report[caller] = stats
+    return report
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+# ---------------- Calls ----------------
+def _acquire(api_key):
+    if not _bucket(api_key).acquire(LLM_MAX_WAIT):
+        raise LLMRateLimited("Gemini rate limit reached for this API key, try again shortly.")
+
+def _take_slot():
+    if not _slots.acquire(timeout=LLM_SLOT_WAIT):
+        raise LLMError("Gemini is busy, try again shortly.")
+
+def _call(prompt, api_key, model_name, system_instruction, generation_config, request_options, stream):
+    if LLM_FAKE:
+        return _fake_call(prompt, generation_config, stream)
+    model = _model(api_key, model_name, system_instruction)
+    return model.generate_content(
+        prompt, generation_config=generation_config,
+        request_options=request_options, stream=stream
+    )
+
+def _retryable(error):
+    return isinstance(error, FakeQuotaError) or _is_retryable(error)
+
+def _quota(error):
+    return isinstance(error, FakeQuotaError) or _is_quota_error(error)
+
+def _generate(prompt, api_key, model_name, system_instruction, generation_config, request_options, caller):
+    start = time.perf_counter()
+    retries = 0
+    while True:
+        _acquire(api_key)
+        try:
+            _take_slot()
+        except LLMError:
+            _record(caller, time.perf_counter() - start, error=True, retries=retries)
+            raise
+        try:
+            with span("gemini", caller):
+                resp = _call(prompt, api_key, model_name, system_instruction,
+                             generation_config, request_options, stream=False)
+            break
+        except Exception as e:
+            if _quota(e):
+                _bucket(api_key).penalize()
+            if not _retryable(e) or retries >= LLM_MAX_RETRIES:
+                _record(caller, time.perf_counter() - start, error=True, retries=retries)
+                raise
+            time.sleep(_backoff(retries))
+            retries += 1
+        finally:
+            _slots.release()
+
+    text = response_text(resp)
+    prompt_tokens, output_tokens = _usage(resp)
+    _record(caller, time.perf_counter() - start, prompt_tokens, output_tokens, retries=retries)
+    return text
+
+def generate(prompt: str, api_key: str, *, model: str = DEFAULT_MODEL, system_instruction: str = None,
+             generation_config: dict = None, request_options: dict = None, caller: str = "default"):
+    if not api_key:
+        raise LLMError("Missing Gemini API key")
+
+    # identical prompts share one call; the key is left out on purpose so the
+    # same stock/crypto/horoscope prompt from many users costs one request
+    key = hashlib.sha256(json.dumps(
+        [model, system_instruction, prompt, generation_config], sort_keys=True, default=str
+    ).encode()).hexdigest()
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        start = time.perf_counter()
+        try:
+            text = future.result()
+            _record(caller, time.perf_counter() - start, coalesced=True)
+            return text
+        except Exception:
+            # the leader's call failed (possibly for its own key); make our own
+            pass
+        return _generate(prompt, api_key, model, system_instruction, generation_config, request_options, caller)
+
+    try:
+        text = _generate(prompt, api_key, model, system_instruction, generation_config, request_options, caller)
+        future.set_result(text)
+        return text
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+def stream(prompt: str, api_key: str, *, model: str = DEFAULT_MODEL, system_instruction: str = None,
+           generation_config: dict = None, request_options: dict = None, caller: str = "default"):
+    if not api_key:
+        raise LLMError("Missing Gemini API key")
+
+    start = time.perf_counter()
+    retries = 0
+    while True:
+        _acquire(api_key)
+        try:
+            _take_slot()
+        except LLMError:
+            _record(caller, time.perf_counter() - start, error=True, retries=retries)
+            raise
+        try:
+            chunks = iter(_call(prompt, api_key, model, system_instruction,
+                                generation_config, request_options, stream=True))
+            # errors (429 included) surface on the first chunk; retry only
+            # while nothing has been sent to the client yet
+            first = next(chunks, None)
+            break
+        except Exception as e:
+            _slots.release()
+            if _quota(e):
+                _bucket(api_key).penalize()
+            if not _retryable(e) or retries >= LLM_MAX_RETRIES:
+                _record(caller, time.perf_counter() - start, error=True, retries=retries)
+                raise
+            time.sleep(_backoff(retries))
+            retries += 1
+
+    # the rest of the answer is read on its own thread, so the slot is given
+    # back as soon as Gemini finishes rather than when a slow client does
+    relay = queue.Queue()
+    threading.Thread(target=_pump, args=(first, chunks, relay), daemon=True).start()
+
+    prompt_tokens = output_tokens = 0
+    error = False
+    try:
+        while True:
+            item = relay.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            text, usage = item
+            if any(usage):
+                prompt_tokens, output_tokens = usage
+            if text:
+                yield text
+    except Exception:
+        error = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        record_span("gemini", caller, elapsed, error=error)
+        _record(caller, elapsed, prompt_tokens, output_tokens, error=error, retries=retries)
+
+def _pump(first, chunks, relay):
+    # upstream chunks -> relay as (text, usage); then None, or the error
+    try:
+        chunk = first
+        while chunk is not None:
+            relay.put((response_text(chunk), _usage(chunk)))
+            chunk = next(chunks, None)
+        relay.put(None)
+    except Exception as e:
+        relay.put(e)
+    finally:
+        _slots.release()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+from backend_llm import generate
+from backend_stream import cached
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Shared by the stock and crypto batch endpoints. Prices arrive as one matrix
+# (a column per symbol, rows in time order), the statistics are computed over
+# all columns at once, and a single JSON-mode LLM call rates every symbol
+# instead of one call per symbol.
+MAX_BATCH_SYMBOLS = 50
+DECISIONS = ("Strong Buy", "Buy", "Hold", "Sell", "Strong Sell")
+
+def parse_symbols(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    symbols = [str(s).strip() for s in value or [] if str(s).strip()]
+    return list(dict.fromkeys(symbols))
+
+def price_stats(closes: pd.DataFrame):
+    import pandas as pd
+    first = closes.bfill().iloc[0]
+    last = closes.ffill().iloc[-1]
+    return pd.DataFrame({
+        "last_price": last,
+        "pct_change": (last - first) / first * 100,
+        "highest": closes.max(),
+        "lowest": closes.min(),
+        "volatility": closes.pct_change(fill_method=None).std() * 100,
+    }).round(2)
+
+def batch_advice_prompt(kind: str, stats: pd.DataFrame, window: str):
+    rows = "\n".join(
+        f"        {symbol}: last {row['last_price']:.2f}, {window} change {row['pct_change']:+.2f}%, "
+        f"high {row['highest']:.2f}, low {row['lowest']:.2f}, volatility per step {row['volatility']:.2f}%"
+        for symbol, row in stats.iterrows()
+    )
+    prompt = f"""
+        You are an expert {kind} investment assistant. Analyze each {kind} below and give a decision for every one.
+
+{rows}
+
+        Rules for decision:
+        - Strong Buy = {window} % change > +15% or consistent sharp uptrend
+        - Buy = {window} % change between +5% and +15% or steady uptrend
+        - Hold = {window} % change between -5% and +5% or sideways movement
+        - Sell = {window} % change between -15% and -5% or steady decline
+        - Strong Sell = {window} % change < -15% or sharp continuous downtrend
+
+        Return a JSON object with one key per symbol exactly as written above, each mapping to
+        {{"decision": one of {", ".join(DECISIONS)}, "reasons": [exactly 3 concise reasons, ≤15 words each]}}.
+        """
+    return prompt
+
+def llm_batch_advice(kind: str, stats: pd.DataFrame, window: str, gemini_api_key: str, caller: str):
+    content = generate(
+        batch_advice_prompt(kind, stats, window), gemini_api_key,
+        generation_config={"response_mime_type": "application/json"},
+        caller=caller
+    )
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        return {}
+
+    advice = {}
+    for symbol, item in (parsed.items() if isinstance(parsed, dict) else []):
+        if symbol not in stats.index or not isinstance(item, dict):
+            continue
+        decision = item.get("decision")
+        reasons = item.get("reasons") if isinstance(item.get("reasons"), list) else []
+        advice[symbol] = {
+            "decision": decision if decision in DECISIONS else "No Decision",
+            "reasons": [str(r).strip() for r in reasons][:3],
+        }
+    return advice
+
+def summarize_batch(kind: str, closes: pd.DataFrame, window: str, gemini_api_key=None, caller=None, history=False):
+    if closes is None or closes.empty:
+        return {}
+    stats = price_stats(closes)
+    # NaN (a symbol with a single price) is not valid JSON
+    results = {
+        symbol: {k: (None if v != v else float(v)) for k, v in row.items()}
+        for symbol, row in stats.to_dict(orient="index").items()
+    }
+
+    if history:
+        for symbol in results:
+            column = closes[symbol].dropna()
+            results[symbol]["history"] = [
+                {"Date": str(index), "price": round(float(price), 4)} for index, price in column.items()
+            ]
+
+    if gemini_api_key:
+        # advice only changes when the moves do, so key it on rounded % changes
+        key = (f"{kind}_batch", window, tuple((s, round(r["pct_change"] or 0, 1)) for s, r in sorted(results.items())))
+        try:
+            advice = cached(key, lambda: llm_batch_advice(kind, stats, window, gemini_api_key, caller), bool)
+        except Exception:
+            advice = {}
+        for symbol, result in results.items():
+            result.update(advice.get(symbol, {"decision": "No Decision", "reasons": []}))
+    return results
@@ -1,16 +1,20 @@
-import requests
+import circuit_breaker
+from instrumentation import span
+
+BASE_URL = "https://api.themoviedb.org/3"
 
 def get_genres(api_key):
-    url = "https://api.themoviedb.org/3/genre/movie/list"
+    url = f"{BASE_URL}/genre/movie/list"
     params = {"api_key": api_key, "language": "en-US"}
-    res = requests.get(url, params=params, timeout=10)
+    with span("tmdb", "genres") as s:
+        res = circuit_breaker.get("tmdb", url, params=params, timeout=10)
+        s.size = len(res.content)
     if res.status_code != 200:
         return {}
     data = res.json().get("genres", [])
     return [{"id": g["id"], "name": g["name"]} for g in data]
 
-def discover_movies(api_key, genre_ids=None, year=None, language=None, num_results=10):
-    url = "https://api.themoviedb.org/3/discover/movie"
+def discover_params(api_key, genre_ids=None, year=None, language=None):
     params = {"api_key": api_key, "sort_by": "popularity.desc", "page": 1}
 
     if genre_ids:
@@ -22,8 +26,15 @@ def discover_movies(api_key, genre_ids=None, year=None, language=None, num_resul
         params["primary_release_year"] = year
     if language and language != "Any":
         params["with_original_language"] = language
+    return params
+
+def discover_movies(api_key, genre_ids=None, year=None, language=None, num_results=10):
+    url = f"{BASE_URL}/discover/movie"
+    params = discover_params(api_key, genre_ids, year, language)
 
-    res = requests.get(url, params=params, timeout=10)
+    with span("tmdb", "discover") as s:
+        res = circuit_breaker.get("tmdb", url, params=params, timeout=10)
+        s.size = len(res.content)
     res.raise_for_status()
     data = res.json()
     return data.get("results", [])[:num_results]
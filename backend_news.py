@@ -1,21 +1,229 @@
-import requests
-from datetime import datetime
+import re
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+import circuit_breaker
+from backend_llm import generate
+from instrumentation import span
 
 BASE_URL = "http://api.mediastack.com/v1/news"
 
-def get_today_news(api_key: str, limit: int = 10):
+NEWS_CACHE_TTL = 3600           # seconds a snapshot is served before refetching
+NEWS_PREFETCH_INTERVAL = 1800   # seconds between background refreshes
+NEWS_PREFETCH_IDLE = 6 * 3600   # a feed nobody asked for in this long is no longer prefetched
+NEWS_PREFETCH_MAX = 20          # prefetched feeds; the least recently requested go first
+LAST_GOOD_MAX = 100
 
-    today = datetime.utcnow().strftime("%Y-%m-%d")
+# (country, date, limit, offset) -> (fetched_at, articles); today's only
+_news_cache = {}
+# (country, limit, offset) -> articles, kept across days for upstream outages
+_last_good = {}
+# (country, limit) -> (api key of the last user who asked for it, asked_at);
+# only the first page is prefetched, later pages are fetched on demand
+_prefetch_keys = {}
+_cache_lock = threading.Lock()
+_prefetch_thread = None
+
+DIGEST_ARTICLE_LIMIT = 30
+SUMMARY_BATCH_SIZE = 10
+SUMMARY_CACHE_MAX = 5000
+DIGEST_PARTIAL_TTL = 600        # seconds a digest with missing summaries is served
+
+# article key (url/content hash) -> one-line LLM summary
+_summary_cache = {}
+# (country, date) -> (expires_at or None, digest), built once per day from cached summaries
+_digest_cache = {}
+# (country, date) -> lock held while that digest is built
+_digest_locks = {}
+
+def _fetch_news(api_key: str, country: str, date: str, limit: int, offset: int):
     params = {
         "access_key": api_key,
-        "countries": "in",
+        "countries": country,
         "limit": limit,
-        "date": today
+        "offset": offset,
+        "date": date
     }
 
-    resp = requests.get(BASE_URL, params=params)
+    with span("mediastack", "news") as s:
+        resp = circuit_breaker.get("mediastack", BASE_URL, params=params, timeout=10)
+        s.size = len(resp.content)
     data = resp.json()
 
     if data.get("data"):
         return data["data"]
-    raise Exception(f"Error fetching news: {data.get('error', 'Unknown')}")
\ No newline at end of file
+    raise Exception(f"Error fetching news: {data.get('error', 'Unknown')}")
+
+def _refresh(api_key: str, country: str, limit: int, offset: int):
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    articles = _fetch_news(api_key, country, today, limit, offset)
+    with _cache_lock:
+        for old in [k for k in _news_cache if k[1] != today]:
+            del _news_cache[old]
+        _news_cache[(country, today, limit, offset)] = (time.time(), articles)
+        _last_good.pop((country, limit, offset), None)
+        _last_good[(country, limit, offset)] = articles
+        while len(_last_good) > LAST_GOOD_MAX:
+            del _last_good[next(iter(_last_good))]
+    return articles
+
+def get_today_news(api_key: str, limit: int = 10, offset: int = 0, country: str = "in"):
+
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    key = (country, today, limit, offset)
+
+    with _cache_lock:
+        if offset == 0:
+            _prefetch_keys.pop((country, limit), None)
+            _prefetch_keys[(country, limit)] = (api_key, time.time())
+            while len(_prefetch_keys) > NEWS_PREFETCH_MAX:
+                del _prefetch_keys[next(iter(_prefetch_keys))]
+        cached = _news_cache.get(key)
+    if cached and time.time() - cached[0] < NEWS_CACHE_TTL:
+        return cached[1]
+
+    try:
+        return _refresh(api_key, country, limit, offset)
+    except Exception:
+        with _cache_lock:
+            fallback = _last_good.get((country, limit, offset))
+        if fallback is not None:
+            return fallback
+        raise
+
+def _prefetch_loop(interval: int):
+    while True:
+        time.sleep(interval)
+        now = time.time()
+        with _cache_lock:
+            for idle in [k for k, (_, asked_at) in _prefetch_keys.items() if now - asked_at > NEWS_PREFETCH_IDLE]:
+                del _prefetch_keys[idle]
+            jobs = list(_prefetch_keys.items())
+        for (country, limit), (api_key, _) in jobs:
+            try:
+                _refresh(api_key, country, limit, 0)
+            except Exception:
+                # keep serving the last good snapshot until the next round
+                pass
+
+def start_news_prefetcher(interval: int = NEWS_PREFETCH_INTERVAL):
+    global _prefetch_thread
+    with _cache_lock:
+        if _prefetch_thread is not None:
+            return
+        _prefetch_thread = threading.Thread(target=_prefetch_loop, args=(interval,), daemon=True)
+    _prefetch_thread.start()
+
+def _article_key(article: dict):
+    url = article.get("url")
+    if url:
+        raw = url
+    else:
+        raw = f"{article.get('title', '')}\n{article.get('description', '')}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _summarize_batch(batch, gemini_api_key):
+    items = [
+        {"id": i, "title": a.get("title") or "", "description": a.get("description") or ""}
+        for i, a in enumerate(batch)
+    ]
+    prompt = f"""
+        You are a news editor. Summarize each article below in one neutral sentence (≤30 words).
+        Return ONLY a JSON array with one object per article, in the same order:
+        [{{"id": <id>, "summary": "<sentence>"}}]
+
+        Articles:
+        {json.dumps(items, ensure_ascii=False)}
+        """
+
+    text = generate(
+        prompt, gemini_api_key,
+        generation_config={"response_mime_type": "application/json"},
+        caller="news_digest"
+    ) or "[]"
+    match = re.search(r"\[.*\]", text, re.S)
+    parsed = json.loads(match.group(0)) if match else []
+
+    summaries = {}
+    for item in parsed:
+        try:
+            summaries[int(item["id"])] = str(item["summary"]).strip()
+        except (KeyError, TypeError, ValueError):
+            continue
+    return summaries
+
+def summarize_articles(articles, gemini_api_key: str, batch_size: int = SUMMARY_BATCH_SIZE):
+    with _cache_lock:
+        pending = [a for a in articles if _article_key(a) not in _summary_cache]
+
+    if pending:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            summaries = _summarize_batch(batch, gemini_api_key)
+            with _cache_lock:
+                for i, article in enumerate(batch):
+                    if summaries.get(i):
+                        _summary_cache[_article_key(article)] = summaries[i]
+                while len(_summary_cache) > SUMMARY_CACHE_MAX:
+                    del _summary_cache[next(iter(_summary_cache))]
+
+    with _cache_lock:
+        return [_summary_cache.get(_article_key(a)) for a in articles]
+
+def get_news_digest(api_key: str, gemini_api_key: str, date: str = None, country: str = "in"):
+    if date is None:
+        date = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    key = (country, date)
+    digest = _cached_digest(key)
+    if digest is not None:
+        return digest
+
+    # one build per digest; requests for the same one wait for it and then
+    # read the cache, other countries and dates build in parallel
+    with _cache_lock:
+        lock = _digest_locks.setdefault(key, threading.Lock())
+    with lock:
+        digest = _cached_digest(key)
+        if digest is not None:
+            return digest
+        try:
+            return _build_digest(api_key, gemini_api_key, date, country)
+        finally:
+            with _cache_lock:
+                _digest_locks.pop(key, None)
+
+def _cached_digest(key):
+    with _cache_lock:
+        entry = _digest_cache.get(key)
+    if entry is None or (entry[0] is not None and time.time() >= entry[0]):
+        return None
+    return entry[1]
+
+def _build_digest(api_key, gemini_api_key, date, country):
+    key = (country, date)
+    articles = _fetch_news(api_key, country, date, DIGEST_ARTICLE_LIMIT, 0)
+    summaries = summarize_articles(articles, gemini_api_key)
+
+    sections = {}
+    for article, summary in zip(articles, summaries):
+        category = (article.get("category") or "general").capitalize()
+        sections.setdefault(category, []).append({
+            "title": article.get("title"),
+            "summary": summary or article.get("description") or "",
+            "url": article.get("url"),
+            "source": article.get("source")
+        })
+
+    digest = {"date": date, "country": country, "sections": sections}
+    # a partial digest is kept for DIGEST_PARTIAL_TTL only; the rebuild
+    # after that asks the LLM for the summaries that are still missing
+    expires_at = None if all(summaries) else time.time() + DIGEST_PARTIAL_TTL
+    with _cache_lock:
+        for old in [k for k in _digest_cache if k[0] == country and k != key]:
+            del _digest_cache[old]
+        _digest_cache[key] = (expires_at, digest)
+    return digest
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+# On-disk price history, one directory per series (stocks/AAPL, crypto/bitcoin)
+# holding one raw little-endian array per column: ts.bin (int64 epoch seconds)
+# and a float64 file per value column. Files are only ever appended to, and
+# readers memory-map them, so a window of any length is a binary search on ts
+# plus a slice: a view into the mapped file, not a copy.
+#
+# Fetchers ask plan() what to download: nothing if the newest point is
+# fresh, the tail since the last stored timestamp, or (first use, or a longer
+# look-back than stored) the full window. ingest() stores everything but the
+# newest point, which is still moving (today's bar, the live crypto price) and
+# is kept in memory until a later fetch settles it.
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".price_store"))
+PRICE_REFRESH_SECONDS = int(os.getenv("PRICE_REFRESH_SECONDS", "60"))
+DAY = 86400
+
+_series = {}
+_series_lock = threading.Lock()
+
+class PriceSeries:
+    def __init__(self, kind, symbol, columns, min_step=0):
+        self.dir = os.path.join(PRICE_STORE_DIR, kind, "".join(c if c.isalnum() or c in "-_." else "_" for c in symbol))
+        self.columns = tuple(columns)
+        self.min_step = min_step
+        self.lock = threading.Lock()
+        self.meta = self._load_meta()
+        self.latest = None      # (fetched_at, ts, {column: value})
+        self._mapped = (0, None)
+
+    def _path(self, column):
+        return os.path.join(self.dir, f"{column}.bin")
+
+    def _load_meta(self):
+        try:
+            with open(os.path.join(self.dir, "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self):
+        path = os.path.join(self.dir, "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(path + ".tmp", path)
+
+    def _length(self):
+        # columns are written before ts, so the shortest file is the settled length
+        try:
+            return min(os.path.getsize(self._path(c)) // 8 for c in ("ts",) + self.columns)
+        except OSError:
+            return 0
+
+    def arrays(self):
+        with self.lock:
+            return self._arrays()
+
+    def _arrays(self):
+        # callers hold self.lock, since ingest() swaps _mapped
+        n = self._length()
+        if self._mapped[1] is None or n != self._mapped[0]:
+            if n == 0:
+                arrays = {"ts": np.empty(0, "<i8"), **{c: np.empty(0, "<f8") for c in self.columns}}
+            else:
+                arrays = {"ts": np.memmap(self._path("ts"), "<i8", mode="r", shape=(n,))}
+                for c in self.columns:
+                    arrays[c] = np.memmap(self._path(c), "<f8", mode="r", shape=(n,))
+            self._mapped = (n, arrays)
+        return self._mapped[1]
+
+    def plan(self, days, now=None):
+        now = now or time.time()
+        with self.lock:
+            if self.meta.get("covered_from") is None or now - days * DAY < self.meta["covered_from"]:
+                return "full", None
+            if self.latest and now - self.latest[0] < PRICE_REFRESH_SECONDS:
+                return None
+            ts = self._arrays()["ts"]
+            return "tail", int(ts[-1]) if len(ts) else int(self.meta["covered_from"])
+
+    def ingest(self, ts, values, full=False, days=None, now=None):
+        now = now or time.time()
+        ts = np.asarray(ts, dtype="<i8")
+        values = {c: np.asarray(values[c], dtype="<f8") for c in self.columns}
+        if not len(ts):
+            return
+
+        with self.lock:
+            self.latest = (now, int(ts[-1]), {c: float(v[-1]) for c, v in values.items()})
+            ts = ts[:-1]
+            values = {c: v[:-1] for c, v in values.items()}
+            os.makedirs(self.dir, exist_ok=True)
+
+            if full:
+                self._mapped = (0, None)    # unmap before replacing (required on Windows)
+                for c in self.columns + ("ts",):
+                    data = ts if c == "ts" else values[c]
+                    with open(self._path(c) + ".tmp", "wb") as f:
+                        f.write(data.tobytes())
+                    os.replace(self._path(c) + ".tmp", self._path(c))
+                self.meta["covered_from"] = now - days * DAY
+                self._save_meta()
+                return
+
+            stored = self._arrays()["ts"]
+            keep = _new_points(ts, int(stored[-1]) if len(stored) else None, self.min_step)
+            if keep.any():
+                # drop the tail of a write torn by a crash, so every column
+                # starts this append at the same row
+                settled = len(stored) * 8
+                for c in self.columns + ("ts",):
+                    if os.path.exists(self._path(c)) and os.path.getsize(self._path(c)) != settled:
+                        os.truncate(self._path(c), settled)
+                for c in self.columns + ("ts",):
+                    data = ts if c == "ts" else values[c]
+                    with open(self._path(c), "ab") as f:
+                        f.write(data[keep].tobytes())
+
+    def window(self, days, now=None):
+        start = (now or time.time()) - days * DAY
+        arrays = self.arrays()
+        i = int(np.searchsorted(arrays["ts"], start, side="left"))
+        return {c: a[i:] for c, a in arrays.items()}
+
+    def frame(self, days, now=None):
+        # the stored window plus the in-memory newest point, as one DataFrame
+        import pandas as pd
+        view = self.window(days, now)
+        latest = self.latest
+        if latest and (not len(view["ts"]) or latest[1] > view["ts"][-1]):
+            view = {c: np.append(a, latest[1] if c == "ts" else latest[2][c]) for c, a in view.items()}
+        return pd.DataFrame(view)
+
+def _new_points(ts, last, min_step):
+    # strictly after what is stored and at least min_step apart, so tail
+    # fetches at a finer granularity are thinned to the stored one
+    keep = np.zeros(len(ts), dtype=bool)
+    prev = last
+    for i, t in enumerate(ts):
+        if prev is None or t - prev >= max(min_step, 1):
+            keep[i] = True
+            prev = t
+    return keep
+
+def get_series(kind, symbol, columns, min_step=0):
+    key = (kind, symbol)
+    with _series_lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = PriceSeries(kind, symbol, columns, min_step)
+    return series
@@ -1,24 +1,87 @@
-import yfinance as yf
-import pandas as pd
-import google.generativeai as genai
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from backend_llm import generate
+from backend_prices import get_series
+from instrumentation import span
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+STOCK_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
 
 def get_stock_data(symbol: str, days: int = 30):
+    # daily bars come from the local price store; yfinance is only asked for
+    # the bars after the last stored one (or the whole window on first use)
+    symbol = symbol.upper()
+    series = get_series("stocks", symbol, STOCK_COLUMNS)
     try:
-        stock = yf.Ticker(symbol)
-        hist = stock.history(period=f"{days}d")
-        if hist.empty:
+        plan = series.plan(days)
+        if plan is not None:
+            import yfinance as yf
+            from datetime import datetime, timezone
+            mode, since = plan
+            stock = yf.Ticker(symbol)
+            with span("yfinance", "history" if mode == "full" else "history_tail"):
+                if mode == "full":
+                    hist = stock.history(period=f"{days}d")
+                else:
+                    hist = stock.history(start=datetime.fromtimestamp(since, timezone.utc).strftime("%Y-%m-%d"))
+            if not hist.empty:
+                if mode == "full":
+                    series.meta["tz"] = str(hist.index.tz or "UTC")
+                series.ingest(hist.index.as_unit("s").asi8, {c: hist[c].to_numpy() for c in STOCK_COLUMNS},
+                              full=mode == "full", days=days)
+
+        import pandas as pd
+        frame = series.frame(days)
+        if frame.empty:
             return {"error": "No stock data found"}
-        hist.reset_index(inplace=True)
-        return {"symbol": symbol.upper(), "history": hist}
+        dates = pd.to_datetime(frame.pop("ts"), unit="s", utc=True).dt.tz_convert(series.meta.get("tz", "UTC"))
+        frame.insert(0, "Date", dates)
+        return {"symbol": symbol, "history": frame}
     except Exception as e:
         return {"error": str(e)}
 
+def get_stocks_closes(symbols, days: int = 30):
+    # every ticker in one yf.download call; returns (closes, errors) where
+    # closes has a column per ticker that returned data
+    symbols = [s.upper() for s in symbols]
+    try:
+        import yfinance as yf
+        with span("yfinance", "download"):
+            data = yf.download(symbols, period=f"{days}d", auto_adjust=True, progress=False, threads=True)
+    except Exception as e:
+        return None, {s: str(e) for s in symbols}
+
+    if data is None or data.empty:
+        return None, {s: "No stock data found" for s in symbols}
+    closes = data["Close"]
+    if closes.ndim == 1:
+        closes = closes.to_frame(symbols[0])
+    closes = closes.dropna(axis=1, how="all")
+    errors = {s: "No stock data found" for s in symbols if s not in closes.columns}
+    return closes[[s for s in symbols if s in closes.columns]], errors
+
+def get_stock_prices(symbols):
+    closes, errors = get_stocks_closes(symbols, days=5)
+    if closes is None:
+        return {}, errors
+    last = closes.ffill().iloc[-1]
+    return {s: round(float(p), 4) for s, p in last.items()}, errors
+
 def llm_stock_advice(symbol: str, hist: pd.DataFrame, gemini_api_key: str):
     if not gemini_api_key:
         return "LLM suggestions unavailable: Missing Gemini API Key."
 
-    genai.configure(api_key=gemini_api_key)
+    try:
+        text = generate(stock_advice_prompt(symbol, hist), gemini_api_key, caller="stocks")
+        return text or "AI could not generate advice."
+    except Exception as e:
+        return f"LLM error: {e}"
 
+def stock_advice_prompt(symbol: str, hist: pd.DataFrame):
     last_price = hist["Close"].iloc[-1]
     pct_change = ((hist["Close"].iloc[-1] - hist["Close"].iloc[0]) / hist["Close"].iloc[0]) * 100
 
@@ -47,10 +110,4 @@ def llm_stock_advice(symbol: str, hist: pd.DataFrame, gemini_api_key: str):
         Reason 2: <short reason>
         Reason 3: <short reason>
         """
-
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        resp = model.generate_content(prompt)
-        return getattr(resp, "text", None) or "AI could not generate advice."
-    except Exception as e:
-        return f"LLM error: {e}"
\ No newline at end of file
+    return prompt
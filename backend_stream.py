@@ -0,0 +1,68 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# Finished LLM answers, shared between the streaming (SSE) endpoints and the
+# plain JSON ones: whichever runs first pays for the Gemini call.
+RESULT_TTL = 600
+RESULT_CACHE_MAX = 1000
+
+# key -> (stored_at, text)
+_results = OrderedDict()
+_results_lock = threading.Lock()
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",     # keep nginx from buffering the stream
+}
+
+def get_result(key):
+    with _results_lock:
+        entry = _results.get(key)
+        if entry and time.time() - entry[0] < RESULT_TTL:
+            return entry[1]
+    return None
+
+def put_result(key, text):
+    with _results_lock:
+        _results[key] = (time.time(), text)
+        _results.move_to_end(key)
+        while len(_results) > RESULT_CACHE_MAX:
+            _results.popitem(last=False)
+
+def cached(key, produce, is_valid=lambda text: True):
+    text = get_result(key)
+    if text is None:
+        text = produce()
+        if is_valid(text):
+            put_result(key, text)
+    return text
+
+def sse(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# Relays text chunks as `chunk` events, then caches the assembled answer
+# (passed through `render`, so it matches what the JSON endpoint caches) and
+# sends finish(answer) as the closing `done` event.
+def stream_result(key, chunks, finish=lambda text: {"text": text}, render=None):
+    text = get_result(key)
+    if text is not None:
+        yield sse("done", finish(text))
+        return
+
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield sse("chunk", {"text": chunk})
+    except Exception as e:
+        yield sse("error", {"error": f"LLM error: {e}"})
+        return
+
+    text = "".join(parts)
+    if text:
+        if render is not None:
+            text = render(text)
+        put_result(key, text)
+    yield sse("done", finish(text))
@@ -1,6 +1,19 @@
-import os, requests
+import os
+import time
 from math import radians, cos, sin, asin, sqrt
 
+import numpy as np
+
+import circuit_breaker
+from instrumentation import span
+
+GEOLOCATION_URL = "https://www.googleapis.com/geolocation/v1/geolocate"
+PLACES_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+
+ITINERARY_MAX_PLACES = 500
+ITINERARY_TIME_BUDGET = float(os.getenv("ITINERARY_TIME_BUDGET", "0.05"))   # seconds of 2-opt
+EARTH_RADIUS_M = 6371000
+
 def haversine(lat1, lon1, lat2, lon2):
     R = 6371  # km
     dlat = radians(lat2 - lat1)
@@ -9,15 +22,16 @@ def haversine(lat1, lon1, lat2, lon2):
     return 1000 * (2 * R * asin(sqrt(a))) 
 
 def get_user_location_google(api_key: str):
-    url = f"https://www.googleapis.com/geolocation/v1/geolocate?key={api_key}"
+    url = f"{GEOLOCATION_URL}?key={api_key}"
     try:
-        resp = requests.post(url, timeout=10).json()
+        with span("google_geolocation", "geolocate"):
+            resp = circuit_breaker.post("google_geolocation", url, timeout=10).json()
         return resp.get("location", {"lat": None, "lng": None})
     except Exception:
         return {"lat": None, "lng": None}
 
 def get_nearby_places(api_key: str, lat: float, lon: float, place_type="restaurant", radius=2000):
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+    url = PLACES_URL
     params = {
         "key": api_key,
         "location": f"{lat},{lon}",
@@ -25,7 +39,10 @@ def get_nearby_places(api_key: str, lat: float, lon: float, place_type="restaura
         "type": place_type
     }
     try:
-        resp = requests.get(url, params=params, timeout=10).json()
+        with span("google_places", "nearbysearch") as s:
+            res = circuit_breaker.get("google_places", url, params=params, timeout=10)
+            s.size = len(res.content)
+        resp = res.json()
     except Exception:
         return []
 
@@ -45,4 +62,87 @@ def get_nearby_places(api_key: str, lat: float, lon: float, place_type="restaura
             "photo": p["photos"][0]["photo_reference"] if "photos" in p else None,
             "url": maps_url
         })
-    return places
\ No newline at end of file
+    return places
+
+# ---------------- Itinerary ----------------
+# Orders a set of places into a walking route starting at the user. All
+# pairwise distances come from one vectorized haversine; the order starts
+# from nearest-neighbour and is improved by 2-opt (reversing a stretch of the
+# route when that makes it shorter) until no reversal helps or
+# ITINERARY_TIME_BUDGET runs out. The route is open: it ends at the last
+# place instead of returning to the start.
+def distance_matrix(lats, lons):
+    # meters between every pair of points
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def nearest_neighbour_route(dist):
+    # visit order from point 0, always going to the closest unvisited point
+    n = len(dist)
+    route = [0]
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[0] = False
+    for _ in range(n - 1):
+        row = np.where(unvisited, dist[route[-1]], np.inf)
+        nxt = int(np.argmin(row))
+        route.append(nxt)
+        unvisited[nxt] = False
+    return np.array(route)
+
+def two_opt(dist, route, deadline):
+    # an extra point at zero distance from all others closes the open route
+    # into a cycle, so the usual 2-opt move also covers changing the last stop
+    n = len(route)
+    if n < 3:
+        return route, 0
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = dist
+    route = np.append(route, n)
+    passes = 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        passes += 1
+        for i in range(1, n - 1):
+            # reverse route[i..j] for every j at once: the gain is the two
+            # edges removed minus the two added
+            a, b = route[i - 1], route[i]
+            c, d = route[i + 1:n], route[i + 2:n + 1]
+            delta = padded[a, c] + padded[b, d] - padded[a, b] - padded[c, d]
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-6:
+                j = i + 1 + k
+                route[i:j + 1] = route[i:j + 1][::-1]
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return route[:-1], passes
+
+def plan_itinerary(start, places, time_budget=ITINERARY_TIME_BUDGET):
+    # start: {"lat", "lon"}; places: dicts with "lat" and "lon"
+    started = time.perf_counter()
+    lats = [start["lat"]] + [p["lat"] for p in places]
+    lons = [start["lon"]] + [p["lon"] for p in places]
+    with span("itinerary", "plan"):
+        dist = distance_matrix(lats, lons)
+        route = nearest_neighbour_route(dist)
+        greedy_length = float(dist[route[:-1], route[1:]].sum())
+        route, passes = two_opt(dist, route, started + time_budget)
+        legs = dist[route[:-1], route[1:]]
+
+    stops = []
+    for index, leg in zip(route[1:], legs):
+        stop = dict(places[index - 1])
+        stop["leg_distance"] = round(float(leg), 1)
+        stops.append(stop)
+    return {
+        "stops": stops,
+        "total_distance": round(float(legs.sum()), 1),
+        "greedy_distance": round(greedy_length, 1),
+        "two_opt_passes": passes,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
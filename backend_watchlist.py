@@ -0,0 +1,241 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from backend_crypto import get_crypto_data, get_crypto_prices, llm_crypto_advice
+from backend_db import execute
+from backend_stocks import get_stock_data, get_stock_prices, llm_stock_advice
+from backend_stream import sse
+
+# Per-user watchlists, kept in the Watchlist_of_Users table (User_Id, Kind,
+# Symbol), and one background poller shared by everyone. Each round it takes
+# the distinct symbols watched by users with an open stream and fetches their
+# prices with one batched call per kind, so a symbol costs the same however
+# many users watch it. Ticks are pushed to every open stream watching the
+# symbol. LLM advice is per user, made with that user's own Gemini key, and
+# regenerated only once the price has moved ADVICE_MOVE_THRESHOLD since their
+# last advice for the symbol. Rows are unique on (User_Id, Kind, Symbol).
+WATCHLIST_TABLE = "Watchlist_of_Users"
+WATCHLIST_KINDS = ("stock", "crypto")
+WATCHLIST_MAX = 30
+POLL_INTERVAL = int(os.getenv("WATCHLIST_POLL_INTERVAL", "60"))
+MIN_POLL_GAP = 5                # seconds; new subscribers wake the poller early
+ADVICE_MOVE_THRESHOLD = float(os.getenv("WATCHLIST_ADVICE_MOVE", "0.02"))
+KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE_MAX = 200
+
+# user -> {"symbols": {(kind, symbol)}, "queues": [Queue], "gemini_key": str}
+_subscribers = {}
+# (kind, symbol) -> latest tick
+_prices = {}
+# (user, kind, symbol) -> {"advice": text, "price": price at the time, "at": ts}
+_advice = {}
+_advice_pending = set()
+_lock = threading.Lock()
+_wake = threading.Event()
+_poller = None
+_advice_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="watchlist-advice")
+
+# ---------------- Storage ----------------
+def load_watchlist(client, user_email):
+    resp = execute(
+        client.table(WATCHLIST_TABLE).select("Kind, Symbol").eq("User_Id", user_email),
+        "watchlist"
+    )
+    watchlist = {kind: [] for kind in WATCHLIST_KINDS}
+    for row in resp.data or []:
+        if row.get("Kind") in watchlist:
+            watchlist[row["Kind"]].append(row["Symbol"])
+    return watchlist
+
+def add_symbol(client, user_email, kind, symbol):
+    watchlist = load_watchlist(client, user_email)
+    if symbol not in watchlist[kind]:
+        if sum(len(v) for v in watchlist.values()) >= WATCHLIST_MAX:
+            raise ValueError(f"At most {WATCHLIST_MAX} symbols per watchlist")
+        # an upsert, so two adds racing past the check above store one row
+        execute(client.table(WATCHLIST_TABLE).upsert(
+            {"User_Id": user_email, "Kind": kind, "Symbol": symbol},
+            on_conflict="User_Id,Kind,Symbol", ignore_duplicates=True
+        ), "add watchlist symbol")
+        watchlist[kind].append(symbol)
+    _update_subscription(user_email, watchlist)
+    return watchlist
+
+def remove_symbol(client, user_email, kind, symbol):
+    execute(
+        client.table(WATCHLIST_TABLE).delete().eq("User_Id", user_email).eq("Kind", kind).eq("Symbol", symbol),
+        "remove watchlist symbol"
+    )
+    watchlist = load_watchlist(client, user_email)
+    _update_subscription(user_email, watchlist)
+    return watchlist
+
+def _symbol_set(watchlist):
+    return {(kind, symbol) for kind, symbols in watchlist.items() for symbol in symbols}
+
+# ---------------- Subscriptions ----------------
+def subscribe(user_email, watchlist, gemini_key):
+    q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_MAX)
+    symbols = _symbol_set(watchlist)
+    with _lock:
+        sub = _subscribers.setdefault(user_email, {"symbols": set(), "queues": []})
+        sub["symbols"] = symbols
+        sub["gemini_key"] = gemini_key
+        sub["queues"].append(q)
+        snapshot = {
+            "watchlist": watchlist,
+            "prices": [dict(_prices[key], kind=key[0], symbol=key[1]) for key in symbols if key in _prices],
+            "advice": [dict(_advice[(user_email,) + key], kind=key[0], symbol=key[1])
+                       for key in symbols if (user_email,) + key in _advice],
+        }
+        missing = any(key not in _prices for key in symbols)
+    q.put(sse("snapshot", snapshot))
+    _start_poller()
+    if missing:
+        _wake.set()
+    return q
+
+def unsubscribe(user_email, q):
+    with _lock:
+        sub = _subscribers.get(user_email)
+        if sub and q in sub["queues"]:
+            sub["queues"].remove(q)
+            if not sub["queues"]:
+                del _subscribers[user_email]
+                for key in [k for k in _advice if k[0] == user_email]:
+                    del _advice[key]
+
+def _update_subscription(user_email, watchlist):
+    with _lock:
+        sub = _subscribers.get(user_email)
+        if sub is None:
+            return
+        sub["symbols"] = _symbol_set(watchlist)
+        queues = list(sub["queues"])
+    for q in queues:
+        _offer(q, sse("watchlist", watchlist))
+    _wake.set()
+
+def events(q):
+    # the SSE body for one connection; the caller unsubscribes when it ends
+    while True:
+        try:
+            yield q.get(timeout=KEEPALIVE_SECONDS)
+        except queue.Empty:
+            yield ": keepalive\n\n"
+
+def _offer(q, event):
+    try:
+        q.put_nowait(event)
+    except queue.Full:
+        # a stalled client; it gets a fresh snapshot when it reconnects
+        pass
+
+def _publish(key, event):
+    with _lock:
+        queues = [q for sub in _subscribers.values() if key in sub["symbols"] for q in sub["queues"]]
+    for q in queues:
+        _offer(q, event)
+
+def _publish_to(user_email, event):
+    with _lock:
+        sub = _subscribers.get(user_email)
+        queues = list(sub["queues"]) if sub else []
+    for q in queues:
+        _offer(q, event)
+
+# ---------------- Poller ----------------
+def _start_poller():
+    global _poller
+    with _lock:
+        if _poller is not None:
+            return
+        _poller = threading.Thread(target=_poll_loop, daemon=True)
+    _poller.start()
+
+def _poll_loop():
+    last = 0
+    while True:
+        _wake.wait(POLL_INTERVAL)
+        _wake.clear()
+        time.sleep(max(0, MIN_POLL_GAP - (time.time() - last)))
+        last = time.time()
+        try:
+            poll_once()
+        except Exception:
+            # keep the last ticks; the next round tries again
+            pass
+
+def poll_once():
+    with _lock:
+        watched = set()
+        advised = []    # (user, gemini key, symbols)
+        for user_email, sub in _subscribers.items():
+            watched.update(sub["symbols"])
+            if sub.get("gemini_key"):
+                advised.append((user_email, sub["gemini_key"], set(sub["symbols"])))
+    if not watched:
+        return
+
+    ticks = {}
+    stocks = [symbol for kind, symbol in watched if kind == "stock"]
+    coins = [symbol for kind, symbol in watched if kind == "crypto"]
+    if stocks:
+        prices, _ = get_stock_prices(stocks)
+        for symbol, price in prices.items():
+            ticks[("stock", symbol)] = {"price": price}
+    if coins:
+        prices, _ = get_crypto_prices(coins)
+        for symbol, quote in prices.items():
+            if quote["price"] is not None:
+                ticks[("crypto", symbol)] = {"price": quote["price"], "change_24h": quote["change_24h"]}
+
+    now = time.time()
+    for key, tick in ticks.items():
+        tick["at"] = now
+        with _lock:
+            previous = _prices.get(key)
+            _prices[key] = tick
+        if previous is None or previous["price"] != tick["price"]:
+            _publish(key, sse("tick", dict(tick, kind=key[0], symbol=key[1])))
+    for user_email, gemini_key, symbols in advised:
+        for key in symbols & ticks.keys():
+            _maybe_advise(user_email, key, ticks[key]["price"], gemini_key)
+
+# ---------------- Advice ----------------
+def _maybe_advise(user_email, key, price, gemini_key):
+    if not price:
+        return
+    user_key = (user_email,) + key
+    with _lock:
+        last = _advice.get(user_key)
+        if last and abs(price / last["price"] - 1) < ADVICE_MOVE_THRESHOLD:
+            return
+        if user_key in _advice_pending:
+            return
+        _advice_pending.add(user_key)
+    _advice_pool.submit(_advise, user_email, key, price, gemini_key)
+
+def _advise(user_email, key, price, gemini_key):
+    kind, symbol = key
+    user_key = (user_email,) + key
+    try:
+        if kind == "stock":
+            data = get_stock_data(symbol)
+            text = llm_stock_advice(symbol, data["history"], gemini_key) if "history" in data else None
+        else:
+            data = get_crypto_data(symbol)
+            text = llm_crypto_advice(symbol, data["history"], gemini_key) if "history" in data else None
+
+        if text and not text.startswith(("LLM error", "LLM suggestions unavailable")):
+            advice = {"advice": text, "price": price, "at": time.time()}
+            with _lock:
+                if user_email in _subscribers:
+                    _advice[user_key] = advice
+            _publish_to(user_email, sse("advice", dict(advice, kind=kind, symbol=symbol)))
+    finally:
+        with _lock:
+            _advice_pending.discard(user_key)
@@ -1,36 +1,48 @@
-import requests
 import traceback
 
+import circuit_breaker
+from backend_llm import generate
+from instrumentation import span
+
+BASE_URL = "http://api.openweathermap.org/data/2.5"
+LOCATION_URL = "http://ip-api.com/json"
+
+def weather_url(city: str, api_key: str):
+    return f"{BASE_URL}/weather?q={city}&appid={api_key}&units=metric"
+
+def parse_weather(city: str, data: dict):
+    main = data.get("main", {})
+    wind = data.get("wind", {})
+    sys_ = data.get("sys", {})
+    weather_list = data.get("weather", [{}])
+
+    return {
+        "city": city,
+        "temp": main.get("temp"),
+        "feels_like": main.get("feels_like"),
+        "humidity": main.get("humidity"),
+        "pressure": main.get("pressure"),
+        "condition": weather_list[0].get("description", "unknown"),
+        "wind_speed": wind.get("speed"),
+        "sunrise": sys_.get("sunrise"),
+        "sunset": sys_.get("sunset"),
+    }
+
 def get_weather(city: str, api_key: str):
     try:
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-        response = requests.get(url, timeout=10)
+        with span("openweathermap", "weather") as s:
+            response = circuit_breaker.get("openweathermap", weather_url(city, api_key), timeout=10)
+            s.size = len(response.content)
         response.raise_for_status()
-        data = response.json()
-
-        main = data.get("main", {})
-        wind = data.get("wind", {})
-        sys_ = data.get("sys", {})
-        weather_list = data.get("weather", [{}])
-
-        return {
-            "city": city,
-            "temp": main.get("temp"),
-            "feels_like": main.get("feels_like"),
-            "humidity": main.get("humidity"),
-            "pressure": main.get("pressure"),
-            "condition": weather_list[0].get("description", "unknown"),
-            "wind_speed": wind.get("speed"),
-            "sunrise": sys_.get("sunrise"),
-            "sunset": sys_.get("sunset"),
-        }
+        return parse_weather(city, response.json())
     except Exception as e:
         return {"error": f"Weather API failed: {str(e)}"}
 
 def get_user_location_city():
 
     try:
-        res = requests.get("http://ip-api.com/json", timeout=10)
+        with span("ip_api", "location"):
+            res = circuit_breaker.get("ip_api", LOCATION_URL, timeout=10)
         if res.status_code == 200:
             data = res.json()
             return data.get("city")  
@@ -42,13 +54,15 @@ def llm_weather_advice(city: str, weather: dict, gemini_api_key: str, user_conte
     if not gemini_api_key:
         return "LLM suggestions unavailable: Missing GEMINI_API_KEY."
 
+    prompt = weather_advice_prompt(city, weather, user_context)
+
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
+        text = generate(prompt, gemini_api_key, request_options={"timeout": 15}, caller="weather")
+        return weather_advice_text(text)
     except Exception as e:
-        return f"LLM init error: {e}"
+        return f"LLM error: {e}"
 
+def weather_advice_prompt(city: str, weather: dict, user_context: str = ""):
     prompt = f"""
         You are a helpful daily-planner assistant. Based on the following current weather, give concise, practical suggestions for someone in {city}.
         Avoid generic platitudes; focus on actionable tips. If rain or poor air/wind conditions are likely problems, mention precautions.
@@ -63,17 +77,7 @@ def llm_weather_advice(city: str, weather: dict, gemini_api_key: str, user_conte
         - One short title line (e.g., "Today’s Weather Tips for {city}")
         - Exactly 4 bullets, each ≤ 16 words
     """
+    return prompt
 
-    try:
-        resp = model.generate_content(prompt, request_options={"timeout": 15})
-        text = getattr(resp, "text", None)
-
-        if not text:
-            try:
-                text = resp.candidates[0].content.parts[0].text
-            except Exception:
-                text = None
-
-        return text or "Sorry, I couldn’t generate suggestions right now."
-    except Exception as e:
-        return f"LLM error: {e}"
\ No newline at end of file
+def weather_advice_text(text):
+    return text or "Sorry, I couldn’t generate suggestions right now."
@@ -0,0 +1,178 @@
+"""Concurrent slow-upstream load test: threaded WSGI vs. the ASGI path.
+
+Both servers expose the same route, which fetches a CoinGecko market chart
+from a local stub that sleeps ``--delay`` seconds before answering. The
+threaded server gets a fixed pool of ``--threads`` workers (what a
+``gunicorn --threads N`` worker gives us); the async server runs the
+``backend_async`` fetcher under uvicorn in a single process.
+
+    python benchmarks/async_load.py --concurrency 200 --delay 2 --threads 16
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from flask import Flask, jsonify
+from quart import Quart, jsonify as quart_jsonify
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import backend_crypto
+from backend_async import get_crypto_data_async, close_http_client
+
+STUB_PORT = 5901
+THREADED_PORT = 5902
+ASYNC_PORT = 5903
+
+
+class SlowUpstream:
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+
+    async def handle(self, reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        now = int(time.time() * 1000)
+        body = json.dumps({"prices": [[now - i * 3600000, 100.0 + i] for i in range(24)]}).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        writer.close()
+        self.in_flight -= 1
+
+    def reset(self):
+        self.peak = 0
+
+    def serve_forever(self):
+        async def main():
+            server = await asyncio.start_server(self.handle, "127.0.0.1", STUB_PORT, backlog=4096)
+            async with server:
+                await server.serve_forever()
+        asyncio.run(main())
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    request_queue_size = 4096
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app, handler=QuietHandler)
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def threaded_app():
+    app = Flask("threaded")
+
+    @app.route("/api/crypto")
+    def crypto():
+        result = backend_crypto.get_crypto_data("bitcoin")
+        return jsonify({"ok": "error" not in result})
+
+    return app
+
+
+def async_app():
+    app = Quart("async")
+
+    @app.route("/api/crypto")
+    async def crypto():
+        result = await get_crypto_data_async("bitcoin")
+        return quart_jsonify({"ok": "error" not in result})
+
+    @app.after_serving
+    async def shutdown():
+        await close_http_client()
+
+    return app
+
+
+async def fire(url, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=600, limits=limits) as client:
+        async def one():
+            try:
+                r = await client.get(url)
+                return r.status_code == 200 and r.json().get("ok")
+            except Exception:
+                return False
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(concurrency)))
+        return time.perf_counter() - start, sum(results)
+
+
+def wait_for(port):
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=2.0)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    backend_crypto.BASE_URL = f"http://127.0.0.1:{STUB_PORT}"
+
+    upstream = SlowUpstream(args.delay)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+
+    wsgi = PooledWSGIServer("127.0.0.1", THREADED_PORT, threaded_app(), args.threads)
+    threading.Thread(target=wsgi.serve_forever, daemon=True).start()
+
+    config = uvicorn.Config(async_app(), host="127.0.0.1", port=ASYNC_PORT,
+                            log_level="warning", backlog=4096)
+    asgi = uvicorn.Server(config)
+    threading.Thread(target=asgi.run, daemon=True).start()
+
+    for port in (STUB_PORT, THREADED_PORT, ASYNC_PORT):
+        wait_for(port)
+
+    print(f"{args.concurrency} concurrent requests, upstream delay {args.delay}s")
+    print(f"{'server':<28}{'peak open upstream':>20}{'ok':>8}{'wall (s)':>12}")
+    for name, port in ((f"threaded ({args.threads} threads)", THREADED_PORT), ("asgi (1 process)", ASYNC_PORT)):
+        upstream.reset()
+        elapsed, ok = asyncio.run(fire(f"http://127.0.0.1:{port}/api/crypto", args.concurrency))
+        print(f"{name:<28}{upstream.peak:>20}{ok:>8}{elapsed:>12.2f}")
+
+    asgi.should_exit = True
+    wsgi.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Prompt size of the inbox summary before and after email preprocessing.
+
+Replays a fixture mailbox through the old body extraction (first top-level
+text/plain part, verbatim, every email in the prompt) and through
+email_preprocess, importance triage (rules only, as for a new user) and
+near-duplicate collapsing, and builds the summary prompt from each. ``--mailbox mailbox`` (gmail_mailbox.json) is reply chains,
+forwards, HTML-only newsletters and nested multiparts; ``--mailbox
+notifications`` (gmail_notifications.json) is CI and order update storms.
+Prompt tokens are the local estimate used for the per-email budget; summary
+latency grows with them, since the model reads the whole prompt before
+answering.
+
+    python benchmarks/email_prompt_size.py --mailbox notifications --budget 250
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def raw_body(payload):
+    # the extraction get_last_48h_emails used before preprocessing
+    if "parts" in payload:
+        for part in payload["parts"]:
+            if part["mimeType"] == "text/plain" and "data" in part["body"]:
+                return base64.urlsafe_b64decode(part["body"]["data"]).decode()
+        return ""
+    if "data" in payload.get("body", {}):
+        return base64.urlsafe_b64decode(payload["body"]["data"]).decode()
+    return ""
+
+
+def raw_prompt(emails):
+    # the summary prompt before preprocessing and duplicate collapsing
+    combined_text = ""
+    for e in emails:
+        combined_text += f"From: {e['from']}\nSubject: {e['subject']}\n{e['body']}\n\n"
+    return f"Summarize the following emails in concise bullet points:\n{combined_text}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mailbox", choices=["mailbox", "notifications"], default="mailbox")
+    parser.add_argument("--budget", type=int, default=None, help="tokens per email (default EMAIL_TOKEN_BUDGET)")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    import email_clusters
+    import email_preprocess
+    import email_triage
+    from backend_email import email_summary_prompt
+    budget = args.budget or email_preprocess.EMAIL_TOKEN_BUDGET
+
+    with open(os.path.join(FIXTURES, f"gmail_{args.mailbox}.json"), encoding="utf-8") as f:
+        messages = json.load(f)
+
+    def as_emails(body_of):
+        emails = []
+        for m in messages:
+            headers = {h["name"]: h["value"] for h in m["payload"]["headers"]}
+            emails.append({"id": m["id"], "from": headers["From"], "subject": headers["Subject"],
+                           "labels": m.get("labelIds", []), "bulk": "List-Unsubscribe" in headers,
+                           "body": body_of(m["payload"])})
+        return emails
+
+    before = as_emails(raw_body)
+    before_prompt = raw_prompt(before)
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        after = as_emails(email_preprocess.preprocess)
+    elapsed = (time.perf_counter() - start) / args.rounds
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        clusters = email_clusters.cluster_emails(after)
+    cluster_elapsed = (time.perf_counter() - start) / args.rounds
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for e in after:
+            e["importance"] = email_triage.score("benchmark@example.com", e)
+    triage_elapsed = (time.perf_counter() - start) / args.rounds
+    detailed, _ = email_triage.split_important(email_clusters.collapse_duplicates(after))
+    after_prompt = email_summary_prompt(after, budget)
+
+    empty_before = sum(1 for e in before if not e["body"].strip())
+    empty_after = sum(1 for e in after if not e["body"].strip())
+    tokens_before = email_preprocess.estimate_tokens(before_prompt)
+    tokens_after = email_preprocess.estimate_tokens(after_prompt)
+
+    print(f"{len(messages)} messages ({args.mailbox}), budget {budget} tokens per email")
+    print(f"{'':24}{'before':>10}{'after':>10}")
+    print(f"  {'prompt chars':<22}{len(before_prompt):>10}{len(after_prompt):>10}")
+    print(f"  {'prompt tokens (est.)':<22}{tokens_before:>10}{tokens_after:>10}  ({(1 - tokens_after / tokens_before) * 100:.0f}% fewer)")
+    print(f"  {'emails in prompt':<22}{len(before):>10}{len(clusters):>10}")
+    print(f"  {'  with their text':<22}{len(before):>10}{len(detailed):>10}")
+    print(f"  {'empty bodies':<22}{empty_before:>10}{empty_after:>10}")
+    print(f"  preprocessing           {elapsed * 1000:.1f} ms per mailbox ({elapsed / len(messages) * 1e6:.0f} us per email)")
+    print(f"  clustering              {cluster_elapsed * 1000:.1f} ms per mailbox")
+    print(f"  triage                  {triage_elapsed / len(messages) * 1e6:.1f} us per email")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""Writes the upstream fixtures replayed by benchmarks/suite.py.
+
+The payloads follow the shape of real responses from each API (trimmed to the
+fields the app reads, plus typical padding so sizes are realistic). They are
+generated from a fixed seed so every run and every machine replays the same
+bytes; a real recording of the same shape can be dropped in its place.
+
+    python benchmarks/fixtures/generate.py
+"""
+import os
+import json
+import base64
+import random
+import hashlib
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+START = datetime(2025, 1, 6)
+USER_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "benchmark"
+
+rng = random.Random(20250106)
+
+WORDS = (
+    "meeting schedule project update invoice review deadline budget team report "
+    "client proposal launch design feedback quarter plan release travel booking "
+    "order shipment payment account security notice offer newsletter webinar"
+).split()
+
+
+def sentence(n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def write(name, data):
+    with open(os.path.join(HERE, name), "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+def coingecko():
+    # hourly points for 30 days, as /coins/{id}/market_chart returns
+    prices, volumes, caps = [], [], []
+    price = 64000.0
+    for i in range(30 * 24):
+        ts = int((START + timedelta(hours=i)).timestamp() * 1000)
+        price *= 1 + rng.gauss(0, 0.004)
+        prices.append([ts, round(price, 2)])
+        volumes.append([ts, round(rng.uniform(2e10, 4e10), 2)])
+        caps.append([ts, round(price * 19.6e6, 2)])
+    return {"prices": prices, "market_caps": caps, "total_volumes": volumes}
+
+
+def coingecko_markets():
+    # /coins/markets?sparkline=true for the coins the app knows by ticker
+    coins = []
+    for coin_id, symbol, price in [("bitcoin", "btc", 64000.0), ("ethereum", "eth", 3300.0),
+                                   ("binancecoin", "bnb", 590.0), ("ripple", "xrp", 0.52),
+                                   ("solana", "sol", 145.0), ("dogecoin", "doge", 0.12)]:
+        sparkline = []
+        for _ in range(7 * 24):
+            price *= 1 + rng.gauss(0, 0.004)
+            sparkline.append(round(price, 6))
+        coins.append({
+            "id": coin_id,
+            "symbol": symbol,
+            "name": coin_id.capitalize(),
+            "current_price": sparkline[-1],
+            "market_cap": round(sparkline[-1] * rng.uniform(1e8, 2e10)),
+            "total_volume": round(rng.uniform(1e8, 4e10)),
+            "high_24h": max(sparkline[-24:]),
+            "low_24h": min(sparkline[-24:]),
+            "price_change_percentage_24h_in_currency": round((sparkline[-1] / sparkline[-24] - 1) * 100, 4),
+            "price_change_percentage_30d_in_currency": round(rng.uniform(-20, 20), 4),
+            "last_updated": (START + timedelta(days=7)).isoformat() + "Z",
+            "sparkline_in_7d": {"price": sparkline},
+        })
+    return coins
+
+
+def yfinance():
+    # Ticker.history(period="30d") after reset_index(): one row per trading day
+    rows = []
+    close = 185.0
+    day = START
+    while len(rows) < 21:
+        if day.weekday() < 5:
+            open_ = close * (1 + rng.gauss(0, 0.005))
+            close = open_ * (1 + rng.gauss(0, 0.012))
+            rows.append({
+                "Date": day.strftime("%Y-%m-%d"),
+                "Open": round(open_, 2),
+                "High": round(max(open_, close) * 1.006, 2),
+                "Low": round(min(open_, close) * 0.994, 2),
+                "Close": round(close, 2),
+                "Volume": rng.randint(40_000_000, 90_000_000),
+                "Dividends": 0.0,
+                "Stock Splits": 0.0,
+            })
+        day += timedelta(days=1)
+    return rows
+
+
+def tmdb():
+    genres = [{"id": 28 + i, "name": name} for i, name in enumerate(
+        ["Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary",
+         "Drama", "Family", "Fantasy", "History", "Horror", "Music", "Mystery",
+         "Romance", "Science Fiction", "Thriller", "War", "Western"])]
+    results = []
+    for i in range(20):
+        results.append({
+            "id": 900000 + i,
+            "title": sentence(3)[:-1],
+            "original_language": "en",
+            "overview": " ".join(sentence(14) for _ in range(3)),
+            "poster_path": f"/poster{i}.jpg",
+            "backdrop_path": f"/backdrop{i}.jpg",
+            "release_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "vote_average": round(rng.uniform(5, 9), 1),
+            "vote_count": rng.randint(100, 20000),
+            "popularity": round(rng.uniform(50, 900), 3),
+            "genre_ids": rng.sample([g["id"] for g in genres], 3),
+        })
+    return {"genres": genres}, {"page": 1, "results": results, "total_pages": 500, "total_results": 10000}
+
+
+def mediastack():
+    categories = ["general", "business", "technology", "sports", "science", "health", "entertainment"]
+    data = []
+    for i in range(10):
+        data.append({
+            "author": "Staff Reporter",
+            "title": sentence(9)[:-1],
+            "description": " ".join(sentence(18) for _ in range(2)),
+            "url": f"https://news.example.com/articles/{i}",
+            "source": rng.choice(["Example Times", "Daily Example", "Example Wire"]),
+            "image": f"https://news.example.com/images/{i}.jpg",
+            "category": rng.choice(categories),
+            "language": "en",
+            "country": "in",
+            "published_at": (START + timedelta(minutes=17 * i)).isoformat() + "+00:00",
+        })
+    return {"pagination": {"limit": 10, "offset": 0, "count": 10, "total": 400}, "data": data}
+
+
+def openweathermap():
+    weather = {
+        "coord": {"lon": 77.59, "lat": 12.98},
+        "weather": [{"id": 802, "main": "Clouds", "description": "scattered clouds", "icon": "03d"}],
+        "base": "stations",
+        "main": {"temp": 27.4, "feels_like": 28.9, "temp_min": 26.1, "temp_max": 28.2,
+                 "pressure": 1012, "humidity": 61},
+        "visibility": 10000,
+        "wind": {"speed": 4.6, "deg": 250},
+        "clouds": {"all": 40},
+        "dt": 1736150000,
+        "sys": {"country": "IN", "sunrise": 1736125000, "sunset": 1736166000},
+        "timezone": 19800,
+        "name": "Bengaluru",
+        "cod": 200,
+    }
+    location = {"status": "success", "country": "India", "city": "Bengaluru",
+                "lat": 12.98, "lon": 77.59, "timezone": "Asia/Kolkata"}
+    return weather, location
+
+
+def places():
+    geolocation = {"location": {"lat": 12.9716, "lng": 77.5946}, "accuracy": 40.0}
+    results = []
+    for i in range(20):
+        results.append({
+            "place_id": hashlib.sha1(f"place{i}".encode()).hexdigest()[:27],
+            "name": sentence(2)[:-1],
+            "vicinity": sentence(4)[:-1],
+            "rating": round(rng.uniform(3, 5), 1),
+            "user_ratings_total": rng.randint(10, 5000),
+            "geometry": {"location": {"lat": 12.9716 + rng.uniform(-0.015, 0.015),
+                                      "lng": 77.5946 + rng.uniform(-0.015, 0.015)}},
+            "photos": [{"photo_reference": hashlib.sha256(f"photo{i}".encode()).hexdigest(),
+                        "height": 1200, "width": 1600}],
+            "types": ["restaurant", "food", "point_of_interest", "establishment"],
+            "business_status": "OPERATIONAL",
+        })
+    return geolocation, {"html_attributions": [], "results": results, "status": "OK"}
+
+
+def gmail():
+    messages = []
+    for i in range(40):
+        body = "\n\n".join(" ".join(sentence(16) for _ in range(4)) for _ in range(3))
+        html = "<html><body>" + "".join(f"<p>{p}</p>" for p in body.split("\n\n")) + "</body></html>"
+        encode = lambda text: base64.urlsafe_b64encode(text.encode()).decode()
+        messages.append({
+            "id": f"18d{i:013x}",
+            "threadId": f"18d{i:013x}",
+            "labelIds": ["INBOX", "UNREAD"] if i % 3 else ["INBOX"],
+            "snippet": body[:120],
+            "internalDate": str(int((START + timedelta(minutes=50 * i)).timestamp() * 1000)),
+            "payload": {
+                "mimeType": "multipart/alternative",
+                "headers": [
+                    {"name": "From", "value": f"Sender {i} <sender{i}@example.com>"},
+                    {"name": "To", "value": USER_EMAIL},
+                    {"name": "Subject", "value": sentence(6)[:-1]},
+                    {"name": "Date", "value": (START + timedelta(minutes=50 * i)).strftime("%a, %d %b %Y %H:%M:%S +0000")},
+                ],
+                "parts": [
+                    {"partId": "0", "mimeType": "text/plain", "body": {"size": len(body), "data": encode(body)}},
+                    {"partId": "1", "mimeType": "text/html", "body": {"size": len(html), "data": encode(html)}},
+                ],
+            },
+        })
+    return messages
+
+
+def mailbox():
+    # a messier inbox for benchmarks/email_prompt_size.py: reply chains, Outlook
+    # forwards, HTML-only newsletters with tracking links, nested multiparts
+    # with attachments, signatures and legal footers
+    encode = lambda text: base64.urlsafe_b64encode(text.encode()).decode()
+    text_part = lambda mime, text: {"mimeType": mime, "body": {"size": len(text), "data": encode(text)}}
+    tracking = lambda: "https://click.mailer.example.com/ls/click?upn=" + "".join(
+        rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(120))
+    paragraphs = lambda n: "\n\n".join(" ".join(sentence(14) for _ in range(3)) for _ in range(n))
+    signature = ("Best regards,\nJordan Lee\nSenior Account Manager | Example Corp\n+1 555 0100 | www.example.com\n\n"
+                 "This email and any attachments are confidential and intended solely for the named addressee. "
+                 "If you received this message in error, please notify the sender and delete it.\n"
+                 "Please consider the environment before printing this email.")
+
+    messages = []
+    for i in range(30):
+        kind = i % 5
+        new = paragraphs(1 + i % 2)
+        if kind == 0:     # reply chain, quoted three levels deep
+            history = "\n".join("> " * depth + line for depth in (1, 2, 3) for line in paragraphs(2).split("\n"))
+            body = f"{new}\n\n{signature}\n\nOn Mon, Jan 6, 2025 at 9:{i:02d} AM Sender <s{i}@example.com> wrote:\n{history}"
+            payload = {"mimeType": "multipart/alternative", "parts": [
+                text_part("text/plain", body),
+                text_part("text/html", "<div>" + body.replace("\n", "<br>") + "</div>")]}
+        elif kind == 1:   # Outlook forward chain
+            body = (f"{new}\n\nThanks,\nSam\n\n________________________________\nFrom: Alex Kim <alex@example.com>\n"
+                    f"Sent: Friday, January 3, 2025 4:12 PM\nTo: Sam\nSubject: RE: plan\n\n{paragraphs(4)}\n\n{signature}")
+            payload = text_part("text/plain", body)
+        elif kind == 2:   # HTML-only newsletter
+            items = "".join(f"<tr><td><h2>{sentence(5)}</h2><p>{sentence(30)}</p>"
+                            f"<a href=\"{tracking()}\">Read more</a><br>{tracking()}</td></tr>" for _ in range(6))
+            html = ("<html><head><style>td{font-family:Arial;color:#333} .btn{padding:8px}</style></head><body>"
+                    f"<p><a href=\"{tracking()}\">View this email in your browser</a></p><table>{items}</table>"
+                    "<p>You are receiving this email because you subscribed to our newsletter.</p>"
+                    f"<p><a href=\"{tracking()}\">Unsubscribe</a> | <a href=\"{tracking()}\">Manage preferences</a></p>"
+                    "<p>&copy; 2025 Example Corp. All rights reserved. Privacy Policy</p></body></html>")
+            payload = text_part("text/html", html)
+        elif kind == 3:   # mixed > alternative > plain/html, plus an attachment
+            body = f"{new}\n\nSee the attached report.\n\nSent from my iPhone"
+            payload = {"mimeType": "multipart/mixed", "parts": [
+                {"mimeType": "multipart/alternative", "parts": [
+                    text_part("text/plain", body),
+                    text_part("text/html", "<p>" + body.replace("\n\n", "</p><p>") + "</p>")]},
+                dict(text_part("text/csv", "date,amount\n" + "\n".join(f"2025-01-{d:02d},{d * 13.5}" for d in range(1, 29))),
+                     filename="report.csv")]}
+        else:             # HTML-only reply with a blockquoted history
+            html = (f"<div dir=\"ltr\"><p>{new}</p><p>Cheers,<br>Robin</p></div>"
+                    f"<div class=\"gmail_quote\"><div>On Fri, Jan 3, 2025 Robin wrote:</div>"
+                    f"<blockquote>{paragraphs(4)}<blockquote>{paragraphs(3)}</blockquote></blockquote></div>")
+            payload = {"mimeType": "multipart/alternative", "parts": [text_part("text/html", html)]}
+
+        payload["headers"] = [
+            {"name": "From", "value": f"Sender {i} <sender{i}@example.com>"},
+            {"name": "To", "value": USER_EMAIL},
+            {"name": "Subject", "value": sentence(6)[:-1]},
+        ]
+        messages.append({"id": f"19d{i:013x}", "threadId": f"19d{i:013x}", "labelIds": ["INBOX"], "payload": payload})
+    return messages
+
+
+def notifications():
+    # a noisy inbox: CI notification and order update storms and a newsletter
+    # sent several times, mixed with ordinary mail
+    encode = lambda text: base64.urlsafe_b64encode(text.encode()).decode()
+    hexid = lambda n: "".join(rng.choice("0123456789abcdef") for _ in range(n))
+    mails = []
+    for _ in range(25):
+        build, commit = rng.randint(1000, 9999), hexid(7)
+        mails.append((f"ci@builds.example.com", f"[smart-ai-plan] Build #{build} failed on main",
+                      f"Build #{build} of smart-ai-plan failed on branch main.\n\nCommit {commit} by Dev "
+                      f"{rng.randint(1, 5)}: {sentence(6)}\n\nFailed step: test (exit code 1). "
+                      f"Duration {rng.randint(2, 19)}m {rng.randint(0, 59)}s.\n\nView the logs: "
+                      f"https://ci.example.com/builds/{build}/logs\n\nYou are receiving this because you "
+                      "are subscribed to build notifications for this repository."))
+    for _ in range(15):
+        order = f"{rng.randint(100, 999)}-{rng.randint(1000000, 9999999)}"
+        mails.append(("orders@shop.example.com", f"Your order {order} has shipped",
+                      f"Hello,\n\nGood news: your order {order} has shipped and is on its way. "
+                      f"Estimated delivery: January {rng.randint(7, 20)}.\n\nTracking number "
+                      f"{rng.randint(10 ** 11, 10 ** 12)} with Example Courier. You can follow your "
+                      "package from the order page.\n\nThank you for shopping with us."))
+    newsletter = "\n\n".join(" ".join(sentence(14) for _ in range(3)) for _ in range(4))
+    for _ in range(5):
+        mails.append(("news@weekly.example.com", "This week in product", newsletter))
+    for i in range(15):
+        mails.append((f"person{i}@example.com", sentence(6)[:-1],
+                       "\n\n".join(" ".join(sentence(14) for _ in range(3)) for _ in range(2))))
+    rng.shuffle(mails)
+
+    return [{
+        "id": f"1ad{i:013x}", "threadId": f"1ad{i:013x}", "labelIds": ["INBOX"],
+        "payload": {"mimeType": "text/plain", "body": {"size": len(body), "data": encode(body)},
+                    "headers": [{"name": "From", "value": sender}, {"name": "To", "value": USER_EMAIL},
+                                {"name": "Subject", "value": subject}]},
+    } for i, (sender, subject, body) in enumerate(mails)]
+
+
+def gemini():
+    advice = ("Decision: Buy\nReason 1: Price rose steadily over the last month.\n"
+              "Reason 2: Recent sessions show higher lows.\nReason 3: Volume supports the uptrend.")
+    batch = {symbol: {"decision": decision, "reasons": ["30-day move fits the rule.", "Trend is consistent.", "Volume confirms it."]}
+             for symbol, decision in zip(["AAPL", "MSFT", "GOOG", "AMZN", "NVDA", "TSLA", "bitcoin", "ethereum",
+                                          "binancecoin", "ripple", "solana", "dogecoin"],
+                                         ["Buy", "Hold", "Sell", "Strong Buy", "Hold", "Strong Sell"] * 2)}
+    return {"responses": [
+        {"contains": "Return a JSON object with one key per symbol", "text": json.dumps(batch)},
+        {"contains": "financial assistant", "text": advice},
+        {"contains": "crypto investment assistant", "text": advice},
+        {"contains": "daily-planner assistant", "text": "Today's Weather Tips for Bengaluru\n- Carry water.\n- Light clothes.\n- Sunscreen midday.\n- Umbrella for evening clouds."},
+        {"contains": "Summarize the following emails", "text": "\n".join(f"- {sentence(12)}" for _ in range(8))},
+        {"contains": "horoscope", "text": " ".join(sentence(12) for _ in range(4))},
+    ]}
+
+
+def supabase():
+    expenses = []
+    for i in range(120):
+        expenses.append({
+            "id": i + 1,
+            "User_Id": USER_EMAIL,
+            "Date": (START + timedelta(days=i // 4)).strftime("%Y-%m-%d"),
+            "Category": rng.choice(["Food", "Travel", "Bills", "Shopping", "Health", "Other"]),
+            "Expenses": round(rng.uniform(50, 2500), 2),
+        })
+    client_secret = {"installed": {"client_id": "bench.apps.googleusercontent.com", "client_secret": "bench",
+                                   "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                                   "token_uri": "https://oauth2.googleapis.com/token",
+                                   "redirect_uris": ["http://localhost"]}}
+    user = {
+        "email": USER_EMAIL,
+        "password": hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest(),
+        "google_gemini_api_key": "bench-gemini-key",
+        "weather_api": "bench-weather-key",
+        "tmdb_api": "bench-tmdb-key",
+        "news_api": "bench-news-key",
+        "google_map_api": "bench-maps-key",
+        "zodiac_sign": "leo",
+        "client_secret_json": json.dumps(client_secret),
+        # token blobs of the size stored for real users
+        "google_gmail_token": json.dumps({
+            "token": "ya29." + "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(220)),
+            "refresh_token": "1//0g" + "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(100)),
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "client_id": "bench.apps.googleusercontent.com",
+            "client_secret": "bench",
+            "scopes": ["https://www.googleapis.com/auth/gmail.readonly", "https://www.googleapis.com/auth/gmail.send"],
+            "expiry": "2099-01-01T00:00:00Z",
+        }),
+        "google_calendar_token": None,
+    }
+    return {"users": [user], "Expense_of_Users": expenses}
+
+
+def main():
+    write("coingecko_market_chart.json", coingecko())
+    write("yfinance_history.json", yfinance())
+    genres, discover = tmdb()
+    write("tmdb_genres.json", genres)
+    write("tmdb_discover.json", discover)
+    write("mediastack_news.json", mediastack())
+    weather, location = openweathermap()
+    write("openweathermap_weather.json", weather)
+    write("ip_api_location.json", location)
+    geolocation, nearby = places()
+    write("google_geolocation.json", geolocation)
+    write("google_places_nearby.json", nearby)
+    write("gmail_messages.json", gmail())
+    write("gemini_responses.json", gemini())
+    write("supabase_tables.json", supabase())
+    write("coingecko_markets.json", coingecko_markets())
+    write("gmail_mailbox.json", mailbox())
+    write("gmail_notifications.json", notifications())
+
+
+if __name__ == "__main__":
+    main()
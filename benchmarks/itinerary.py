@@ -0,0 +1,75 @@
+"""Itinerary planning time for growing numbers of places.
+
+Scatters places around a city centre (seeded, so runs are comparable) and
+times plan_itinerary: the vectorized distance matrix, nearest-neighbour
+ordering and 2-opt under ITINERARY_TIME_BUDGET. For reference it also times
+the distance matrix built pair by pair with the scalar haversine the travel
+page used for single distances, and reports how much 2-opt shortened the
+nearest-neighbour route. The planner has to stay interactive, so the target
+is under 100 ms for a few hundred places.
+
+    python benchmarks/itinerary.py --sizes 50 100 200 300 500
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CENTRE = (22.5726, 88.3639)
+SPREAD_DEGREES = 0.03            # roughly a 3 km radius
+
+
+def scatter(n, seed):
+    rng = np.random.default_rng(seed)
+    points = rng.normal(0, SPREAD_DEGREES / 2, (n, 2)) + CENTRE
+    return [{"name": f"Place {i}", "lat": float(lat), "lon": float(lon)} for i, (lat, lon) in enumerate(points)]
+
+
+def scalar_matrix(points):
+    from backend_travel_planner import haversine
+    return [[haversine(a["lat"], a["lon"], b["lat"], b["lon"]) for b in points] for a in points]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200, 300, 500])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    import backend_travel_planner as planner
+    start = {"lat": CENTRE[0], "lon": CENTRE[1]}
+    planner.plan_itinerary(start, scatter(10, 0))    # warm numpy up
+
+    print(f"2-opt time budget {planner.ITINERARY_TIME_BUDGET * 1000:.0f} ms")
+    print(f"{'places':>7}{'matrix ms':>11}{'scalar ms':>11}{'plan ms':>10}{'p95 ms':>9}{'passes':>8}{'shorter':>11}")
+    for n in args.sizes:
+        places = scatter(n, n)
+        points = [start] + places
+
+        t = time.perf_counter()
+        planner.distance_matrix([p["lat"] for p in points], [p["lon"] for p in points])
+        matrix_ms = (time.perf_counter() - t) * 1000
+
+        t = time.perf_counter()
+        scalar_matrix(points)
+        scalar_ms = (time.perf_counter() - t) * 1000
+
+        timings = []
+        for _ in range(args.rounds):
+            t = time.perf_counter()
+            result = planner.plan_itinerary(start, places)
+            timings.append((time.perf_counter() - t) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        shorter = 1 - result["total_distance"] / result["greedy_distance"]
+
+        print(f"{n:>7}{matrix_ms:>11.2f}{scalar_ms:>11.1f}{timings[len(timings) // 2]:>10.1f}{p95:>9.1f}"
+              f"{result['two_opt_passes']:>8}{shorter * 100:>10.1f}%")
+
+
+if __name__ == "__main__":
+    main()
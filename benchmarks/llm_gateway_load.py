@@ -0,0 +1,86 @@
+"""Load test for the LLM gateway against the local fake LLM.
+
+Fires ``--requests`` calls from ``--threads`` worker threads, spread over
+``--keys`` API keys and ``--prompts`` distinct prompts (so identical prompts
+overlap and get coalesced). The fake answers after ``--latency`` seconds and
+fails a ``--fail-rate`` fraction of calls with a 429, to exercise backoff.
+
+    python benchmarks/llm_gateway_load.py --requests 300 --threads 64 --keys 4
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--prompts", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=600, help="requests per minute per key")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "LLM_FAKE": "1",
+        "LLM_FAKE_LATENCY": str(args.latency),
+        "LLM_FAKE_429_RATE": str(args.fail_rate),
+        "LLM_MAX_CONCURRENCY": str(args.concurrency),
+        "LLM_RATE_PER_MINUTE": str(args.rate),
+        "LLM_MAX_WAIT": "120",
+    })
+    import backend_llm
+    backend_llm.LLM_BACKOFF_BASE = 0.2
+
+    in_flight = peak = calls = 0
+    original_call = backend_llm._call
+
+    def counting_call(*a, **kw):
+        nonlocal in_flight, peak, calls
+        calls += 1
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return original_call(*a, **kw)
+        finally:
+            in_flight -= 1
+
+    backend_llm._call = counting_call
+
+    def one(i):
+        prompt = f"prompt {i % args.prompts}"
+        key = f"key-{i % args.keys}"
+        try:
+            backend_llm.generate(prompt, key, caller="load")
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        ok = sum(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    stats = backend_llm.llm_stats()["load"]
+    print(f"{args.requests} requests, {args.threads} threads, {args.keys} keys, {args.prompts} prompts")
+    print(f"  ok                {ok:>8}")
+    print(f"  wall (s)          {elapsed:>8.2f}")
+    print(f"  throughput (rps)  {args.requests / elapsed:>8.1f}")
+    print(f"  upstream calls    {calls:>8}")
+    print(f"  coalesced         {stats['coalesced']:>8}")
+    print(f"  429 retries       {stats['retries']:>8}")
+    print(f"  errors            {stats['errors']:>8}")
+    print(f"  peak concurrency  {peak:>8}  (cap {args.concurrency})")
+    print(f"  p50 / p95 (ms)    {stats['p50_ms']:>8} / {stats['p95_ms']}")
+    print(f"  tokens in / out   {stats['prompt_tokens']:>8} / {stats['output_tokens']}")
+
+
+if __name__ == "__main__":
+    main()
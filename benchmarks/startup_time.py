@@ -0,0 +1,104 @@
+"""Cold-start regression benchmark for app.py.
+
+Imports the app in fresh interpreters, reports the median wall time and the
+heaviest imports (from ``-X importtime``), and compares against the stored
+baseline in benchmarks/startup_baseline.json.
+
+    python benchmarks/startup_time.py            # compare, exit 1 on regression
+    python benchmarks/startup_time.py --update   # record a new baseline
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "startup_baseline.json")
+
+MEASURE = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+
+def child_env():
+    env = dict(os.environ)
+    # the Supabase client is created lazily, so dummy values are enough
+    env.setdefault("SUPABASE_URL", "http://127.0.0.1:1")
+    env.setdefault("SUPABASE_KEY", "benchmark")
+    env["PYTHONDONTWRITEBYTECODE"] = "0"
+    env.pop("STARTUP_TIMING", None)
+    return env
+
+
+def measure(runs):
+    env = child_env()
+    # warm the bytecode cache so every run measures the same thing
+    subprocess.run([sys.executable, "-W", "ignore", "-c", "import app"], cwd=ROOT, env=env, check=True)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", MEASURE],
+            cwd=ROOT, env=env, check=True, capture_output=True, text=True
+        )
+        samples.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    return samples
+
+
+def heaviest_imports(limit):
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=child_env(), check=True, capture_output=True, text=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2][1:].rstrip()
+        # direct imports of app.py only (two-space indent in importtime output)
+        if name.startswith("  ") and not name.startswith("   "):
+            rows.append((name.strip(), cumulative / 1000))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed slowdown over the baseline median (fraction)")
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args()
+
+    samples = measure(args.runs)
+    median = statistics.median(samples)
+    print(f"import app: median {median:.1f} ms, min {min(samples):.1f} ms, max {max(samples):.1f} ms ({args.runs} runs)")
+    print("heaviest direct imports:")
+    for name, ms in heaviest_imports(10):
+        print(f"  {name:<28}{ms:>8.1f} ms")
+
+    if args.update:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump({"median_ms": round(median, 1), "python": sys.version.split()[0]}, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {BASELINE_FILE}")
+        return
+
+    if not os.path.exists(BASELINE_FILE):
+        print("no baseline recorded; run with --update")
+        return
+
+    with open(BASELINE_FILE) as f:
+        baseline = json.load(f)["median_ms"]
+    limit = baseline * (1 + args.tolerance)
+    print(f"baseline {baseline:.1f} ms, limit {limit:.1f} ms")
+    if median > limit:
+        print("startup time regression")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Local stand-ins for the app's upstream APIs, replaying benchmarks/fixtures.
+
+One threaded HTTP server answers for every upstream under its own path prefix
+(``/coingecko``, ``/gmail``, ``/supabase``, ...), sleeping the configured
+latency for that upstream before each response. ``StubServer.urls`` gives
+the base URL to point each backend at.
+"""
+import os
+import json
+import time
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+UPSTREAMS = ("coingecko", "openweathermap", "ip_api", "tmdb", "mediastack",
+             "places", "gmail", "supabase", "yfinance", "gemini")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        # bytes are sent as an image (place photos), a (content type, bytes)
+        # pair as given (Gmail batches), anything else as JSON
+        if isinstance(payload, tuple):
+            content_type, body = payload
+        elif isinstance(payload, bytes):
+            content_type, body = "image/jpeg", payload
+        else:
+            content_type, body = "application/json", json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        upstream, _, rest = url.path.lstrip("/").partition("/")
+        server = self.server.stub
+        if upstream not in server.latency:
+            return self._send(404, {"error": f"unknown upstream {upstream}"})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        time.sleep(server.latency[upstream])
+        with server.lock:
+            server.hits[upstream] = server.hits.get(upstream, 0) + 1
+        status, payload = getattr(server, f"_{upstream}")(method, "/" + rest, parse_qs(url.query), body)
+        self._send(status, payload)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class StubServer:
+    def __init__(self, latency=0.05, overrides=None, host="127.0.0.1", port=0):
+        self.latency = {name: latency for name in UPSTREAMS}
+        self.latency.update(overrides or {})
+        self.hits = {}
+        self.lock = threading.Lock()
+
+        self.market_chart = load_fixture("coingecko_market_chart.json")
+        self.markets = {coin["id"]: coin for coin in load_fixture("coingecko_markets.json")}
+        self.weather = load_fixture("openweathermap_weather.json")
+        self.location = load_fixture("ip_api_location.json")
+        self.genres = load_fixture("tmdb_genres.json")
+        self.discover = load_fixture("tmdb_discover.json")
+        self.news = load_fixture("mediastack_news.json")
+        self.geolocation = load_fixture("google_geolocation.json")
+        self.nearby = load_fixture("google_places_nearby.json")
+        self.photos = {}
+        self.messages = {m["id"]: m for m in load_fixture("gmail_messages.json")}
+        self.tables = load_fixture("supabase_tables.json")
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.base = f"http://{host}:{self.httpd.server_address[1]}"
+
+    @property
+    def urls(self):
+        return {name: f"{self.base}/{name}" for name in UPSTREAMS}
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+    def reset_hits(self):
+        with self.lock:
+            self.hits = {}
+
+    # ---------------- upstreams ----------------
+    def _coingecko(self, method, path, query, body):
+        ids = query.get("ids", [""])[0].split(",")
+        if path.startswith("/coins/markets"):
+            return 200, [self.markets[i] for i in ids if i in self.markets]
+        if path.startswith("/simple/price"):
+            return 200, {i: {"usd": self.markets[i]["current_price"],
+                             "usd_24h_change": self.markets[i]["price_change_percentage_24h_in_currency"]}
+                         for i in ids if i in self.markets}
+        # the recorded chart is replayed as if its last point were now
+        shift = int(time.time() * 1000) - self.market_chart["prices"][-1][0]
+        chart = {k: [[ts + shift, v] for ts, v in points] for k, points in self.market_chart.items()}
+        if path.endswith("/range"):
+            since = int(query["from"][0]) * 1000
+            chart = {k: [p for p in points if p[0] >= since] for k, points in chart.items()}
+        return 200, chart
+
+    def _openweathermap(self, method, path, query, body):
+        return 200, self.weather
+
+    def _ip_api(self, method, path, query, body):
+        return 200, self.location
+
+    def _tmdb(self, method, path, query, body):
+        if path.startswith("/genre"):
+            return 200, self.genres
+        return 200, self.discover
+
+    def _mediastack(self, method, path, query, body):
+        return 200, self.news
+
+    def _places(self, method, path, query, body):
+        if path.startswith("/geolocation"):
+            return 200, self.geolocation
+        if path.startswith("/maps/api/place/photo"):
+            return 200, self.photo(int(query.get("maxwidth", ["1600"])[0]))
+        return 200, self.nearby
+
+    def photo(self, width):
+        # a JPEG at most `width` wide (Google's limit is 1600), made on first use
+        width = min(width, 1600)
+        if width not in self.photos:
+            import io
+            from PIL import Image
+            image = Image.radial_gradient("L").resize((width, width * 2 // 3)).convert("RGB")
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=90)
+            self.photos[width] = out.getvalue()
+        return self.photos[width]
+
+    def _gmail(self, method, path, query, body):
+        # /gmail/v1/users/me/messages[/<id>|/send], and /batch/gmail/v1
+        parts = path.strip("/").split("/")
+        if parts[0] == "batch":
+            return 200, self._gmail_batch(body)
+        if parts[-1] == "send":
+            return 200, {"id": "18dffffffffffff", "threadId": "18dffffffffffff", "labelIds": ["SENT"]}
+        if parts[-1] == "messages":
+            ids = [{"id": i, "threadId": i} for i in self.messages]
+            start = int(query.get("pageToken", ["0"])[0])
+            page = ids[start:start + int(query.get("maxResults", ["100"])[0])]
+            listing = {"messages": page, "resultSizeEstimate": len(ids)}
+            if start + len(page) < len(ids):
+                listing["nextPageToken"] = str(start + len(page))
+            return 200, listing
+        message = self.messages.get(parts[-1])
+        if message is None:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        if query.get("format") == ["metadata"]:
+            headers = [h for h in message["payload"].get("headers", []) if h["name"] in query.get("metadataHeaders", [])]
+            message = {k: v for k, v in message.items() if k != "payload"}
+            message["payload"] = {"mimeType": "multipart/alternative", "headers": headers}
+        return 200, message
+
+    def _supabase(self, method, path, query, body):
+        # a PostgREST subset: /rest/v1/<table>?select=a,b&col=eq.value
+        table = path.rstrip("/").rsplit("/", 1)[-1]
+        rows = self.tables.get(table, [])
+        for column, values in query.items():
+            if column in ("select", "order", "limit", "offset"):
+                continue
+            op, _, value = values[0].partition(".")
+            if op == "eq":
+                rows = [r for r in rows if str(r.get(column)) == value]
+            elif op == "gte":
+                rows = [r for r in rows if str(r.get(column)) >= value]
+            elif op == "lte":
+                rows = [r for r in rows if str(r.get(column)) <= value]
+            elif op == "in":
+                allowed = value.strip("()").split(",")
+                rows = [r for r in rows if str(r.get(column)) in allowed]
+
+        if method != "GET":
+            # writes are acknowledged but not applied, so runs stay repeatable
+            return 200, rows if method == "PATCH" else []
+
+        if "limit" in query:
+            rows = rows[:int(query["limit"][0])]
+
+        select = query.get("select", ["*"])[0]
+        if select != "*":
+            columns = [c.strip() for c in select.split(",")]
+            rows = [{c: r.get(c) for c in columns} for r in rows]
+        return 200, rows
+
+    def _gmail_batch(self, body):
+        # a multipart/mixed batch of GET requests, answered part by part
+        text = body.decode()
+        delimiter = text.split("\n", 1)[0].strip()
+        boundary = "batch_response"
+        out = []
+        for part in text.split(delimiter)[1:]:
+            if part.startswith("--"):
+                break
+            head, _, request = part.replace("\r\n", "\n").strip("\n").partition("\n\n")
+            content_id = next(line.split(":", 1)[1].strip() for line in head.split("\n")
+                              if line.lower().startswith("content-id"))
+            url = urlparse(request.split("\n", 1)[0].split(" ")[1])
+            status, payload = self._gmail("GET", url.path, parse_qs(url.query), b"")
+            out.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                       f"Content-ID: <response-{content_id.strip('<>')}>\r\n\r\n"
+                       f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n")
+        out.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(out).encode()
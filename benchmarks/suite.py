@@ -0,0 +1,326 @@
+"""End-to-end benchmark suite replaying recorded upstream fixtures.
+
+Boots the Flask app against benchmarks/stubs.py (Supabase, Gmail, CoinGecko,
+OpenWeatherMap, ip-api, TMDB, Mediastack, Places) with a fixed latency per
+upstream. yfinance and Gemini have no configurable endpoint, so they are
+replayed in-process with the same latency: a stand-in ``yfinance`` module
+serving the recorded history, and the LLM gateway's fake mode serving
+recorded answers. Every other line of the request path runs for real.
+
+For each scenario it reports sequential latency (p50/p95/mean), throughput
+at ``--concurrency`` and the peak Python heap used by one request, then
+writes everything to benchmarks/results/<commit>.json.
+
+    python benchmarks/suite.py                         # all scenarios
+    python benchmarks/suite.py -s crypto -s emails --latency 0.1 --set gemini=0.6
+    python benchmarks/suite.py --compare 4fabb07       # diff against a stored run
+"""
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import tempfile
+import logging
+import platform
+import argparse
+import threading
+import subprocess
+import tracemalloc
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from stubs import FIXTURES, StubServer, load_fixture
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PRICE_STORE_DIR = tempfile.mkdtemp(prefix="bench_prices_")
+EMAIL_INDEX_DIR = tempfile.mkdtemp(prefix="bench_email_index_")
+PHOTO_CACHE_DIR = tempfile.mkdtemp(prefix="bench_photos_")
+USER_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "benchmark"
+
+# name -> (method, path, json body)
+SCENARIOS = {
+    "crypto": ("POST", "/api/crypto", {"symbol": "BTC"}),
+    "stocks": ("POST", "/api/stocks", {"symbol": "AAPL"}),
+    "stocks_batch": ("POST", "/api/stocks/batch", {"symbols": ["AAPL", "MSFT", "GOOG", "AMZN", "NVDA", "TSLA"]}),
+    "crypto_batch": ("POST", "/api/crypto/batch", {"symbols": ["BTC", "ETH", "BNB", "XRP", "SOL", "DOGE"]}),
+    "weather": ("GET", "/weather", None),
+    "horoscope": ("GET", "/horoscope", None),
+    "movies": ("POST", "/api/movies", {"genre": [28], "year": 2024, "language": "en", "num_movies": 10}),
+    "news": ("GET", "/news", None),
+    "emails": ("GET", "/api/summarize_emails", None),
+    "email_list": ("GET", "/api/emails", None),
+    "travel": ("GET", "/travel?place_types=restaurant&place_types=cafe", None),
+    "travel_photo": ("GET", "/travel/photo/358dc26ec8b649867d5bf794efd20145524da18e7b658d01fa445a6e3a848f01?w=400", None),
+    "expense_report": ("POST", "/generate_expense_report", {"from_date": "2025-01-06", "end_date": "2025-02-05"}),
+}
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=ROOT, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def install_fake_yfinance(latency):
+    import pandas as pd
+    rows = load_fixture("yfinance_history.json")
+
+    # the recorded trading days are replayed as the ones ending today
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=len(rows), tz="America/New_York")
+
+    class Ticker:
+        def __init__(self, symbol):
+            self.symbol = symbol
+
+        def history(self, period="30d", start=None, **kwargs):
+            time.sleep(latency)
+            df = pd.DataFrame(rows).drop(columns="Date").set_index(dates.rename("Date"))
+            if start is not None:
+                df = df[df.index >= pd.Timestamp(start).tz_localize(dates.tz)]
+            return df
+
+    def download(tickers, period="30d", **kwargs):
+        # one sleep for the whole batch, like the single HTTP round trip it replaces
+        time.sleep(latency)
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        frames = {}
+        for n, symbol in enumerate(tickers):
+            df = pd.DataFrame(rows).set_index(dates)
+            frames[symbol] = df[["Open", "High", "Low", "Close", "Volume"]] * (1 + n * 0.1)
+        return pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+    module = types.ModuleType("yfinance")
+    module.Ticker = Ticker
+    module.download = download
+    sys.modules["yfinance"] = module
+
+
+def gmail_service_factory(endpoint):
+    import httplib2
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.http import HttpRequest
+    from backend_google import discovery_document
+
+    def build_request(http, *args, **kwargs):
+        return HttpRequest(httplib2.Http(), *args, **kwargs)
+
+    # rootUrl is where batch requests go; api_endpoint only moves single calls
+    document = dict(discovery_document("gmail", "v1"), rootUrl=endpoint + "/")
+    service = build_from_document(
+        document, http=httplib2.Http(),
+        requestBuilder=build_request, client_options={"api_endpoint": endpoint + "/"}
+    )
+    return lambda *args, **kwargs: service
+
+
+def boot_app(stub, args):
+    urls = stub.urls
+    os.environ.update({
+        "SUPABASE_URL": urls["supabase"],
+        "SUPABASE_KEY": "bench-anon-key",
+        "LLM_FAKE": "1",
+        "LLM_FAKE_LATENCY": str(stub.latency["gemini"]),
+        "LLM_FAKE_FIXTURE": os.path.join(FIXTURES, "gemini_responses.json"),
+        "LLM_RATE_PER_MINUTE": "1000000",
+        "LLM_BURST": "1000000",
+        "LLM_MAX_CONCURRENCY": str(max(8, args.concurrency)),
+        "PRICE_STORE_DIR": PRICE_STORE_DIR,
+        "EMAIL_INDEX_DIR": EMAIL_INDEX_DIR,
+        "PHOTO_CACHE_DIR": PHOTO_CACHE_DIR,
+    })
+    os.environ.pop("EMAIL_USER", None)
+    install_fake_yfinance(stub.latency["yfinance"])
+
+    import app
+    import backend_crypto
+    import backend_email
+    import backend_movies
+    import backend_news
+    import backend_travel_planner
+    import backend_weather
+    import place_photos
+
+    backend_crypto.BASE_URL = urls["coingecko"]
+    backend_weather.BASE_URL = urls["openweathermap"]
+    backend_weather.LOCATION_URL = urls["ip_api"] + "/json"
+    backend_movies.BASE_URL = urls["tmdb"]
+    backend_news.BASE_URL = urls["mediastack"] + "/v1/news"
+    backend_travel_planner.GEOLOCATION_URL = urls["places"] + "/geolocation/v1/geolocate"
+    backend_travel_planner.PLACES_URL = urls["places"] + "/maps/api/place/nearbysearch/json"
+    place_photos.PHOTO_URL = urls["places"] + "/maps/api/place/photo"
+    backend_email.get_gmail_service = gmail_service_factory(urls["gmail"])
+
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def clear_app_caches():
+    import backend_email
+    import backend_news
+    import backend_prices
+    import backend_stream
+    with backend_prices._series_lock:
+        backend_prices._series.clear()
+    shutil.rmtree(PRICE_STORE_DIR, ignore_errors=True)
+    with backend_stream._results_lock:
+        backend_stream._results.clear()
+    with backend_news._cache_lock:
+        backend_news._news_cache.clear()
+    with backend_email._body_lock:
+        backend_email._body_cache.clear()
+
+
+def login(base):
+    session = requests.Session()
+    resp = session.post(f"{base}/login", data={"email": USER_EMAIL, "password": BENCH_PASSWORD},
+                        allow_redirects=False)
+    if "session" not in session.cookies:
+        raise SystemExit(f"login against the stubbed Supabase failed ({resp.status_code})")
+    return session
+
+
+def call(session, base, scenario):
+    method, path, body = SCENARIOS[scenario]
+    start = time.perf_counter()
+    resp = session.request(method, base + path, json=body, allow_redirects=False)
+    elapsed = time.perf_counter() - start
+    ok = resp.status_code == 200
+    if ok and resp.headers.get("Content-Type", "").startswith("application/json"):
+        data = resp.json()
+        ok = not (isinstance(data, dict) and (data.get("error") or data.get("success") is False))
+    return elapsed, ok
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_scenario(name, base, cookies, args):
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            local.session.cookies.update(cookies)
+        return local.session
+
+    def one(_):
+        if args.cold:
+            clear_app_caches()
+        return call(session(), base, name)
+
+    one(None)  # warm-up: first-use imports and connection setup
+
+    sequential = [one(i) for i in range(args.requests)]
+    latencies = [elapsed for elapsed, _ in sequential]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        concurrent = list(pool.map(one, range(args.requests * 2)))
+    wall = time.perf_counter() - start
+
+    tracemalloc.start()
+    one(None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    errors = sum(1 for _, ok in sequential + concurrent if not ok)
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1),
+        "throughput_rps": round(len(concurrent) / wall, 1),
+        "peak_heap_kb": round(peak / 1024, 1),
+        "errors": errors,
+    }
+
+
+def print_table(results, baseline=None):
+    header = f"{'scenario':<16}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'rps':>8}{'heap KB':>10}{'err':>5}"
+    print(header)
+    for name, r in results.items():
+        print(f"{name:<16}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['mean_ms']:>9}{r['throughput_rps']:>8}"
+              f"{r['peak_heap_kb']:>10}{r['errors']:>5}")
+        old = (baseline or {}).get(name)
+        if old:
+            delta = lambda key: f"{(r[key] - old[key]) / old[key] * 100:+.0f}%" if old[key] else "n/a"
+            print(f"{'  vs baseline':<16}{delta('p50_ms'):>9}{delta('p95_ms'):>9}{delta('mean_ms'):>9}"
+                  f"{delta('throughput_rps'):>8}{delta('peak_heap_kb'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="run only these scenarios (repeatable)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added by every upstream")
+    parser.add_argument("--set", action="append", default=[], metavar="UPSTREAM=SECONDS",
+                        help="per-upstream latency override, e.g. gemini=0.8")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cold", action="store_true", help="clear the app's result caches before every request")
+    parser.add_argument("--compare", metavar="COMMIT", help="print deltas against benchmarks/results/COMMIT.json")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    overrides = {}
+    for item in args.set:
+        upstream, _, seconds = item.partition("=")
+        overrides[upstream] = float(seconds)
+
+    stub = StubServer(args.latency, overrides).start()
+    server, base = boot_app(stub, args)
+    cookies = login(base).cookies
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = run_scenario(name, base, cookies, args)
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(RESULTS_DIR, f"{args.compare}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+    print_table(results, baseline)
+
+    commit, dirty = git_revision()
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = f"{commit}-dirty" if dirty else commit
+        path = os.path.join(RESULTS_DIR, f"{name}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": commit,
+                "dirty": dirty,
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "settings": {"latency": stub.latency, "requests": args.requests,
+                             "concurrency": args.concurrency, "cold": args.cold},
+                "scenarios": results,
+                "upstream_hits": stub.hits,
+            }, f, indent=2)
+        print(f"saved {os.path.relpath(path, ROOT)}")
+
+    server.shutdown()
+    stub.stop()
+    shutil.rmtree(PRICE_STORE_DIR, ignore_errors=True)
+    shutil.rmtree(EMAIL_INDEX_DIR, ignore_errors=True)
+    shutil.rmtree(PHOTO_CACHE_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+
+import requests
+
+import instrumentation
+
+# Per-upstream circuit breakers for the REST APIs called from backend_*.
+# get()/post()/get_async() stand in for requests.get/post and the async
+# client's get. Every call records an outcome in its upstream's breaker; a
+# failure is an exception, a 5xx response, a 429 from an upstream whose quota
+# is shared by everyone, or a call slower than BREAKER_SLOW_SECONDS. Once at least BREAKER_MIN_CALLS of the last
+# BREAKER_WINDOW calls were recorded and BREAKER_FAILURE_RATE of them failed,
+# the breaker opens: calls are not attempted for BREAKER_OPEN_SECONDS, after
+# which a single probe is let through (half-open) and its outcome closes or
+# re-opens the breaker.
+#
+# While a call is refused or fails, the last good response for the same
+# request is returned instead, if there is one; otherwise CircuitOpenError
+# (or the original error) is raised, which the callers already turn into
+# their usual error result, just without waiting out the timeout. Calls made
+# with last_good=False (URLs that differ on every call) are never kept.
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "5"))
+LAST_GOOD_MAX = 500
+# upstreams whose responses are not kept as last good (large, cached elsewhere)
+NO_LAST_GOOD = {"google_place_photos"}
+# upstreams called with each user's own key: a 429 there is that key's quota
+# running out, not the upstream failing, so it must not open the breaker for
+# every other user
+PER_KEY_QUOTA = {"mediastack", "openweathermap", "tmdb", "google_places", "google_place_photos"}
+
+instrumentation.HELP.update({
+    "circuit_breaker_trips_total": "Times an upstream's circuit breaker opened.",
+    "circuit_breaker_rejected_total": "Calls not attempted because the breaker was open.",
+    "circuit_breaker_fallbacks_total": "Calls answered with the last good response.",
+})
+
+class CircuitOpenError(Exception):
+    pass
+
+class Breaker:
+    def __init__(self, name):
+        self.name = name
+        self.state = "closed"
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+        self.rejected = 0
+        self.fallbacks = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open" and time.time() - self.opened_at >= BREAKER_OPEN_SECONDS:
+                self.state = "half_open"
+                self.probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            self.rejected += 1
+        instrumentation.inc("circuit_breaker_rejected_total", upstream=self.name)
+        return False
+
+    def record(self, ok):
+        with self.lock:
+            if self.state == "half_open":
+                self.probing = False
+                if ok:
+                    self.state = "closed"
+                    self.outcomes.clear()
+                else:
+                    self._trip()
+                return
+            if self.state == "open":
+                # a call that started before the breaker opened
+                return
+            self.outcomes.append(ok)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= BREAKER_MIN_CALLS and failures / len(self.outcomes) >= BREAKER_FAILURE_RATE:
+                self._trip()
+
+    def _trip(self):
+        self.state = "open"
+        self.opened_at = time.time()
+        self.trips += 1
+        instrumentation.inc("circuit_breaker_trips_total", upstream=self.name)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "failure_rate": round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0,
+                "recent_calls": len(self.outcomes),
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "fallbacks": self.fallbacks,
+                "retry_in": round(max(0, self.opened_at + BREAKER_OPEN_SECONDS - time.time()), 1)
+                            if self.state == "open" else None,
+            }
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+# request key -> last good response
+_last_good = OrderedDict()
+_last_good_lock = threading.Lock()
+
+def breaker(upstream):
+    with _breakers_lock:
+        b = _breakers.get(upstream)
+        if b is None:
+            b = _breakers[upstream] = Breaker(upstream)
+    return b
+
+def breaker_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.stats() for b in breakers}
+
+# ---------------- Calls ----------------
+def _key(upstream, method, url, params):
+    if isinstance(params, dict):
+        params = tuple(sorted((k, str(v)) for k, v in params.items()))
+    return (upstream, method, url, params)
+
+def _remember(key, response):
+    with _last_good_lock:
+        _last_good[key] = response
+        _last_good.move_to_end(key)
+        while len(_last_good) > LAST_GOOD_MAX:
+            _last_good.popitem(last=False)
+
+def _fallback(b, key):
+    with _last_good_lock:
+        response = _last_good.get(key)
+    if response is not None:
+        with b.lock:
+            b.fallbacks += 1
+        instrumentation.inc("circuit_breaker_fallbacks_total", upstream=b.name)
+    return response
+
+def _refuse(b, key):
+    response = _fallback(b, key)
+    if response is None:
+        raise CircuitOpenError(f"{b.name} is unavailable (circuit open)")
+    return response
+
+def _failed(response):
+    return response.status_code >= 500 or response.status_code == 429
+
+def _settle(b, key, response, elapsed, last_good):
+    failed = _failed(response)
+    unhealthy = failed and not (response.status_code == 429 and b.name in PER_KEY_QUOTA)
+    b.record(not unhealthy and elapsed < BREAKER_SLOW_SECONDS)
+    if failed:
+        fallback = _fallback(b, key)
+        return response if fallback is None else fallback
+    if response.status_code == 200 and last_good and b.name not in NO_LAST_GOOD:
+        _remember(key, response)
+    return response
+
+def request(upstream, method, url, params=None, last_good=True, **kwargs):
+    b = breaker(upstream)
+    key = _key(upstream, method, url, params)
+    if not b.allow():
+        return _refuse(b, key)
+
+    start = time.perf_counter()
+    try:
+        response = requests.request(method, url, params=params, **kwargs)
+    except Exception:
+        b.record(False)
+        fallback = _fallback(b, key)
+        if fallback is None:
+            raise
+        return fallback
+    return _settle(b, key, response, time.perf_counter() - start, last_good)
+
+def get(upstream, url, params=None, **kwargs):
+    return request(upstream, "GET", url, params, **kwargs)
+
+def post(upstream, url, params=None, **kwargs):
+    return request(upstream, "POST", url, params, **kwargs)
+
+async def get_async(upstream, client, url, params=None, last_good=True, **kwargs):
+    # same as get() on an httpx.AsyncClient
+    b = breaker(upstream)
+    key = _key(upstream, "GET", url, params)
+    if not b.allow():
+        return _refuse(b, key)
+
+    start = time.perf_counter()
+    try:
+        response = await client.get(url, params=params, **kwargs)
+    except Exception:
+        b.record(False)
+        fallback = _fallback(b, key)
+        if fallback is None:
+            raise
+        return fallback
+    return _settle(b, key, response, time.perf_counter() - start, last_good)
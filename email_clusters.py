@@ -0,0 +1,76 @@
+import re
+import zlib
+
+import numpy as np
+
+# Groups near-identical emails (CI notifications, order updates, the same
+# newsletter twice) so the summary prompt carries one of each with a count.
+# Each email becomes a set of word shingles (numbers masked, so build and
+# order ids don't tell notifications apart), summarized by a MinHash
+# signature. LSH over bands of the signature puts likely duplicates in the
+# same bucket; a bucket member joins the bucket's first email when their
+# estimated similarity reaches DUPLICATE_THRESHOLD. Work is linear in the
+# number of emails: no pairwise comparison of the whole mailbox.
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+LSH_BANDS = 16                   # 16 bands of 4 rows: candidates from ~0.5 similarity
+DUPLICATE_THRESHOLD = 0.5
+MAX_SHINGLE_WORDS = 400          # the start of a long email is enough to match it
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, _PRIME, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, NUM_PERM).astype(np.uint64)
+
+def _words(email):
+    text = f"{email.get('subject', '')} {email.get('body', '')}".lower()
+    return re.sub(r"\d+", "0", text).split()[:MAX_SHINGLE_WORDS]
+
+def signature(email):
+    words = _words(email)
+    if not words:
+        return None
+    n = min(SHINGLE_WORDS, len(words))
+    shingles = {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+def similarity(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+def cluster_emails(emails):
+    # -> list of clusters (lists of emails), in order of each cluster's first email
+    signatures = [signature(e) for e in emails]
+    parent = list(range(len(emails)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = NUM_PERM // LSH_BANDS
+    buckets = {}
+    for i, sig in enumerate(signatures):
+        if sig is None:
+            continue
+        for band in range(LSH_BANDS):
+            key = (band, sig[band * rows:(band + 1) * rows].tobytes())
+            first = buckets.setdefault(key, i)
+            if first != i and root(first) != root(i) and similarity(signatures[first], sig) >= DUPLICATE_THRESHOLD:
+                parent[root(i)] = root(first)
+
+    clusters = {}
+    for i, email in enumerate(emails):
+        clusters.setdefault(root(i), []).append(email)
+    return list(clusters.values())
+
+def collapse_duplicates(emails):
+    # one representative per cluster (its first email, the newest in Gmail's
+    # order), with "similar" set to how many others it stands for
+    collapsed = []
+    for cluster in cluster_emails(emails):
+        representative = dict(cluster[0])
+        representative["similar"] = len(cluster) - 1
+        collapsed.append(representative)
+    return collapsed
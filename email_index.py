@@ -0,0 +1,139 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+
+from instrumentation import span
+
+# Local full-text index of the emails backend_email has fetched, so past
+# mail can be searched without going back to Gmail. One SQLite file per user
+# holds the messages (sender, subject, date, cleaned body) and an FTS5 index
+# over sender, subject and body. Every write evicts messages older than
+# EMAIL_INDEX_RETENTION_DAYS and, past EMAIL_INDEX_MAX_MESSAGES, the oldest
+# ones, then hands the freed pages back to the filesystem.
+EMAIL_INDEX_DIR = os.getenv("EMAIL_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".email_index"))
+EMAIL_INDEX_RETENTION_DAYS = int(os.getenv("EMAIL_INDEX_RETENTION_DAYS", "90"))
+EMAIL_INDEX_MAX_MESSAGES = int(os.getenv("EMAIL_INDEX_MAX_MESSAGES", "20000"))
+SEARCH_LIMIT = 50
+# bm25 column weights: sender, subject, body
+RANK_WEIGHTS = (2.0, 3.0, 1.0)
+
+_initialized = set()
+
+_FIELDS = {"from": "sender", "sender": "sender", "subject": "subject", "body": "body"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    sender TEXT,
+    subject TEXT,
+    date INTEGER,
+    body TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages(date);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    sender, subject, body, content='messages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, sender, subject, body) VALUES (new.rowid, new.sender, new.subject, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, sender, subject, body)
+    VALUES ('delete', old.rowid, old.sender, old.subject, old.body);
+END;
+"""
+
+def index_path(user_email):
+    name = hashlib.sha256(user_email.lower().encode()).hexdigest()[:32]
+    return os.path.join(EMAIL_INDEX_DIR, f"{name}.db")
+
+def _connect(user_email):
+    os.makedirs(EMAIL_INDEX_DIR, exist_ok=True)
+    path = index_path(user_email)
+    conn = sqlite3.connect(path, timeout=10)
+    if path not in _initialized:
+        # auto_vacuum only takes effect on a new database, before any table exists
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SCHEMA)
+        _initialized.add(path)
+    return conn
+
+def index_emails(user_email, emails, now=None):
+    # emails as returned by get_last_48h_emails; ones already indexed are skipped
+    now = now or time.time()
+    rows = [
+        (e["id"], e.get("from", ""), e.get("subject", ""), int(e.get("date") or now), e.get("body", ""))
+        for e in emails if e.get("id")
+    ]
+    with span("email_index", "index"):
+        conn = _connect(user_email)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO messages(id, sender, subject, date, body) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                evicted = _evict(conn, now)
+            if evicted:
+                # merge the FTS segments still holding the deleted rows, then
+                # release the free pages and fold the WAL back in
+                with conn:
+                    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+                conn.executescript("PRAGMA incremental_vacuum;")     # runs to completion, unlike execute()
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        finally:
+            conn.close()
+
+def _evict(conn, now):
+    cutoff = int(now - EMAIL_INDEX_RETENTION_DAYS * 86400)
+    evicted = conn.execute("DELETE FROM messages WHERE date < ?", (cutoff,)).rowcount
+    evicted += conn.execute(
+        "DELETE FROM messages WHERE rowid IN (SELECT rowid FROM messages ORDER BY date DESC LIMIT -1 OFFSET ?)",
+        (EMAIL_INDEX_MAX_MESSAGES,)
+    ).rowcount
+    return evicted
+
+def fts_query(query):
+    # user text -> an FTS5 expression: every word must match (as a prefix),
+    # "quoted phrases" match exactly and from:/subject:/body: pick a field
+    terms = []
+    for field, phrase, word in re.findall(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))', query or ""):
+        column = _FIELDS.get(field.lower())
+        if field and not column:
+            word = f"{field}:{phrase or word}"   # not a field, e.g. a time like 10:30
+            phrase = ""
+        text = phrase or word
+        tokens = re.findall(r"\w+", text)
+        if not tokens:
+            continue
+        expr = '"' + " ".join(tokens) + '"' + ("" if phrase else "*")
+        terms.append(f"{column} : {expr}" if column else expr)
+    return " AND ".join(terms)
+
+def search(user_email, query, limit=20, offset=0):
+    expr = fts_query(query)
+    if not expr or not os.path.exists(index_path(user_email)):
+        return []
+    limit = max(1, min(int(limit), SEARCH_LIMIT))
+    with span("email_index", "search"):
+        conn = _connect(user_email)
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT m.id, m.sender, m.subject, m.date,
+                       snippet(messages_fts, 2, '[', ']', '…', 16)
+                FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid
+                WHERE messages_fts MATCH ?
+                ORDER BY bm25(messages_fts, {", ".join(map(str, RANK_WEIGHTS))}), m.date DESC
+                LIMIT ? OFFSET ?
+                """,
+                (expr, limit, max(0, int(offset)))
+            ).fetchall()
+        finally:
+            conn.close()
+    return [
+        {"id": id_, "from": sender, "subject": subject, "date": date, "snippet": snippet}
+        for id_, sender, subject, date, snippet in rows
+    ]
@@ -0,0 +1,169 @@
+import os
+import re
+import base64
+from html import unescape
+from html.parser import HTMLParser
+
+# Turns a Gmail message payload into the text worth sending to the LLM. The
+# MIME tree is walked to its first text/plain part (HTML, converted to text,
+# when there is none), then quoted history, signatures and boilerplate
+# (unsubscribe/legal footers, bare tracking links) are dropped and the rest
+# is cut to a per-email token budget. Token counts are a local estimate
+# (word and punctuation pieces, long words counting extra), close enough to
+# the model's tokenizer for budgeting.
+EMAIL_TOKEN_BUDGET = int(os.getenv("EMAIL_TOKEN_BUDGET", "250"))
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+_QUOTE_HEADERS = [
+    re.compile(r"^On .{0,200}wrote:\s*$", re.I),
+    re.compile(r"^Le .{0,200}a écrit\s*:\s*$", re.I),
+    re.compile(r"^Am .{0,200}schrieb .{0,100}:\s*$", re.I),
+    re.compile(r"^-{2,}\s*(Original Message|Forwarded message)\s*-{2,}", re.I),
+    re.compile(r"^_{10,}\s*$"),
+]
+# Outlook-style history: a From: line followed by Sent:/Date:
+_FORWARD_HEADER = re.compile(r"^From:\s.+$", re.I)
+
+_SIGNATURE_STARTS = [
+    re.compile(r"^--\s?$"),
+    re.compile(r"^(Sent from my|Get Outlook for)\b", re.I),
+    re.compile(r"^(best( regards)?|kind regards|regards|thanks( again)?|thank you|cheers|sincerely|warm regards),?\s*$", re.I),
+]
+SIGNATURE_MAX_LINES = 8          # a sign-off this close to the end starts the signature
+
+_BOILERPLATE = re.compile(
+    r"unsubscribe|manage (your )?(email )?preferences|view (this email )?in (your )?browser|"
+    r"privacy policy|all rights reserved|you (are )?receiv(ed|ing) this (email|message)|"
+    r"this (e-?mail|message)( and any attachments)? (is|are|may be) (strictly )?confidential|"
+    r"intended (solely )?for the (named )?(addressee|recipient)|please consider the environment",
+    re.I,
+)
+_URL = re.compile(r"https?://\S+")
+_BARE_LINK = re.compile(r"^[\s\[\](<>|•·-]*(https?://\S+|\[link\])[\s\[\])<>|•·-]*$")
+
+# ---------------- MIME ----------------
+def _decode(part):
+    data = (part.get("body") or {}).get("data")
+    if not data:
+        return ""
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)).decode("utf-8", errors="replace")
+
+def _walk(part):
+    yield part
+    for child in part.get("parts") or []:
+        yield from _walk(child)
+
+def extract_body(payload):
+    plain = html = None
+    for part in _walk(payload):
+        if part.get("filename"):
+            continue    # attachments, including attached .txt/.html files
+        mime = part.get("mimeType", "")
+        if mime == "text/plain" and plain is None:
+            plain = _decode(part)
+        elif mime == "text/html" and html is None:
+            html = _decode(part)
+    if plain and plain.strip():
+        return plain
+    return html_to_text(html) if html else ""
+
+# ---------------- HTML ----------------
+class _TextExtractor(HTMLParser):
+    BLOCKS = {"p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "blockquote", "hr"}
+    SKIP = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.skipping = 0
+        self.quoting = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag == "blockquote":
+            self.quoting += 1
+        if tag in self.BLOCKS:
+            self.out.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag == "blockquote":
+            self.quoting = max(0, self.quoting - 1)
+        if tag in self.BLOCKS:
+            self.out.append("\n")
+
+    def handle_data(self, data):
+        # quoted history in HTML mail is dropped here rather than by the
+        # text rules, which only see it once flattened
+        if not self.skipping and not self.quoting:
+            self.out.append(data)
+
+def html_to_text(html):
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+        text = "".join(parser.out)
+    except Exception:
+        text = unescape(re.sub(r"<[^>]+>", " ", html))
+    lines = (re.sub(r"[ \t\xa0]+", " ", line).strip() for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+# ---------------- Cleaning ----------------
+def strip_quotes(text):
+    lines = text.splitlines()
+    first = next((line.strip() for line in lines if line.strip()), "")
+    if any(pattern.match(first) for pattern in _QUOTE_HEADERS):
+        return text     # a forward with nothing added: the history is the message
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if any(pattern.match(stripped) for pattern in _QUOTE_HEADERS):
+            return "\n".join(lines[:i])
+        if _FORWARD_HEADER.match(stripped) and re.search(r"^\s*(Sent|Date):", "\n".join(lines[i + 1:i + 4]), re.I | re.M):
+            return "\n".join(lines[:i])
+    return "\n".join(line for line in lines if not line.lstrip().startswith(">"))
+
+def strip_signature(text):
+    lines = text.rstrip().splitlines()
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if _SIGNATURE_STARTS[0].match(line) or _SIGNATURE_STARTS[1].match(stripped):
+            return "\n".join(lines[:i])
+        if i and _SIGNATURE_STARTS[2].match(stripped) and len(lines) - i <= SIGNATURE_MAX_LINES:
+            return "\n".join(lines[:i])
+    return "\n".join(lines)
+
+def strip_boilerplate(text):
+    kept = []
+    for line in text.splitlines():
+        if _BOILERPLATE.search(line) or _BARE_LINK.match(line):
+            continue
+        kept.append(_URL.sub(_short_link, line))
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+
+def _short_link(match):
+    # tracking URLs are long and tell the model nothing past the domain
+    url = match.group(0)
+    domain = re.match(r"https?://([^/?#]+)", url)
+    return f"[{domain.group(1)}]" if len(url) > 40 and domain else url
+
+# ---------------- Budget ----------------
+def estimate_tokens(text):
+    return sum(1 + len(piece) // 8 for piece in _PIECES.findall(text or ""))
+
+def truncate_tokens(text, budget=EMAIL_TOKEN_BUDGET):
+    used = 0
+    for match in _PIECES.finditer(text):
+        used += 1 + len(match.group(0)) // 8
+        if used > budget:
+            return text[:match.start()].rstrip() + " …"
+    return text
+
+def clean_body(text):
+    return strip_boilerplate(strip_signature(strip_quotes(text or "")))
+
+def preprocess(payload):
+    return clean_body(extract_body(payload))
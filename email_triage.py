@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import atexit
+import math
+import time
+import hashlib
+import threading
+
+from email_index import EMAIL_INDEX_DIR
+
+# Scores how likely the user is to care about an email, locally and in a
+# few microseconds, so the inbox summary can spend the prompt on the top
+# EMAIL_SUMMARY_TOP_K emails and only count the rest. An email becomes a set
+# of features (sender, sender domain, Gmail labels, bulk-mail headers,
+# subject words). Fixed rule weights give a sensible start; a per-user naive
+# Bayes model over the same features adds what the user has shown: an email
+# that is opened or replied to counts as important, one shown and left
+# unopened for TRIAGE_IGNORE_SECONDS as not. Changed models are written to
+# disk by a background thread every TRIAGE_SAVE_SECONDS, not per request.
+EMAIL_SUMMARY_TOP_K = int(os.getenv("EMAIL_SUMMARY_TOP_K", "15"))
+IMPORTANT_THRESHOLD = 0.5        # the email page marks emails at or above this
+TRIAGE_IGNORE_SECONDS = int(os.getenv("TRIAGE_IGNORE_SECONDS", str(2 * 86400)))
+MAX_FEATURES = 5000              # per user; the rarest are dropped beyond this
+MAX_PENDING = 2000               # shown emails still waiting for an outcome
+TRIAGE_SAVE_SECONDS = int(os.getenv("TRIAGE_SAVE_SECONDS", "30"))
+SUBJECT_WORDS = 10
+SMOOTHING = 1.0
+
+# rule weights in log-odds; learned counts are added on top
+RULE_WEIGHTS = {
+    "label:STARRED": 2.0,
+    "label:IMPORTANT": 1.5,
+    "label:CATEGORY_PERSONAL": 1.0,
+    "label:CATEGORY_UPDATES": -0.5,
+    "label:CATEGORY_FORUMS": -1.0,
+    "label:CATEGORY_SOCIAL": -1.5,
+    "label:CATEGORY_PROMOTIONS": -2.5,
+    "bulk": -1.5,
+    "noreply": -1.5,
+    "thread": 1.0,
+}
+
+CATEGORIES = {
+    "CATEGORY_PROMOTIONS": "promotions",
+    "CATEGORY_SOCIAL": "social",
+    "CATEGORY_UPDATES": "updates",
+    "CATEGORY_FORUMS": "forums",
+}
+
+_NOREPLY = re.compile(r"no-?reply|do-?not-?reply|notifications?@|mailer-daemon", re.I)
+_ADDRESS = re.compile(r"<([^>]+)>")
+_THREAD = re.compile(r"^\s*(re|aw|sv)\s*:", re.I)
+_WORD = re.compile(r"[a-z][a-z']{2,}")
+
+# user -> model state, loaded from disk on first use; each user's model is
+# read and changed under that user's lock
+_models = {}
+_user_locks = {}
+_dirty = set()
+_lock = threading.Lock()            # guards the three above
+_flush_lock = threading.Lock()      # one flush at a time
+_flush_thread = None
+
+# ---------------- Features ----------------
+def features(email):
+    sender = email.get("from", "")
+    match = _ADDRESS.search(sender)
+    address = (match.group(1) if match else sender).strip().lower()
+    found = {f"from:{address}"}
+    if "@" in address:
+        found.add(f"domain:{address.rsplit('@', 1)[1]}")
+    found.update(f"label:{label}" for label in email.get("labels", ()))
+    if email.get("bulk"):
+        found.add("bulk")
+    if _NOREPLY.search(address):
+        found.add("noreply")
+    subject = email.get("subject", "")
+    if _THREAD.match(subject):
+        found.add("thread")
+    found.update(f"w:{word}" for word in _WORD.findall(subject.lower())[:SUBJECT_WORDS])
+    return found
+
+def category(email):
+    labels = email.get("labels", ())
+    return next((name for label, name in CATEGORIES.items() if label in labels), "other")
+
+# ---------------- Model ----------------
+def model_path(user_email):
+    name = hashlib.sha256(user_email.lower().encode()).hexdigest()[:32]
+    return os.path.join(EMAIL_INDEX_DIR, f"{name}.triage.json")
+
+def _user_lock(user_email):
+    with _lock:
+        lock = _user_locks.get(user_email)
+        if lock is None:
+            lock = _user_locks[user_email] = threading.Lock()
+        return lock
+
+def _model(user_email):
+    # callers hold the user's lock
+    with _lock:
+        model = _models.get(user_email)
+    if model is None:
+        try:
+            with open(model_path(user_email), encoding="utf-8") as f:
+                model = json.load(f)
+        except (OSError, ValueError):
+            model = {}
+        model.setdefault("counts", {})      # feature -> [important, other]
+        model.setdefault("docs", [0, 0])
+        model.setdefault("pending", {})     # message id -> {features, seen, opened}
+        with _lock:
+            _models[user_email] = model
+    return model
+
+def _changed(user_email):
+    global _flush_thread
+    with _lock:
+        _dirty.add(user_email)
+        if _flush_thread is not None:
+            return
+        _flush_thread = threading.Thread(target=_flush_loop, daemon=True)
+    _flush_thread.start()
+
+def _flush_loop():
+    while True:
+        time.sleep(TRIAGE_SAVE_SECONDS)
+        flush()
+
+def flush():
+    # writes every model changed since the last flush
+    with _flush_lock:
+        with _lock:
+            users = list(_dirty)
+            _dirty.clear()
+        for user_email in users:
+            with _user_lock(user_email):
+                data = json.dumps(_model(user_email), separators=(",", ":"))
+            path = model_path(user_email)
+            try:
+                os.makedirs(EMAIL_INDEX_DIR, exist_ok=True)
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            except OSError:
+                with _lock:
+                    _dirty.add(user_email)     # try again on the next flush
+
+atexit.register(flush)
+
+def _log_odds(model, found):
+    # rule weights plus per-feature likelihood ratios only: no class prior,
+    # since most shown emails are never opened and a prior learned from that
+    # would push every email, including new senders, below the rules' start
+    docs_important, docs_other = model["docs"]
+    total = 0.0
+    important_denominator = docs_important + 2 * SMOOTHING
+    other_denominator = docs_other + 2 * SMOOTHING
+    counts = model["counts"]
+    for feature in found:
+        total += RULE_WEIGHTS.get(feature, 0.0)
+        important, other = counts.get(feature, (0, 0))
+        if important or other:
+            total += math.log((important + SMOOTHING) / important_denominator) \
+                - math.log((other + SMOOTHING) / other_denominator)
+    return total
+
+def _train(model, found, important):
+    column = 0 if important else 1
+    model["docs"][column] += 1
+    counts = model["counts"]
+    for feature in found:
+        counts.setdefault(feature, [0, 0])[column] += 1
+    if len(counts) > MAX_FEATURES:
+        keep = sorted(counts, key=lambda f: sum(counts[f]), reverse=True)[:MAX_FEATURES]
+        model["counts"] = {f: counts[f] for f in keep}
+
+def score(user_email, email):
+    with _user_lock(user_email):
+        model = _model(user_email)
+        return 1 / (1 + math.exp(-_log_odds(model, features(email))))
+
+def triage(user_email, emails, now=None):
+    # sets "importance" (0..1) on each email and remembers them as shown;
+    # shown emails that were never opened are learned as unimportant once
+    # they are TRIAGE_IGNORE_SECONDS old
+    now = now or time.time()
+    with _user_lock(user_email):
+        model = _model(user_email)
+        pending = model["pending"]
+        for email in emails:
+            found = features(email)
+            email["importance"] = round(1 / (1 + math.exp(-_log_odds(model, found))), 3)
+            if email.get("id") and email["id"] not in pending:
+                pending[email["id"]] = {"features": sorted(found), "seen": now, "opened": False}
+
+        for message_id, entry in list(pending.items()):
+            if now - entry["seen"] >= TRIAGE_IGNORE_SECONDS:
+                if not entry["opened"]:
+                    _train(model, entry["features"], important=False)
+                del pending[message_id]
+        while len(pending) > MAX_PENDING:
+            pending.pop(next(iter(pending)))
+    _changed(user_email)
+    return emails
+
+def learn(user_email, message_id, signal):
+    # signal: "open" (the body was fetched) or "reply" (the user answered it)
+    with _user_lock(user_email):
+        model = _model(user_email)
+        entry = model["pending"].get(message_id)
+        if entry is None or (signal == "open" and entry["opened"]):
+            return False
+        _train(model, entry["features"], important=True)
+        entry["opened"] = True
+    _changed(user_email)
+    return True
+
+# ---------------- Summary ----------------
+def split_important(emails, top_k=EMAIL_SUMMARY_TOP_K):
+    # -> (the top_k emails by importance, in their original order; the rest).
+    # The top_k are always summarized, however low they score: the scores
+    # only rank, so a quiet inbox still gets a summary
+    ranked = sorted(range(len(emails)), key=lambda i: -emails[i].get("importance", IMPORTANT_THRESHOLD))
+    chosen = set(ranked[:top_k])
+    detailed = [e for i, e in enumerate(emails) if i in chosen]
+    rest = [e for i, e in enumerate(emails) if i not in chosen]
+    return detailed, rest
+
+def describe_rest(emails):
+    # "12 promotions, 3 social" for the emails left out of the summary
+    counts = {}
+    for email in emails:
+        name = category(email)
+        counts[name] = counts.get(name, 0) + 1 + email.get("similar", 0)
+    return ", ".join(f"{n} {name}" for name, n in sorted(counts.items(), key=lambda item: -item[1]))
@@ -0,0 +1,216 @@
+import os
+import time
+import threading
+from contextvars import ContextVar
+
+# Request and upstream timing. Routes are timed by the Flask hooks installed
+# in init_app(); outward calls (Supabase, Google APIs, Gemini, the REST APIs
+# in backend_*, SMTP) and heavy local work (pandas, PDF rendering) are wrapped
+# in span(component, operation).
+#
+# METRICS_ENABLED=1 aggregates histograms served at /metrics in Prometheus
+# text format; SERVER_TIMING=1 adds a Server-Timing header to each response.
+# With both off, span() hands back a shared no-op object and no request hooks
+# are installed.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED") == "1"
+SERVER_TIMING = os.getenv("SERVER_TIMING") == "1"
+ENABLED = METRICS_ENABLED or SERVER_TIMING
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# (name, labels) -> [bucket counts..., sum, count]
+_histograms = {}
+# (name, labels) -> value
+_counters = {}
+_lock = threading.Lock()
+
+# per request: component -> [total seconds, calls]
+_request_spans = ContextVar("request_spans", default=None)
+
+HELP = {
+    "http_request_duration_seconds": "Time spent handling a request, by route.",
+    "http_response_size_bytes": "Response body size, by route.",
+    "http_request_errors_total": "Requests that raised or returned 5xx, by route.",
+    "span_duration_seconds": "Time spent in an upstream call or heavy local step.",
+    "span_payload_bytes": "Payload size received from an upstream.",
+    "span_errors_total": "Upstream calls or local steps that raised.",
+}
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, _labels(**labels))
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                entry[i] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(**labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def record_span(component, operation, seconds, size=None, error=False):
+    if METRICS_ENABLED:
+        observe("span_duration_seconds", seconds, component=component, operation=operation)
+        if size:
+            observe("span_payload_bytes", size, SIZE_BUCKETS, component=component)
+        if error:
+            inc("span_errors_total", component=component, operation=operation)
+
+    spans = _request_spans.get()
+    if spans is not None:
+        total = spans.setdefault(component, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+
+class _Span:
+    __slots__ = ("component", "operation", "size", "start")
+
+    def __init__(self, component, operation):
+        self.component = component
+        self.operation = operation
+        self.size = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_span(self.component, self.operation, time.perf_counter() - self.start,
+                    self.size, error=exc_type is not None)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    # lets callers write `s.size = len(body)` whether or not metrics are on
+    def __setattr__(self, name, value):
+        pass
+
+_NOOP = _NoopSpan()
+
+def span(component, operation=""):
+    if not ENABLED:
+        return _NOOP
+    return _Span(component, operation)
+
+# ---------------- httpx (Supabase) ----------------
+def instrument_httpx(client, component):
+    if not ENABLED:
+        return
+
+    def on_request(req):
+        req.extensions["span_start"] = time.perf_counter()
+
+    def on_response(resp):
+        start = resp.request.extensions.get("span_start")
+        if start is None:
+            return
+        resp.read()
+        # PostgREST paths end in the table (or rpc/<fn>) name
+        operation = f"{resp.request.method} {resp.request.url.path.rsplit('/', 1)[-1]}"
+        record_span(component, operation, time.perf_counter() - start,
+                    len(resp.content), error=resp.status_code >= 500)
+
+    client.event_hooks["request"].append(on_request)
+    client.event_hooks["response"].append(on_response)
+
+# ---------------- Flask ----------------
+def init_app(app):
+    if not ENABLED:
+        return
+
+    from flask import request, g
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _request_spans.set({})
+
+    @app.after_request
+    def _finish_timer(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+
+        if METRICS_ENABLED:
+            observe("http_request_duration_seconds", elapsed,
+                    route=route, method=request.method, status=str(response.status_code))
+            if not response.is_streamed:
+                observe("http_response_size_bytes", response.calculate_content_length() or 0,
+                        SIZE_BUCKETS, route=route)
+            if response.status_code >= 500:
+                inc("http_request_errors_total", route=route, method=request.method)
+
+        if SERVER_TIMING:
+            spans = _request_spans.get() or {}
+            entries = [
+                f'{component};dur={seconds * 1000:.1f};desc="{calls} call(s)"'
+                for component, (seconds, calls) in spans.items()
+            ]
+            entries.append(f"app;dur={elapsed * 1000:.1f}")
+            response.headers["Server-Timing"] = ", ".join(entries)
+        return response
+
+    @app.teardown_request
+    def _reset_spans(exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            try:
+                _request_spans.reset(token)
+            except ValueError:
+                # streamed responses tear down from the generator's context
+                _request_spans.set(None)
+
+# ---------------- Prometheus exposition ----------------
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+def render_metrics():
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), entry in sorted(histograms.items()):
+        header(name, "histogram")
+        buckets = SIZE_BUCKETS if name.endswith("_bytes") else LATENCY_BUCKETS
+        for bound, count in zip(buckets, entry):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {entry[-1]}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {entry[-2]:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {entry[-1]}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,179 @@
+import io
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+import circuit_breaker
+from instrumentation import span
+
+# Google Places photos served from our own /travel/photo/<ref> instead of
+# linking to Google with the user's key in the URL. Each photo reference is
+# downloaded once, at PHOTO_SOURCE_WIDTH, and smaller widths are resized from
+# that copy locally. Files are named by the SHA-256 of their bytes, which is
+# also their ETag; a SQLite index maps (reference, width) to a digest and
+# records each file's content type and when it was last served. Past PHOTO_CACHE_MAX_BYTES the least
+# recently served files are deleted.
+PHOTO_URL = "https://maps.googleapis.com/maps/api/place/photo"
+PHOTO_CACHE_DIR = os.getenv("PHOTO_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".photo_cache"))
+PHOTO_CACHE_MAX_BYTES = int(os.getenv("PHOTO_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+PHOTO_WIDTHS = (200, 400, 800)   # requested widths are rounded up to one of these
+PHOTO_SOURCE_WIDTH = 800
+PHOTO_QUALITY = 80
+TOUCH_SECONDS = 60               # last-served time is updated at most this often
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    content_type TEXT NOT NULL DEFAULT 'image/jpeg'
+);
+CREATE INDEX IF NOT EXISTS files_last_used ON files(last_used);
+CREATE TABLE IF NOT EXISTS photos (
+    ref TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (ref, width)
+);
+CREATE INDEX IF NOT EXISTS photos_digest ON photos(digest);
+"""
+
+_initialized = set()
+# one download per photo reference at a time
+_fetch_locks = [threading.Lock() for _ in range(64)]
+
+def snap_width(width):
+    return next((w for w in PHOTO_WIDTHS if w >= width), PHOTO_WIDTHS[-1])
+
+def _path(digest):
+    return os.path.join(PHOTO_CACHE_DIR, digest[:2], f"{digest}.jpg")
+
+def _connect():
+    os.makedirs(PHOTO_CACHE_DIR, exist_ok=True)
+    path = os.path.join(PHOTO_CACHE_DIR, "index.db")
+    conn = sqlite3.connect(path, timeout=10)
+    if path not in _initialized:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SCHEMA)
+        if "content_type" not in {row[1] for row in conn.execute("PRAGMA table_info(files)")}:
+            # caches made before content types were kept
+            conn.execute("ALTER TABLE files ADD COLUMN content_type TEXT NOT NULL DEFAULT 'image/jpeg'")
+        _initialized.add(path)
+    return conn
+
+def cached_photo(ref, width):
+    # -> (digest, bytes, content type) or None
+    if not os.path.isdir(PHOTO_CACHE_DIR):
+        return None
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT p.digest, f.last_used, f.content_type FROM photos p JOIN files f ON f.digest = p.digest WHERE p.ref = ? AND p.width = ?",
+            (ref, snap_width(width))
+        ).fetchone()
+        if row is None:
+            return None
+        digest, last_used, content_type = row
+        try:
+            with open(_path(digest), "rb") as f:
+                data = f.read()
+        except OSError:
+            with conn:
+                conn.execute("DELETE FROM photos WHERE digest = ?", (digest,))
+                conn.execute("DELETE FROM files WHERE digest = ?", (digest,))
+            return None
+        now = time.time()
+        if now - last_used > TOUCH_SECONDS:
+            with conn:
+                conn.execute("UPDATE files SET last_used = ? WHERE digest = ?", (now, digest))
+        return digest, data, content_type
+    finally:
+        conn.close()
+
+def fetch_photo(api_key, ref, width):
+    # cached_photo(), downloading and resizing on a miss; None if Google has no such photo
+    width = snap_width(width)
+    with _fetch_locks[hash(ref) % len(_fetch_locks)]:
+        found = cached_photo(ref, width)
+        if found:
+            return found
+        source = cached_photo(ref, PHOTO_SOURCE_WIDTH)
+        if source is None:
+            downloaded = _download(api_key, ref)
+            if downloaded is None:
+                return None
+            source = _store(ref, PHOTO_SOURCE_WIDTH, *downloaded)
+        if width >= PHOTO_SOURCE_WIDTH:
+            return source
+        try:
+            resized = resize(source[1], width)
+        except Exception:
+            return source   # not an image Pillow can read; serve it as Google sent it
+        return _store(ref, width, resized, "image/jpeg")
+
+def _download(api_key, ref):
+    params = {"maxwidth": PHOTO_SOURCE_WIDTH, "photo_reference": ref, "key": api_key}
+    try:
+        with span("google_places", "photo") as s:
+            res = circuit_breaker.get("google_place_photos", PHOTO_URL, params=params, timeout=10)
+            s.size = len(res.content)
+    except Exception:
+        return None
+    content_type = res.headers.get("Content-Type", "")
+    if res.status_code != 200 or not content_type.startswith("image/"):
+        return None
+    return res.content, content_type
+
+def resize(data, width):
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    out = io.BytesIO()
+    image.convert("RGB").save(out, "JPEG", quality=PHOTO_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+def _store(ref, width, data, content_type):
+    digest = hashlib.sha256(data).hexdigest()
+    path = _path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO files(digest, size, last_used, content_type) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(digest) DO UPDATE SET last_used = excluded.last_used",
+                (digest, len(data), time.time(), content_type)
+            )
+            conn.execute("INSERT OR REPLACE INTO photos(ref, width, digest) VALUES (?, ?, ?)", (ref, width, digest))
+        _evict(conn)
+    finally:
+        conn.close()
+    return digest, data, content_type
+
+def _evict(conn):
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+    if total <= PHOTO_CACHE_MAX_BYTES:
+        return
+    # down to 90% of the cap, so every new photo doesn't trigger another pass
+    target = PHOTO_CACHE_MAX_BYTES * 0.9
+    evicted = []
+    for digest, size in conn.execute("SELECT digest, size FROM files ORDER BY last_used"):
+        if total <= target:
+            break
+        evicted.append(digest)
+        total -= size
+    with conn:
+        conn.executemany("DELETE FROM photos WHERE digest = ?", [(d,) for d in evicted])
+        conn.executemany("DELETE FROM files WHERE digest = ?", [(d,) for d in evicted])
+    for digest in evicted:
+        try:
+            os.remove(_path(digest))
+        except OSError:
+            pass
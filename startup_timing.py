@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import builtins
+import threading
+
+# Boot-time profile for app.py. Phase timings are always recorded (they are
+# just a few perf_counter calls); with STARTUP_TIMING=1 we also time every
+# top-level import made while booting, similar to `python -X importtime`
+# but summarized per package, and print the report once the app is built.
+ENABLED = os.getenv("STARTUP_TIMING") == "1"
+TOP_IMPORTS = 15
+
+_t0 = time.perf_counter()
+_last = _t0
+_phases = []
+_imports = {}
+_state = threading.local()
+_original_import = builtins.__import__
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules or getattr(_state, "depth", 0):
+        return _original_import(name, globals, locals, fromlist, level)
+
+    _state.depth = 1
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _state.depth = 0
+        package = name.partition(".")[0]
+        _imports[package] = _imports.get(package, 0.0) + time.perf_counter() - start
+
+if ENABLED:
+    builtins.__import__ = _timed_import
+
+def mark(phase: str):
+    global _last
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+def total():
+    return _last - _t0
+
+def report():
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+    if not ENABLED:
+        return
+
+    lines = [f"[startup] ready in {total() * 1000:.0f} ms"]
+    for phase, seconds in _phases:
+        lines.append(f"[startup]   {phase:<24}{seconds * 1000:>8.1f} ms")
+    if _imports:
+        lines.append("[startup] slowest imports (cumulative):")
+        slowest = sorted(_imports.items(), key=lambda kv: kv[1], reverse=True)[:TOP_IMPORTS]
+        for package, seconds in slowest:
+            lines.append(f"[startup]   {package:<24}{seconds * 1000:>8.1f} ms")
+    print("\n".join(lines), file=sys.stderr)